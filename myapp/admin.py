@@ -1,12 +1,23 @@
 from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, JsonResponse
+from django.urls import path
+from django.utils.cache import patch_cache_control
 from django.utils.html import format_html
 from unfold.admin import ModelAdmin, TabularInline
 from unfold.decorators import display
-from .models import Service, Blog, News, Product, ProductImage, Testimonial
+from .cache import get_catalog_terms
+from .models import Service, Blog, CatalogTerm, News, Product, ProductImage, Testimonial, ImageJob
 from .forms import ProductAdminForm
 
 # Register your models here.
 
+# Adds the slowest-endpoints table (see dashboard.py) above the app list.
+admin.site.index_template = 'admin/visionmark_index.html'
+
+# Suggestions returned per keystroke by the brand/size autocomplete.
+AUTOCOMPLETE_LIMIT = 20
+
 @admin.register(Service)
 class ServiceAdmin(ModelAdmin):
     list_display = ['name', 'image_preview', 'created_at', 'updated_at']
@@ -78,32 +89,74 @@ class ProductImageInline(TabularInline):
         return "No image"
 
 
+class CatalogTermListFilter(admin.SimpleListFilter):
+    """Lists the values of a CatalogTerm kind from the registry instead of a DISTINCT over the column."""
+    kind = None
+
+    def lookups(self, request, model_admin):
+        return [(value, f"{value} ({count})") for value, count, _ in get_catalog_terms(self.kind)]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(**{self.kind: self.value()})
+        return queryset
+
+
+class BrandListFilter(CatalogTermListFilter):
+    title = 'brand'
+    parameter_name = 'brand'
+    kind = CatalogTerm.Kind.BRAND
+
+
+class SizeListFilter(CatalogTermListFilter):
+    title = 'size'
+    parameter_name = 'size'
+    kind = CatalogTerm.Kind.SIZE
+
+
 @admin.register(Product)
 class ProductAdmin(ModelAdmin):
     form = ProductAdminForm
-    list_display = ['name', 'main_image_preview', 'category', 'brand', 'size', 'price', 'sale_price', 'stock', 'is_active']
-    list_filter = ['category', 'brand', 'size', 'is_active', 'created_at']
+    list_display = ['name', 'main_image_preview', 'category', 'brand', 'size', 'price', 'sale_price', 'stock', 'is_active', 'is_featured']
+    list_filter = ['category', BrandListFilter, SizeListFilter, 'is_active', 'is_featured', 'created_at']
     search_fields = ['name', 'sku', 'brand', 'description']
     prepopulated_fields = {'slug': ('name',)}
     readonly_fields = ['main_image_preview', 'created_at', 'updated_at']
     inlines = [ProductImageInline]
-    
+
     @display(description="Main Image", ordering=True)
     def main_image_preview(self, obj):
-        if obj.main_image:
+        image_url = obj.get_main_image_url()
+        if image_url:
             return format_html(
                 '<img src="{}" style="max-width: 100px; max-height: 100px; object-fit: cover; border-radius: 4px;" />',
-                obj.main_image.url
-            )
-        # Try to get from gallery
-        primary_image = obj.get_primary_gallery_image()
-        if primary_image:
-            return format_html(
-                '<img src="{}" style="max-width: 100px; max-height: 100px; object-fit: cover; border-radius: 4px;" />',
-                primary_image.image.url
+                image_url
             )
         return "No image"
 
+    def get_urls(self):
+        return [
+            path('terms/<str:kind>/', self.admin_site.admin_view(self.catalog_terms_view, cacheable=True),
+                 name='myapp_product_catalog_terms'),
+            *super().get_urls(),
+        ]
+
+    def catalog_terms_view(self, request, kind):
+        """
+        Brand or size suggestions for the form's DatalistTextInput: registry
+        values containing ?q=, those starting with it first, read from cache.
+        """
+        if kind not in CatalogTerm.Kind.values:
+            raise Http404
+        if not self.has_view_or_change_permission(request):
+            raise PermissionDenied
+        query = request.GET.get('q', '').strip().lower()
+        values = [value for value, _, _ in get_catalog_terms(kind) if query in value.lower()]
+        values.sort(key=lambda value: not value.lower().startswith(query))
+        response = JsonResponse({'results': values[:AUTOCOMPLETE_LIMIT]})
+        patch_cache_control(response, private=True, max_age=60)
+        return response
+
 
 @admin.register(Testimonial)
 class TestimonialAdmin(ModelAdmin):
@@ -124,3 +177,21 @@ class TestimonialAdmin(ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+
+
+@admin.register(ImageJob)
+class ImageJobAdmin(ModelAdmin):
+    list_display = ['source_name', 'content_type', 'object_id', 'field_name', 'status', 'attempts', 'updated_at']
+    list_filter = ['status', 'content_type', 'created_at']
+    search_fields = ['source_name', 'error']
+    readonly_fields = ['content_type', 'object_id', 'field_name', 'source_name', 'status',
+                       'attempts', 'error', 'created_at', 'updated_at']
+    actions = ['retry_jobs']
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.action(description="Retry selected jobs")
+    def retry_jobs(self, request, queryset):
+        updated = queryset.exclude(status=ImageJob.Status.RUNNING).update(status=ImageJob.Status.PENDING, error='')
+        self.message_user(request, f"{updated} job(s) requeued.")
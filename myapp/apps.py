@@ -1,7 +1,22 @@
 from django.apps import AppConfig
+from django.contrib.staticfiles.apps import StaticFilesConfig as BaseStaticFilesConfig
 
 
 class MyappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'myapp'
     verbose_name = 'Dashboard'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+
+
+class StaticFilesConfig(BaseStaticFilesConfig):
+    # Icon-font previews and demo files nothing links to; the font itself
+    # (fonts/elegant_font/HTML_CSS/fonts) is still collected.
+    ignore_patterns = [
+        *BaseStaticFilesConfig.ignore_patterns,
+        'fonts/elegant_font/images/*',
+        'fonts/elegant_font/HTML_CSS/index.html',
+        'fonts/elegant_font/HTML_CSS/lte-ie7.js',
+    ]
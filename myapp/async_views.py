@@ -0,0 +1,193 @@
+"""
+Async versions of the public views in views.py, served when the site runs
+under ASGI (settings.ASYNC_VIEWS). They read through the async ORM and
+cache API and hand fully loaded objects to the templates, which must not
+query the database from the event loop.
+"""
+from asgiref.sync import sync_to_async
+from django import shortcuts
+from django.http import JsonResponse
+from django.shortcuts import aget_object_or_404
+
+from .cache import aget_catalog_terms, aget_services_menu, cache_view, conditional_view
+from .forms import ProductFilterForm
+from .models import Blog, CatalogTerm, News, Product, ProductImage, Service, Testimonial
+from .pagination import KeysetPaginator
+from .prerender import prerendered
+from .search import get_backend as get_search_backend
+from .views import (
+    KEY_BENEFITS, _blog_single_rows, _catalog_brands, _catalog_context, _catalog_queries, _legacy_page_redirect,
+    _news_detail_rows, _popular_posts, _product_detail_rows, _recent_news, _related_products,
+)
+
+
+async def render(request, template_name, context=None, **kwargs):
+    """shortcuts.render() with the navbar's services loaded up front for services_context."""
+    request.services_menu = await aget_services_menu()
+    return shortcuts.render(request, template_name, context, **kwargs)
+
+
+async def _list(queryset):
+    return [obj async for obj in queryset]
+
+
+@cache_view(Product, ProductImage, Testimonial)
+async def home(request):
+    testimonials = await _list(Testimonial.objects.filter(is_published=True).order_by('-date', '-created_at')[:10])
+    latest_products = await _list(
+        Product.objects.filter(is_active=True).cards().order_by('-created_at')[:10]
+    )
+    services = await _list(Service.objects.only('name', 'description', 'image'))
+    return await render(request, 'home.html', {
+        'testimonials': testimonials,
+        'latest_products': latest_products,
+        'services': services
+    })
+
+
+@prerendered
+async def about(request):
+    return await render(request, 'about.html')
+
+
+@cache_view()
+async def services(request):
+    services = await _list(Service.objects.only('name', 'description', 'image'))
+    return await render(request, 'services.html', {'services': services})
+
+
+@cache_view()
+async def servicedetails(request, service_id):
+    service = await Service.objects.aget(id=service_id)
+    return await render(request, 'servicedetails.html', {
+        'service': service,
+        'key_benefits': KEY_BENEFITS
+    })
+
+
+@prerendered
+async def faq(request):
+    return await render(request, 'faqs.html')
+
+
+@cache_view(Blog, params=('cursor', 'page'))
+async def blog_list(request):
+    paginator = KeysetPaginator(Blog.objects.listing().cards(), 6, models=[Blog])
+    if 'page' in request.GET:
+        return _legacy_page_redirect(request, await paginator.acursor_for_page(request.GET['page']))
+    page_obj = await paginator.aget_page(request.GET.get('cursor'))
+    return await render(request, 'blog.html', {
+        'page_obj': page_obj
+    })
+
+
+@conditional_view(_blog_single_rows)
+async def blog_single(request, slug):
+    post = await aget_object_or_404(Blog, slug=slug, is_published=True)
+    popular_posts = await _list(_popular_posts(slug))
+    return await render(request, "blog-single.html", {
+        "post": post,
+        "popular_posts": popular_posts
+    })
+
+
+@cache_view(News, params=('cursor', 'page'))
+async def news_list(request):
+    paginator = KeysetPaginator(News.objects.listing().cards(), 6, models=[News])
+    if 'page' in request.GET:
+        return _legacy_page_redirect(request, await paginator.acursor_for_page(request.GET['page']))
+    page_obj = await paginator.aget_page(request.GET.get('cursor'))
+    return await render(request, 'news_list.html', {
+        'page_obj': page_obj,
+    })
+
+
+@conditional_view(_news_detail_rows)
+async def news_detail(request, slug):
+    news = await aget_object_or_404(News, slug=slug, is_published=True)
+    recent_news = await _list(_recent_news(slug))
+    return await render(request, 'news_detail.html', {
+        'news': news,
+        'recent_news': recent_news
+    })
+
+
+@prerendered
+async def contact(request):
+    return await render(request, 'contact.html')
+
+
+@prerendered
+async def book_your_visit(request):
+    return await render(request, 'book-your-visit.html')
+
+
+async def products(request):
+    brands = _catalog_brands(await aget_catalog_terms(CatalogTerm.Kind.BRAND))
+    filter_form = ProductFilterForm(request.GET, brands=brands)
+    filters = filter_form.get_filters()
+    queries = _catalog_queries(filters)
+
+    paginator = KeysetPaginator(queries['products'], 9, models=[Product])
+    if 'page' in request.GET:
+        return _legacy_page_redirect(request, await paginator.acursor_for_page(request.GET['page']))
+    page_obj = await paginator.aget_page(request.GET.get('cursor'))
+
+    return await render(request, 'products.html', _catalog_context(
+        filter_form, filters, brands, page_obj,
+        category_counts=dict(await _list(queries['category_counts'])),
+        brand_counts=brands if queries['brand_counts'] is None else dict(await _list(queries['brand_counts'])),
+        price_bands=await _list(queries['price_bands']),
+    ))
+
+
+@conditional_view(_product_detail_rows)
+async def product_detail(request, slug):
+    product = await aget_object_or_404(Product.objects.prefetch_related('gallery'), slug=slug, is_active=True)
+    gallery = product.gallery.all()
+    related_products = await _list(_related_products(slug))
+    return await render(request, 'shop-product-single.html', {
+        'product': product,
+        'gallery': gallery,
+        'related_products': related_products
+    })
+
+
+@cache_view(Testimonial)
+async def testimonials(request):
+    testimonials_list = await _list(
+        Testimonial.objects.filter(is_published=True).order_by('sort_order', '-date', '-created_at')
+    )
+    return await render(request, 'testimonials.html', {
+        'testimonials': testimonials_list
+    })
+
+
+async def search(request):
+    query = request.GET.get('q', '').strip()[:200]
+    results = await sync_to_async(get_search_backend().search)(query, limit=30) if query else []
+    return await render(request, 'search.html', {
+        'query': query,
+        'results': results,
+    })
+
+
+async def search_suggest(request):
+    query = request.GET.get('q', '').strip()[:100]
+    suggestions = await sync_to_async(get_search_backend().suggest)(query) if len(query) >= 2 else []
+    return JsonResponse({'suggestions': suggestions})
+
+
+@prerendered
+async def terms(request):
+    return await render(request, 'terms.html')
+
+
+@prerendered
+async def privacy(request):
+    return await render(request, 'privacy.html')
+
+
+@prerendered
+async def robots_txt(request):
+    return await render(request, 'robots.txt', content_type='text/plain')
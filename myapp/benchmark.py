@@ -0,0 +1,595 @@
+import asyncio
+import logging
+import math
+import random
+import shutil
+import statistics
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from types import ModuleType
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management import call_command
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.db.models import F
+from django.test.utils import CaptureQueriesContext, override_settings, setup_databases, teardown_databases
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image, ImageChops, ImageStat
+
+from . import async_views, views
+from .models import Blog, News, Product, ProductImage, Service, Testimonial
+from .pagination import KeysetPaginator
+from .rich_text import render_rich_text
+from .sitemaps import SITEMAPS
+from .urls import urlpatterns, view_urlpatterns
+from .utils import AVIF_SUPPORTED, encode_avif, encode_jpeg, encode_webp, generate_renditions, open_image
+
+# Catalog sizes the suite can seed; blogs and news scale with the catalog.
+CATALOG_SIZES = {'1k': 1_000, '10k': 10_000, '100k': 100_000}
+GALLERY_IMAGES_PER_PRODUCT = 3
+BRANDS = ['Ray-Ban', 'Oakley', 'Titan', 'Vogue', 'Fastrack', 'Carrera', 'Prada', 'Lenskart', '']
+SIZES = ['48', '50', '52', '54', '56']
+
+# Every gallery/featured image points at this one file so seeding 100k
+# products does not write 300k images.
+SAMPLE_IMAGE_NAME = 'benchmark/sample.webp'
+
+SAMPLE_HTML = (
+    '<h2>Lightweight everyday frame</h2>'
+    '<p>Hand-polished acetate with <strong>spring hinges</strong> and '
+    'anti-reflective lenses. Suitable for prescription and blue-light lenses.</p>'
+    '<ul><li>UV400 protection</li><li>Adjustable nose pads</li><li>Two-year warranty</li></ul>'
+) * 4
+
+
+def _mirror_test_databases():
+    """
+    Points the TEST MIRROR aliases ('readonly') at the test database on
+    every thread (setup_databases() only repoints this thread's
+    connection), keeping their own OPTIONS. Returns their original settings.
+    """
+    originals = {}
+    for alias in connections:
+        mirror = connections.settings[alias]['TEST']['MIRROR']
+        if mirror:
+            originals[alias] = connections.settings[alias]
+            connections.settings[alias] = {**connections.settings[mirror], 'OPTIONS': originals[alias]['OPTIONS']}
+            connections[alias].settings_dict = connections.settings[alias]
+    return originals
+
+
+@contextmanager
+def benchmark_database(database_file=None):
+    """
+    Runs the block against a throwaway test database (in memory, or the
+    SQLite file `database_file`), a temporary MEDIA_ROOT and a local-memory
+    cache, with DEBUG off.
+    """
+    media_root = tempfile.mkdtemp(prefix='visionmark-bench-')
+    test_settings = connection.settings_dict['TEST']
+    test_name = test_settings['NAME']
+    if database_file:
+        test_settings['NAME'] = str(database_file)
+    old_config = setup_databases(verbosity=0, interactive=False)
+    originals = _mirror_test_databases()
+    try:
+        with override_settings(
+            DEBUG=False,
+            MEDIA_ROOT=media_root,
+            CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                'LOCATION': 'visionmark-benchmark'}},
+        ):
+            yield
+    finally:
+        connections.close_all()
+        connections.settings.update(originals)
+        teardown_databases(old_config, verbosity=0)
+        test_settings['NAME'] = test_name
+        shutil.rmtree(media_root, ignore_errors=True)
+
+
+def _write_sample_image():
+    """Stores the sample image with its renditions and returns its storage name."""
+    img = Image.new('RGB', (1600, 1200), (27, 156, 209))
+    name = default_storage.save(SAMPLE_IMAGE_NAME, ContentFile(encode_webp(img).getvalue()))
+    generate_renditions(ProductImage(image=name).image, avif=True)
+    return name
+
+
+def seed_catalog(products, seed=1):
+    """
+    Fills the (test) database with `products` active products, their
+    galleries, and a proportional number of blog posts, news items, services
+    and testimonials. Uses bulk_create, so model save() hooks and signals do
+    not run; the rendered rich text is filled in here and the search index
+    is rebuilt at the end instead.
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    image_name = _write_sample_image()
+    sample_html, sample_summary, sample_reading_time = render_rich_text(SAMPLE_HTML)
+
+    Service.objects.bulk_create([
+        Service(name=f'Service {i}', description='Comprehensive eye care.', image=image_name,
+                details_title=f'Service {i}', details_description=SAMPLE_HTML)
+        for i in range(8)
+    ])
+    Testimonial.objects.bulk_create([
+        Testimonial(name=f'Customer {i}', comment='Great service and a wide range of frames.',
+                    sort_order=i, is_google_review=bool(i % 2))
+        for i in range(30)
+    ])
+
+    articles = max(products // 20, 20)
+    Blog.objects.bulk_create([
+        Blog(title=f'Choosing frames for your face shape, part {i}', slug=f'blog-{i}',
+             content=SAMPLE_HTML, content_html=sample_html, summary=sample_summary, reading_time=sample_reading_time,
+             excerpt='How to pick frames that suit you.', author='Visionmark',
+             featured_image=image_name, is_published=i % 10 != 0,
+             published_at=now - timedelta(hours=i))
+        for i in range(articles)
+    ], batch_size=1000)
+    News.objects.bulk_create([
+        News(title=f'Store update {i}', slug=f'news-{i}', subtitle='New arrivals in store',
+             location='Kochi', content=SAMPLE_HTML, content_html=sample_html, summary=sample_summary,
+             reading_time=sample_reading_time, featured_image=image_name,
+             published_at=now - timedelta(hours=i))
+        for i in range(articles)
+    ], batch_size=1000)
+
+    categories = [choice for choice, _ in Product.Category.choices]
+    batch = 2000
+    for start in range(0, products, batch):
+        created = Product.objects.bulk_create([
+            Product(
+                name=f'{rng.choice(BRANDS) or "Classic"} Frame {i}', slug=f'frame-{i}', sku=f'VM{i:06d}',
+                category=rng.choice(categories), brand=rng.choice(BRANDS), size=rng.choice(SIZES),
+                short_description='Lightweight acetate frame.', description=SAMPLE_HTML,
+                description_html=sample_html,
+                price=Decimal(rng.randrange(800, 20000)),
+                sale_price=Decimal(rng.randrange(500, 800)) if rng.random() < 0.3 else None,
+                stock=rng.randrange(0, 50), is_featured=i % 20 == 0,
+            )
+            for i in range(start, min(start + batch, products))
+        ])
+        ProductImage.objects.bulk_create([
+            ProductImage(product=product, image=image_name, is_primary=j == 0, sort_order=j)
+            for product in created
+            for j in range(GALLERY_IMAGES_PER_PRODUCT)
+        ], batch_size=5000)
+
+    # bulk_create() skips Product.save() and its signals, so fill the card
+    # columns and the brand/size registry afterwards.
+    call_command('sync_product_cards', stdout=StringIO())
+    call_command('rebuild_catalog_terms', stdout=StringIO())
+    call_command('rebuild_search_index', stdout=StringIO())
+
+
+def benchmark_routes():
+    """
+    Returns [(label, url)] covering every pattern in myapp.urls, with sample
+    arguments taken from the seeded data, plus the query-string variants of
+    the catalog and search that take different code paths.
+    """
+    active_products = Product.objects.filter(is_active=True)
+    samples = {
+        'servicedetails': [{'service_id': Service.objects.order_by('id').values_list('id', flat=True)[0]}],
+        'blog_single': [{'slug': Blog.objects.filter(is_published=True).order_by('id').values_list('slug', flat=True)[0]}],
+        'news_detail': [{'slug': News.objects.order_by('id').values_list('slug', flat=True)[0]}],
+        'product_detail': [{'slug': active_products.order_by('id').values_list('slug', flat=True)[active_products.count() // 2]}],
+        'sitemap_section': [{'section': section} for section in SITEMAPS],
+    }
+
+    routes = []
+    for pattern in urlpatterns:
+        if pattern.pattern.converters and pattern.name not in samples:
+            raise ValueError(f"No sample arguments for the '{pattern.name}' route; add them to benchmark_routes().")
+        variants = samples.get(pattern.name, [{}])
+        for kwargs in variants:
+            label = pattern.name if len(variants) == 1 else ':'.join([pattern.name, *map(str, kwargs.values())])
+            routes.append((label, reverse(pattern.name, kwargs=kwargs)))
+
+    # The cursor of the last page, as its Next link would be on the page before.
+    catalog = KeysetPaginator(active_products.sort_catalog(None).cards(), 9)  # 9 per page in views.products
+    last_page = -(-active_products.count() // catalog.per_page)
+    last_row = catalog.with_keys(catalog.queryset)[(last_page - 1) * catalog.per_page - 1]
+    routes += [
+        ('products:last_page', f"{reverse('products')}?cursor={catalog.encode_cursor('after', last_page, last_row)}"),
+        ('products:filtered', f"{reverse('products')}?category=sunglasses&brand=Oakley&min_price=1000&sort=price_asc"),
+        ('search:query', f"{reverse('search')}?q=acetate+frame"),
+        ('search_suggest:query', f"{reverse('search_suggest')}?q=fr"),
+    ]
+    return routes
+
+
+def _percentile(timings, percent):
+    return statistics.quantiles(timings, n=100, method='inclusive')[percent - 1]
+
+
+@contextmanager
+def _capture_queries():
+    """Yields a function returning the number of queries run so far in the block, on any alias."""
+    with ExitStack() as stack:
+        contexts = [stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in connections]
+        yield lambda: sum(len(context) for context in contexts)
+
+
+def measure_route(client, url, requests):
+    """
+    Measures one URL:
+
+    - cold: first request after clearing the cache (time, queries, and the
+      peak memory allocated while handling it, traced in a separate run so
+      tracemalloc does not skew the timing);
+    - warm: `requests` repeated requests (p50/p95/p99 latency and the most
+      queries any single one made).
+    """
+    cache.clear()
+    with _capture_queries() as query_count:
+        start = time.perf_counter()
+        response = client.get(url)
+        cold_ms = (time.perf_counter() - start) * 1000
+    if response.status_code >= 400:
+        raise RuntimeError(f"{url} returned {response.status_code}")
+    cold_queries = query_count()
+
+    cache.clear()
+    tracemalloc.start()
+    try:
+        client.get(url)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    timings = []
+    warm_queries = 0
+    with _capture_queries() as query_count:
+        for _ in range(requests):
+            before = query_count()
+            start = time.perf_counter()
+            client.get(url)
+            timings.append((time.perf_counter() - start) * 1000)
+            warm_queries = max(warm_queries, query_count() - before)
+
+    return {
+        'status': response.status_code,
+        'bytes': len(response.content),
+        'cold_ms': round(cold_ms, 2),
+        'cold_queries': cold_queries,
+        'peak_kb': round(peak / 1024, 1),
+        'p50_ms': round(_percentile(timings, 50), 2),
+        'p95_ms': round(_percentile(timings, 95), 2),
+        'p99_ms': round(_percentile(timings, 99), 2),
+        'warm_queries': warm_queries,
+    }
+
+
+def find_regressions(results, baseline, tolerance=0.25, min_ms=2.0):
+    """
+    Compares measured routes with a stored baseline. Query counts are
+    deterministic and may not grow at all; latency and memory may grow by
+    `tolerance` (a fraction), and latency by at least `min_ms` so that noise
+    on sub-millisecond cached pages does not fail the run. Metrics missing
+    from the baseline (a --queries-only one) are not compared.
+    """
+    regressions = []
+    for label, current in results.items():
+        previous = baseline.get(label)
+        if previous is None:
+            continue
+        for metric in ('cold_queries', 'warm_queries'):
+            if current[metric] > previous[metric]:
+                regressions.append(f"{label}: {metric} {previous[metric]} -> {current[metric]}")
+        for metric in ('cold_ms', 'p95_ms'):
+            if metric not in previous:
+                continue
+            limit = max(previous[metric] * (1 + tolerance), previous[metric] + min_ms)
+            if current[metric] > limit:
+                regressions.append(f"{label}: {metric} {previous[metric]} -> {current[metric]}")
+        if 'peak_kb' in previous and current['peak_kb'] > previous['peak_kb'] * (1 + tolerance):
+            regressions.append(f"{label}: peak_kb {previous['peak_kb']} -> {current['peak_kb']}")
+    return regressions
+
+
+# Serving modes compared by measure_concurrency(): the interface and the
+# views module. 'asgi-sync' is the sync views under ASGI, each request
+# handed to a thread through sync_to_async.
+SERVER_MODES = {
+    'wsgi': ('wsgi', views),
+    'asgi-sync': ('asgi', views),
+    'asgi': ('asgi', async_views),
+}
+
+
+def _urlconf(views_module):
+    urlconf = ModuleType(f'benchmark_urls_{views_module.__name__}')
+    urlconf.urlpatterns = view_urlpatterns(views_module)
+    return urlconf
+
+
+def _split_url(url):
+    path, _, query = url.partition('?')
+    return path, query
+
+
+def _wsgi_request(handler, url):
+    path, query = _split_url(url)
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query, 'SCRIPT_NAME': '',
+        'SERVER_NAME': 'testserver', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': 'testserver', 'REMOTE_ADDR': '127.0.0.1',
+        'wsgi.input': BytesIO(), 'wsgi.errors': StringIO(), 'wsgi.url_scheme': 'http',
+        'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+    }
+    statuses = []
+    body = handler(environ, lambda status, headers, exc_info=None: statuses.append(status))
+    try:
+        for _ in body:
+            pass
+    finally:
+        body.close()
+    return int(statuses[0].split()[0])
+
+
+async def _asgi_request(handler, url):
+    path, query = _split_url(url)
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': query.encode(),
+        'root_path': '', 'headers': [(b'host', b'testserver')],
+        'client': ('127.0.0.1', 0), 'server': ('testserver', 80),
+    }
+    received = False
+    statuses = []
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # The client stays connected; the handler cancels this wait when done.
+        await asyncio.Future()
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            statuses.append(message['status'])
+
+    await handler(scope, receive, send)
+    return statuses[0]
+
+
+def _summarize_load(timings, elapsed, errors):
+    return {
+        'requests': len(timings),
+        'errors': errors,
+        'rps': round(len(timings) / elapsed, 1),
+        'p50_ms': round(_percentile(timings, 50), 2),
+        'p95_ms': round(_percentile(timings, 95), 2),
+        'p99_ms': round(_percentile(timings, 99), 2),
+    }
+
+
+def _run_wsgi_load(urls, concurrency):
+    handler = WSGIHandler()
+
+    def timed(url):
+        start = time.perf_counter()
+        status = _wsgi_request(handler, url)
+        return (time.perf_counter() - start) * 1000, status
+
+    for url in dict.fromkeys(urls):
+        timed(url)  # Warm the page caches and the per-thread connection.
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(timed, urls))
+    return results, time.perf_counter() - start
+
+
+async def _run_asgi_load(urls, concurrency):
+    handler = ASGIHandler()
+    limit = asyncio.Semaphore(concurrency)
+
+    async def timed(url):
+        async with limit:
+            start = time.perf_counter()
+            status = await _asgi_request(handler, url)
+            return (time.perf_counter() - start) * 1000, status
+
+    for url in dict.fromkeys(urls):
+        await timed(url)
+    start = time.perf_counter()
+    results = await asyncio.gather(*(timed(url) for url in urls))
+    return results, time.perf_counter() - start
+
+
+def measure_concurrency(mode, urls, concurrency):
+    """
+    Serves `urls` (one request each, in order) through the WSGI or ASGI
+    handler of SERVER_MODES[mode] with `concurrency` requests in flight:
+    a thread pool for WSGI, like a threaded server, and concurrent tasks on
+    one event loop for ASGI. Every distinct URL is requested once first so
+    both sides start from the same warm caches. Returns throughput and
+    p50/p95/p99 latency; latency includes time spent queued behind other
+    requests, which is what a client at that concurrency sees.
+    """
+    interface, views_module = SERVER_MODES[mode]
+    with override_settings(ROOT_URLCONF=_urlconf(views_module)):
+        if interface == 'wsgi':
+            results, elapsed = _run_wsgi_load(urls, concurrency)
+        else:
+            results, elapsed = asyncio.run(_run_asgi_load(urls, concurrency))
+    timings = [timing for timing, _ in results]
+    errors = sum(status >= 400 for _, status in results)
+    return _summarize_load(timings, elapsed, errors)
+
+
+# What SQLite does without myapp.sqlite's pragmas: rollback journal, full
+# fsync per commit, no mmap, 2 MB page cache.
+SQLITE_DEFAULT_PRAGMAS = {'journal_mode': 'delete', 'synchronous': 'full', 'mmap_size': 0, 'cache_size': -2000}
+
+
+@contextmanager
+def _sqlite_defaults():
+    """
+    Runs the block the way the site ran before myapp.sqlite: default
+    pragmas, a new connection per request, deferred transactions, and every
+    read on 'default'.
+    """
+    originals = {alias: dict(connections.settings[alias]) for alias in connections}
+    for database in connections.settings.values():
+        options = {**database['OPTIONS'], 'pragmas': SQLITE_DEFAULT_PRAGMAS}
+        options.pop('transaction_mode', None)
+        database.update(CONN_MAX_AGE=0, OPTIONS=options)
+    middleware = [name for name in settings.MIDDLEWARE if not name.endswith('.ReadOnlyDatabaseMiddleware')]
+    connections.close_all()
+    try:
+        with override_settings(MIDDLEWARE=middleware):
+            yield
+    finally:
+        connections.close_all()
+        for alias, database in originals.items():
+            connections.settings[alias].update(database)
+
+
+def _admin_saves(stop, hold, rows):
+    """
+    Saves products like the admin does until `stop`, each in one
+    transaction that also updates `rows` other products (a bulk change
+    action) and then stays open `hold` seconds, the time inline image
+    uploads spend being compressed. Returns (save ms, errors).
+    """
+    product_ids = list(Product.objects.order_by('id').values_list('id', flat=True))
+    randomizer = random.Random(2)
+    timings, errors = [], 0
+    try:
+        while time.monotonic() < stop:
+            start = time.perf_counter()
+            try:
+                with transaction.atomic():
+                    product = Product.objects.get(pk=randomizer.choice(product_ids))
+                    product.stock += 1
+                    product.save()
+                    first = randomizer.randrange(max(len(product_ids) - rows, 1))
+                    Product.objects.filter(pk__in=product_ids[first:first + rows]).update(
+                        stock=F('stock') + 1, updated_at=timezone.now(),
+                    )
+                    time.sleep(hold)
+            except Exception:
+                errors += 1
+            else:
+                timings.append((time.perf_counter() - start) * 1000)
+    finally:
+        connections.close_all()
+    return timings, errors
+
+
+def _page_reads(handler, urls, stop):
+    timings, errors, index = [], 0, 0
+    try:
+        while time.monotonic() < stop:
+            url = urls[index % len(urls)]
+            index += 1
+            start = time.perf_counter()
+            status = _wsgi_request(handler, url)
+            timings.append((time.perf_counter() - start) * 1000)
+            errors += status >= 500
+    finally:
+        connections.close_all()
+    return timings, errors
+
+
+def measure_read_stalls(urls, readers, duration, hold, rows, tuned=True):
+    """
+    Serves `urls` through the WSGI handler from `readers` threads for
+    `duration` seconds while another thread keeps making slow admin saves
+    (see _admin_saves()), on a file database. With tuned=False it runs
+    under _sqlite_defaults() instead of the site's database settings.
+    Returns the readers' and the writer's latency and error counts; page
+    caches are invalidated by every save, so readers keep hitting SQLite.
+    """
+    request_logger = logging.getLogger('django.request')
+    level = request_logger.level
+    # "database is locked" errors are counted, not printed one by one.
+    request_logger.setLevel(logging.CRITICAL)
+    try:
+        with ExitStack() as stack:
+            if not tuned:
+                stack.enter_context(_sqlite_defaults())
+            handler = WSGIHandler()
+            for url in dict.fromkeys(urls):
+                _wsgi_request(handler, url)
+            stop = time.monotonic() + duration
+            with ThreadPoolExecutor(max_workers=readers + 1) as pool:
+                writer = pool.submit(_admin_saves, stop, hold, rows)
+                offsets = [urls[index:] + urls[:index] for index in range(readers)]
+                reads = list(pool.map(lambda reader_urls: _page_reads(handler, reader_urls, stop), offsets))
+                saves, save_errors = writer.result()
+    finally:
+        request_logger.setLevel(level)
+
+    timings = [timing for reader_timings, _ in reads for timing in reader_timings]
+    return {
+        'reads': _summarize_load(timings, duration, sum(errors for _, errors in reads)),
+        'max_read_ms': round(max(timings), 2),
+        'saves': len(saves),
+        'save_errors': save_errors,
+        'save_p95_ms': round(_percentile(saves, 95), 2) if len(saves) > 1 else None,
+    }
+
+
+# (format, quality) pairs benchmark_encoders compares; WebP 80 is what the
+# site serves today and the reference for the size column.
+ENCODER_CANDIDATES = [('jpeg', 80), ('webp', 70), ('webp', 80), ('webp', 90)]
+if AVIF_SUPPORTED:
+    ENCODER_CANDIDATES += [('avif', 40), ('avif', 50), ('avif', 60)]
+ENCODERS = {'jpeg': encode_jpeg, 'webp': encode_webp, 'avif': encode_avif}
+
+
+def _on_white(img):
+    img = img.convert('RGBA')
+    background = Image.new('RGBA', img.size, (255, 255, 255, 255))
+    return Image.alpha_composite(background, img).convert('RGB')
+
+
+def psnr(original, encoded):
+    """
+    Peak signal-to-noise ratio in dB of `encoded` against `original` as seen
+    on a white page (higher is closer; identical images score 100).
+    """
+    difference = ImageChops.difference(_on_white(original), _on_white(encoded))
+    mse = sum(rms ** 2 for rms in ImageStat.Stat(difference).rms) / 3
+    return 100.0 if mse == 0 else min(20 * math.log10(255 / math.sqrt(mse)), 100.0)
+
+
+def measure_encoders(paths, widths):
+    """
+    Encodes every image in `paths` at each of `widths` with every
+    ENCODER_CANDIDATES entry and returns {(format, quality): {'bytes',
+    'encode_ms', 'psnr'}} with the bytes and time summed over all images and
+    the mean PSNR.
+    """
+    results = {candidate: {'bytes': 0, 'encode_ms': 0.0, 'psnr': []} for candidate in ENCODER_CANDIDATES}
+    for path in paths:
+        for width in widths:
+            img = open_image(path, size=(width, width * 4))
+            for (fmt, quality), result in results.items():
+                start = time.perf_counter()
+                data = ENCODERS[fmt](img, quality=quality).getvalue()
+                result['encode_ms'] += (time.perf_counter() - start) * 1000
+                result['bytes'] += len(data)
+                result['psnr'].append(psnr(img, Image.open(BytesIO(data))))
+    for result in results.values():
+        result['psnr'] = statistics.mean(result['psnr']) if result['psnr'] else 0.0
+    return results
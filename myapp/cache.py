@@ -0,0 +1,354 @@
+import asyncio
+import hashlib
+import re
+import time
+import uuid
+from datetime import datetime, timezone as dt_timezone
+from functools import wraps
+from urllib.parse import urlencode
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.db import connection
+from django.db.models import F
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.http import condition
+
+from .models import CatalogTerm, Service
+
+# How long a cached page lives if none of its models change.
+VIEW_CACHE_TIMEOUT = 60 * 60
+# How long one process may hold the right to render a cold page, and how long
+# other requests wait for it before rendering themselves.
+RENDER_LOCK_TIMEOUT = 10
+RENDER_WAIT = 2.0
+
+# Rendered {% csrf_token %} inputs are swapped for this marker before a page is
+# cached, and for the requesting client's own token when it is served.
+CSRF_PLACEHOLDER = '__VISIONMARK_CSRF_TOKEN__'
+CSRF_INPUT_RE = re.compile(r'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+
+# (version, menu) last read by this process. Checking the shared version key
+# costs one cache hit per request; the menu itself is only re-read when
+# another process has invalidated it.
+_local_services_menu = (None, None)
+
+
+def _model_version_key(model):
+    return f'model_version:{model._meta.label_lower}'
+
+
+def get_model_versions(models):
+    """
+    Returns {model: version token} from the shared cache. A model's token
+    changes whenever one of its rows is saved or deleted (see signals.py).
+    """
+    keys = {_model_version_key(model): model for model in models}
+    versions = cache.get_many(keys)
+    for key in keys.keys() - versions.keys():
+        cache.add(key, uuid.uuid4().hex, None)
+        versions[key] = cache.get(key)
+    return {model: versions[key] for key, model in keys.items()}
+
+
+async def aget_model_versions(models):
+    """get_model_versions() for async views."""
+    keys = {_model_version_key(model): model for model in models}
+    versions = await cache.aget_many(keys)
+    for key in keys.keys() - versions.keys():
+        await cache.aadd(key, uuid.uuid4().hex, None)
+        versions[key] = await cache.aget(key)
+    return {model: versions[key] for key, model in keys.items()}
+
+
+def bump_model_version(model):
+    cache.set(_model_version_key(model), uuid.uuid4().hex, None)
+
+
+def get_services_menu():
+    """
+    The services listed in the navbar and footer, as dicts with only the
+    fields those templates use. Served from process memory, then the shared
+    cache, and only hits the database after a Service was saved or deleted.
+    """
+    global _local_services_menu
+
+    version = get_model_versions([Service])[Service]
+    local_version, menu = _local_services_menu
+    if local_version == version:
+        return menu
+
+    menu_key = f'services_menu:{version}'
+    menu = cache.get(menu_key)
+    if menu is None:
+        menu = list(Service.objects.order_by('id').values('id', 'name'))
+        cache.set(menu_key, menu, None)
+
+    _local_services_menu = (version, menu)
+    return menu
+
+
+async def aget_services_menu():
+    """
+    get_services_menu() for async views, which cannot query the database
+    from the context processor. They store the result on the request as
+    `services_menu` before rendering (see async_views.render).
+    """
+    global _local_services_menu
+
+    version = (await aget_model_versions([Service]))[Service]
+    local_version, menu = _local_services_menu
+    if local_version == version:
+        return menu
+
+    menu_key = f'services_menu:{version}'
+    menu = await cache.aget(menu_key)
+    if menu is None:
+        menu = [row async for row in Service.objects.order_by('id').values('id', 'name')]
+        await cache.aset(menu_key, menu, None)
+
+    _local_services_menu = (version, menu)
+    return menu
+
+
+def _catalog_terms_key(kind, version):
+    return f'catalog_terms:{kind}:{version}'
+
+
+def _catalog_terms_query(kind):
+    return (CatalogTerm.objects.filter(kind=kind).order_by('value')
+            .values_list('value', 'product_count', 'active_count'))
+
+
+def get_catalog_terms(kind):
+    """
+    [(value, product count, active product count)] of a CatalogTerm kind in
+    value order. Served from the shared cache until a product write
+    recounts the terms.
+    """
+    key = _catalog_terms_key(kind, get_model_versions([CatalogTerm])[CatalogTerm])
+    terms = cache.get(key)
+    if terms is None:
+        terms = list(_catalog_terms_query(kind))
+        cache.set(key, terms, VIEW_CACHE_TIMEOUT)
+    return terms
+
+
+async def aget_catalog_terms(kind):
+    """get_catalog_terms() for async views."""
+    key = _catalog_terms_key(kind, (await aget_model_versions([CatalogTerm]))[CatalogTerm])
+    terms = await cache.aget(key)
+    if terms is None:
+        terms = [row async for row in _catalog_terms_query(kind)]
+        await cache.aset(key, terms, VIEW_CACHE_TIMEOUT)
+    return terms
+
+
+def _freeze(response):
+    """Cacheable snapshot of a response, or None if it must not be shared."""
+    if response.status_code != 200 or response.streaming or response.cookies:
+        return None
+    if hasattr(response, 'render') and not response.is_rendered:
+        response.render()
+    content = CSRF_INPUT_RE.sub(rf'\g<1>{CSRF_PLACEHOLDER}\g<2>', response.content.decode(response.charset))
+    return {
+        'content': content,
+        'content_type': response['Content-Type'],
+    }
+
+
+def thaw(request, snapshot):
+    """The response for `snapshot`, with the requesting client's CSRF token filled in."""
+    content = snapshot['content']
+    if CSRF_PLACEHOLDER in content:
+        content = content.replace(CSRF_PLACEHOLDER, get_token(request))
+    return HttpResponse(content, content_type=snapshot['content_type'])
+
+
+def _view_cache_keys(view, request, versions, dependencies, params):
+    """(page key, stale copy key, render lock key) of a cache_view page."""
+    query = urlencode(sorted((name, value) for name in params for value in request.GET.getlist(name)))
+    url = f'{request.scheme}://{request.get_host()}{request.path}?{query}'
+    version_tag = ','.join(versions[model] for model in dependencies)
+    url_hash = hashlib.md5(url.encode()).hexdigest()
+    key = f'view:{view.__name__}:{url_hash}:{hashlib.md5(version_tag.encode()).hexdigest()}'
+    return key, f'view-stale:{view.__name__}:{url_hash}', f'{key}:lock'
+
+
+def cache_view(*models, params=(), timeout=VIEW_CACHE_TIMEOUT):
+    """
+    Caches a GET view's response per scheme + host + path and the values of
+    the query parameters named in `params` (e.g. ('cursor',)), keyed on the
+    versions of the models the view reads. Other parameters (utm_source and
+    the like) do not change the page, so they share its entry rather than
+    adding one per value; a view must list every parameter it reads.
+    Service is always included because every page lists it in the navbar.
+    Saving or deleting a row of one of these models makes only the views
+    depending on it miss.
+
+    A cold entry is rendered by one request at a time: concurrent requests
+    serve the previous version of the page if there is one, or wait briefly
+    for the render to land. Works on sync and async views alike.
+    """
+    dependencies = (Service, *models)
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                if request.method not in ('GET', 'HEAD'):
+                    return await view(request, *args, **kwargs)
+
+                versions = await aget_model_versions(dependencies)
+                key, stale_key, lock_key = _view_cache_keys(view, request, versions, dependencies, params)
+
+                snapshot = await cache.aget(key)
+                if snapshot is not None:
+                    return thaw(request, snapshot)
+
+                if not await cache.aadd(lock_key, 1, RENDER_LOCK_TIMEOUT):
+                    snapshot = await cache.aget(stale_key)
+                    deadline = time.monotonic() + RENDER_WAIT
+                    while snapshot is None and time.monotonic() < deadline:
+                        await asyncio.sleep(0.05)
+                        snapshot = await cache.aget(key)
+                    if snapshot is not None:
+                        return thaw(request, snapshot)
+                    return await view(request, *args, **kwargs)
+
+                try:
+                    response = await view(request, *args, **kwargs)
+                    snapshot = _freeze(response)
+                    if snapshot is not None:
+                        await cache.aset_many({key: snapshot, stale_key: snapshot}, timeout)
+                finally:
+                    await cache.adelete(lock_key)
+                return response
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+
+            versions = get_model_versions(dependencies)
+            key, stale_key, lock_key = _view_cache_keys(view, request, versions, dependencies, params)
+
+            snapshot = cache.get(key)
+            if snapshot is not None:
+                return thaw(request, snapshot)
+
+            if not cache.add(lock_key, 1, RENDER_LOCK_TIMEOUT):
+                snapshot = cache.get(stale_key)
+                deadline = time.monotonic() + RENDER_WAIT
+                while snapshot is None and time.monotonic() < deadline:
+                    time.sleep(0.05)
+                    snapshot = cache.get(key)
+                if snapshot is not None:
+                    return thaw(request, snapshot)
+                return view(request, *args, **kwargs)
+
+            try:
+                response = view(request, *args, **kwargs)
+                snapshot = _freeze(response)
+                if snapshot is not None:
+                    cache.set_many({key: snapshot, stale_key: snapshot}, timeout)
+            finally:
+                cache.delete(lock_key)
+            return response
+        return wrapper
+    return decorator
+
+
+def content_state_sql(*querysets):
+    """
+    The single aggregate statement content_state() runs, as (sql, params),
+    or None when every queryset is empty by construction.
+    """
+    parts, params = [], []
+    for queryset in querysets:
+        if not queryset.query.is_sliced:
+            # Sliced querysets (a sidebar's latest N) need their ordering to pick their rows.
+            queryset = queryset.order_by()
+        rows = queryset.values(state_pk=F('pk'), state_updated=F('updated_at'))
+        try:
+            sql, query_params = rows.query.sql_with_params()
+        except EmptyResultSet:
+            continue
+        parts.append(
+            f'SELECT MAX(state_updated) AS latest, COUNT(*) AS total, SUM(state_pk) AS pk_sum '
+            f'FROM ({sql}) AS rows_{len(parts)}'
+        )
+        params.extend(query_params)
+    if not parts:
+        return None
+    return f"SELECT MAX(latest), SUM(total), SUM(pk_sum) FROM ({' UNION ALL '.join(parts)}) AS states", params
+
+
+def content_state(*querysets):
+    """
+    Returns (latest updated_at, row count, sum of primary keys) across
+    `querysets` using a single aggregate SQL statement, without loading any
+    rows. The key sum changes when a row of a sliced queryset is swapped
+    for another, which neither the count nor the latest updated_at shows.
+    """
+    statement = content_state_sql(*querysets)
+    if statement is None:
+        return None, 0, 0
+
+    with connection.cursor() as cursor:
+        cursor.execute(*statement)
+        latest, total, pk_sum = cursor.fetchone()
+
+    if isinstance(latest, str):
+        latest = parse_datetime(latest)
+    if isinstance(latest, datetime) and latest.tzinfo is None:
+        latest = latest.replace(tzinfo=dt_timezone.utc)
+    return latest, total or 0, pk_sum or 0
+
+
+def conditional_view(querysets_func):
+    """
+    Adds an ETag to a view and answers matching If-None-Match requests with
+    304 before the view runs.
+
+    `querysets_func(request, *args, **kwargs)` returns the querysets of the
+    rows the page renders, sliced like the page slices them, so only
+    changes to those rows change the ETag. It comes from their max
+    updated_at, row count and key sum (so deletions and rows leaving a
+    sidebar change it too) plus the Service version for the navbar, all
+    computed in one query. There is no Last-Modified: no timestamp covers
+    deletions or the navbar, so If-Modified-Since could answer 304 for a
+    changed page.
+    """
+    def _state(request, *args, **kwargs):
+        if not hasattr(request, '_content_state'):
+            request._content_state = content_state(*querysets_func(request, *args, **kwargs))
+        return request._content_state
+
+    def etag(request, *args, **kwargs):
+        latest, total, pk_sum = _state(request, *args, **kwargs)
+        if not hasattr(request, '_services_version'):
+            request._services_version = get_model_versions([Service])[Service]
+        tag = f'{request.path}|{latest.isoformat() if latest else ""}|{total}|{pk_sum}|{request._services_version}'
+        return hashlib.md5(tag.encode()).hexdigest()
+
+    def decorator(view):
+        conditional = condition(etag_func=etag)(view)
+        if not iscoroutinefunction(view):
+            return conditional
+
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            # condition() calls etag/last_modified synchronously, so the
+            # database and cache reads happen here first.
+            request._content_state = await sync_to_async(content_state)(
+                *querysets_func(request, *args, **kwargs)
+            )
+            request._services_version = (await aget_model_versions([Service]))[Service]
+            return await conditional(request, *args, **kwargs)
+        return async_wrapper
+    return decorator
@@ -1,10 +1,13 @@
-from .models import Service
+from .cache import get_services_menu
 
 def services_context(request):
     """
-    Context processor to make services available in all templates
+    Context processor to make services available in all templates.
+    Async views load the menu beforehand (the database cannot be queried
+    from here in an event loop) and leave it on the request.
     """
+    menu = getattr(request, 'services_menu', None)
     return {
-        'services': Service.objects.all()
+        'services': menu if menu is not None else get_services_menu()
     }
 
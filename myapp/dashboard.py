@@ -0,0 +1,26 @@
+from django.conf import settings
+
+from .middleware import get_endpoint_stats
+
+
+def dashboard_callback(request, context):
+    """
+    Unfold DASHBOARD_CALLBACK: adds the slowest endpoints recorded by
+    PerformanceMiddleware to the admin index.
+    """
+    context['perf_enabled'] = getattr(settings, 'PERF_INSTRUMENTATION', False)
+    context['perf_table'] = {
+        'headers': [
+            'Endpoint', 'Requests', 'p50 ms', 'p95 ms', 'Max ms',
+            'Avg queries', 'Avg DB ms', 'Avg template ms', 'Max duplicated queries',
+        ],
+        'rows': [
+            [
+                stats['endpoint'], stats['requests'], f"{stats['p50_ms']:.1f}", f"{stats['p95_ms']:.1f}",
+                f"{stats['max_ms']:.1f}", f"{stats['queries']:.1f}", f"{stats['db_ms']:.1f}",
+                f"{stats['template_ms']:.1f}", stats['duplicate_queries'],
+            ]
+            for stats in get_endpoint_stats()
+        ],
+    }
+    return context
@@ -1,19 +1,31 @@
 from django import forms
+from django.urls import reverse
 
-from .models import Product
+from .models import CatalogTerm, Product
 
 
 class DatalistTextInput(forms.TextInput):
+    """
+    Text input with a <datalist> of suggestions: the given `datalist`, or
+    with `source_url` the matches that URL returns as {"results": [...]}
+    for what has been typed so far.
+    """
     template_name = 'widgets/datalist_textinput.html'
 
-    def __init__(self, datalist=None, data_list_id='brand-list', *args, **kwargs):
+    class Media:
+        js = ['js/datalist-autocomplete.js']
+
+    def __init__(self, datalist=None, data_list_id='brand-list', source_url=None, *args, **kwargs):
         self.data_list = datalist or []
         self.data_list_id = data_list_id
+        self.source_url = source_url
         super().__init__(*args, **kwargs)
 
     def get_context(self, name, value, attrs):
         context = super().get_context(name, value, attrs)
         context['widget']['attrs']['list'] = self.data_list_id
+        if self.source_url:
+            context['widget']['attrs']['data-autocomplete-url'] = self.source_url
         context['data_list'] = self.data_list
         context['list_id'] = self.data_list_id
         return context
@@ -26,15 +38,45 @@ class ProductAdminForm(forms.ModelForm):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        brands = (Product.objects.exclude(brand='')
-                  .values_list('brand', flat=True)
-                  .distinct()
-                  .order_by('brand'))
-        self.fields['brand'].widget = DatalistTextInput(
-            datalist=brands,
-            data_list_id='brand-options'
-        )
-        self.fields['brand'].widget.attrs.setdefault(
-            'placeholder', 'Start typing or pick an existing brand'
-        )
+        # Suggestions come from the cached brand/size registry as the user
+        # types, so building the form reads nothing from the product table.
+        placeholders = {
+            CatalogTerm.Kind.BRAND: 'Start typing or pick an existing brand',
+            CatalogTerm.Kind.SIZE: 'Start typing or pick an existing size',
+        }
+        for kind, placeholder in placeholders.items():
+            self.fields[kind].widget = DatalistTextInput(
+                data_list_id=f'{kind}-options',
+                source_url=reverse('admin:myapp_product_catalog_terms', args=[kind]),
+            )
+            self.fields[kind].widget.attrs.setdefault('placeholder', placeholder)
+
+
+class ProductFilterForm(forms.Form):
+    """
+    Catalog filters read from the /products query string. Invalid values are
+    dropped field by field rather than rejecting the whole request.
+    """
+    SORT_CHOICES = [
+        ('featured', 'Featured'),
+        ('price_asc', 'Price: Low to High'),
+        ('price_desc', 'Price: High to Low'),
+        ('name_asc', 'Name A-Z'),
+        ('name_desc', 'Name Z-A'),
+        ('newest', 'Newest'),
+    ]
+
+    category = forms.MultipleChoiceField(choices=Product.Category.choices, required=False)
+    brand = forms.MultipleChoiceField(required=False)
+    min_price = forms.DecimalField(min_value=0, decimal_places=2, required=False)
+    max_price = forms.DecimalField(min_value=0, decimal_places=2, required=False)
+    sort = forms.ChoiceField(choices=SORT_CHOICES, required=False)
+
+    def __init__(self, *args, brands=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['brand'].choices = [(brand, brand) for brand in brands]
 
+    def get_filters(self):
+        """Returns the cleaned values of the fields that validated."""
+        self.is_valid()
+        return self.cleaned_data
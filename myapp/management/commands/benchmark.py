@@ -0,0 +1,107 @@
+import json
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+
+from myapp.benchmark import (
+    CATALOG_SIZES, benchmark_database, benchmark_routes, find_regressions, measure_route, seed_catalog,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds a throwaway test database with a synthetic catalog and measures "
+        "every public route: cold and warm latency, query counts and peak "
+        "allocated memory. Fails when a route regresses against the stored baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', choices=CATALOG_SIZES, default='1k',
+                            help="Number of products to seed (default: 1k).")
+        parser.add_argument('--requests', type=int, default=30,
+                            help="Warm requests per route used for the percentiles (default: 30).")
+        parser.add_argument('--route', action='append', dest='routes', metavar='LABEL',
+                            help="Only measure this route label (repeatable).")
+        parser.add_argument('--baseline', type=Path,
+                            help="Baseline JSON file (default: benchmarks/baseline-<size>.json).")
+        parser.add_argument('--update-baseline', action='store_true',
+                            help="Write the measured results as the new baseline instead of comparing.")
+        parser.add_argument('--queries-only', action='store_true',
+                            help="With --update-baseline, store only the query counts, which do not depend on the "
+                                 "machine, so the baseline can be committed.")
+        parser.add_argument('--no-compare', action='store_true',
+                            help="Only print the measurements, without a baseline.")
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help="Allowed latency/memory growth over the baseline as a fraction (default: 0.25).")
+        parser.add_argument('--min-ms', type=float, default=2.0,
+                            help="Latency growth always tolerated, in milliseconds (default: 2).")
+
+    def handle(self, *args, **options):
+        if options['requests'] < 2:
+            raise CommandError("--requests must be at least 2.")
+        if options['queries_only'] and not options['update_baseline']:
+            raise CommandError("--queries-only only applies with --update-baseline.")
+        baseline_path = options['baseline'] or Path(settings.BASE_DIR) / 'benchmarks' / f"baseline-{options['size']}.json"
+        if not (options['update_baseline'] or options['no_compare'] or baseline_path.exists()):
+            # Checked before seeding, which takes a while on the larger sizes.
+            raise CommandError(
+                f"No baseline at {baseline_path}; run with --update-baseline to create one, "
+                f"or --no-compare to only measure."
+            )
+
+        with benchmark_database():
+            results = self._run(options)
+
+        if options['update_baseline']:
+            if options['queries_only']:
+                results = {
+                    label: {key: result[key] for key in ('url', 'cold_queries', 'warm_queries')}
+                    for label, result in results.items()
+                }
+            baseline_path.parent.mkdir(parents=True, exist_ok=True)
+            baseline_path.write_text(json.dumps(results, indent=2, sort_keys=True) + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {baseline_path}"))
+            return
+
+        if options['no_compare']:
+            return
+
+        regressions = find_regressions(
+            results, json.loads(baseline_path.read_text()),
+            tolerance=options['tolerance'], min_ms=options['min_ms'],
+        )
+        if regressions:
+            for line in regressions:
+                self.stderr.write(self.style.ERROR(line))
+            raise CommandError(f"{len(regressions)} regression(s) against {baseline_path}")
+        self.stdout.write(self.style.SUCCESS(f"No regressions against {baseline_path}"))
+
+    def _run(self, options):
+        started = time.perf_counter()
+        seed_catalog(CATALOG_SIZES[options['size']])
+        self.stdout.write(f"Seeded {options['size']} catalog in {time.perf_counter() - started:.1f}s")
+
+        routes = benchmark_routes()
+        if options['routes']:
+            routes = [(label, url) for label, url in routes if label in options['routes']]
+
+        client = Client()
+        results = {}
+        self.stdout.write(
+            f"{'route':<28} {'cold ms':>8} {'cold q':>6} {'p50 ms':>8} {'p95 ms':>8} "
+            f"{'p99 ms':>8} {'warm q':>6} {'peak KB':>9}"
+        )
+        for label, url in routes:
+            try:
+                result = measure_route(client, url, options['requests'])
+            except RuntimeError as exc:
+                raise CommandError(str(exc))
+            results[label] = {'url': url, **result}
+            self.stdout.write(
+                f"{label:<28} {result['cold_ms']:>8.2f} {result['cold_queries']:>6} {result['p50_ms']:>8.2f} "
+                f"{result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f} {result['warm_queries']:>6} {result['peak_kb']:>9.1f}"
+            )
+        return results
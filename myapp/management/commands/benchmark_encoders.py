@@ -0,0 +1,63 @@
+from pathlib import Path
+
+from django.apps import apps
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.benchmark import measure_encoders
+from myapp.models import Product, ProductImage
+from myapp.utils import AVIF_SUPPORTED, RENDITION_WIDTHS
+
+# The stock PNGs are logos and icons, not photography.
+PHOTO_EXTENSIONS = {'.jpg', '.jpeg', '.webp'}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the JPEG, WebP and AVIF encoders at several qualities on product "
+        "photos: encode CPU time, bytes and PSNR against the source, at the card "
+        "and detail rendition widths."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', type=Path,
+                            help="Images to encode (default: product images from MEDIA_ROOT, "
+                                 "or the stock photos when there are none).")
+        parser.add_argument('--limit', type=int, default=20,
+                            help="Product images to sample when no paths are given (default: 20).")
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or self._sample(options['limit'])
+        if not paths:
+            raise CommandError("No images to benchmark.")
+        if not AVIF_SUPPORTED:
+            self.stdout.write(self.style.WARNING("Pillow was built without AVIF; only JPEG and WebP are compared."))
+
+        widths = [RENDITION_WIDTHS['card'], RENDITION_WIDTHS['detail']]
+        results = measure_encoders(paths, widths)
+        reference = results[('webp', 80)]['bytes']
+        renditions = len(paths) * len(widths)
+
+        self.stdout.write(f"{len(paths)} image(s) at {', '.join(f'{width}px' for width in widths)}")
+        self.stdout.write(f"{'encoder':<10} {'KB':>8} {'vs webp80':>10} {'ms/image':>9} {'PSNR dB':>8}")
+        for (fmt, quality), result in results.items():
+            self.stdout.write(
+                f"{f'{fmt} {quality}':<10} {result['bytes'] / 1024:>8.1f} "
+                f"{(result['bytes'] / reference - 1) * 100:>+9.1f}% "
+                f"{result['encode_ms'] / renditions:>9.1f} {result['psnr']:>8.2f}"
+            )
+
+    def _sample(self, limit):
+        names = []
+        for model, field_name in ((Product, 'main_image'), (ProductImage, 'image')):
+            names += (model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+                      .values_list(field_name, flat=True).distinct()[:limit])
+        paths = [Path(default_storage.path(name)) for name in names[:limit]]
+        paths = [path for path in paths if path.is_file()]
+        if not paths:
+            static_images = Path(apps.get_app_config('myapp').path) / 'static' / 'images'
+            paths = sorted(
+                path for path in static_images.rglob('*')
+                if path.suffix.lower() in PHOTO_EXTENSIONS
+            )[:limit]
+        return paths
@@ -0,0 +1,61 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.benchmark import (
+    CATALOG_SIZES, SERVER_MODES, benchmark_database, benchmark_routes, measure_concurrency, seed_catalog,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds a throwaway test database and serves the same shuffled mix of "
+        "public routes through WSGI (sync views on a thread pool), ASGI with the "
+        "sync views and ASGI with the async views, at each concurrency level, "
+        "reporting throughput and p50/p95/p99 latency."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', choices=CATALOG_SIZES, default='1k',
+                            help="Number of products to seed (default: 1k).")
+        parser.add_argument('--requests', type=int, default=500,
+                            help="Requests per mode and concurrency level (default: 500).")
+        parser.add_argument('--concurrency', type=int, action='append', metavar='N',
+                            help="Requests in flight (repeatable; default: 1, 16 and 64).")
+        parser.add_argument('--mode', action='append', dest='modes', choices=SERVER_MODES,
+                            help="Only run this serving mode (repeatable).")
+        parser.add_argument('--route', action='append', dest='routes', metavar='LABEL',
+                            help="Only request this route label (repeatable).")
+
+    def handle(self, *args, **options):
+        if options['requests'] < 2:
+            raise CommandError("--requests must be at least 2.")
+        with benchmark_database():
+            self._run(options)
+
+    def _run(self, options):
+        started = time.perf_counter()
+        seed_catalog(CATALOG_SIZES[options['size']])
+        self.stdout.write(f"Seeded {options['size']} catalog in {time.perf_counter() - started:.1f}s")
+
+        routes = benchmark_routes()
+        if options['routes']:
+            routes = [(label, url) for label, url in routes if label in options['routes']]
+        if not routes:
+            raise CommandError("No routes to request.")
+        # The same mix, in the same order, for every mode.
+        urls = [url for _, url in routes] * -(-options['requests'] // len(routes))
+        random.Random(1).shuffle(urls)
+        urls = urls[:options['requests']]
+
+        self.stdout.write(
+            f"{'mode':<10} {'concurrency':>11} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>6}"
+        )
+        for concurrency in options['concurrency'] or [1, 16, 64]:
+            for mode in options['modes'] or SERVER_MODES:
+                result = measure_concurrency(mode, urls, concurrency)
+                self.stdout.write(
+                    f"{mode:<10} {concurrency:>11} {result['rps']:>8.1f} {result['p50_ms']:>8.2f} "
+                    f"{result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f} {result['errors']:>6}"
+                )
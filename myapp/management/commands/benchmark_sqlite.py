@@ -0,0 +1,60 @@
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.benchmark import CATALOG_SIZES, benchmark_database, benchmark_routes, measure_read_stalls, seed_catalog
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds a throwaway SQLite file and serves the public routes from several "
+        "reader threads while a writer keeps making slow admin-style saves, once "
+        "with SQLite's defaults (rollback journal, a connection per request) and "
+        "once with the site's database settings (WAL, persistent connections, "
+        "read-only alias). Reports reader latency and failed requests."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', choices=CATALOG_SIZES, default='1k',
+                            help="Number of products to seed (default: 1k).")
+        parser.add_argument('--readers', type=int, default=8,
+                            help="Reader threads (default: 8).")
+        parser.add_argument('--duration', type=float, default=10.0,
+                            help="Seconds to run each configuration (default: 10).")
+        parser.add_argument('--hold', type=int, default=200,
+                            help="Milliseconds each save keeps its transaction open (default: 200).")
+        parser.add_argument('--rows', type=int, default=1000,
+                            help="Other products each save updates in its transaction (default: 1000).")
+
+    def handle(self, *args, **options):
+        if options['readers'] < 1 or options['duration'] <= 0:
+            raise CommandError("--readers and --duration must be positive.")
+        with tempfile.TemporaryDirectory(prefix='visionmark-sqlite-') as directory:
+            with benchmark_database(Path(directory) / 'benchmark.sqlite3'):
+                self._run(options)
+
+    def _run(self, options):
+        started = time.perf_counter()
+        seed_catalog(CATALOG_SIZES[options['size']])
+        self.stdout.write(f"Seeded {options['size']} catalog in {time.perf_counter() - started:.1f}s")
+
+        urls = [url for label, url in benchmark_routes() if not label.startswith('sitemap')]
+        random.Random(1).shuffle(urls)
+
+        self.stdout.write(
+            f"{'configuration':<14} {'reads/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} "
+            f"{'errors':>6} {'saves':>6} {'save errors':>11}"
+        )
+        for label, tuned in [('sqlite default', False), ('tuned', True)]:
+            result = measure_read_stalls(
+                urls, options['readers'], options['duration'], options['hold'] / 1000, options['rows'], tuned=tuned,
+            )
+            reads = result['reads']
+            self.stdout.write(
+                f"{label:<14} {reads['rps']:>8.1f} {reads['p50_ms']:>8.2f} {reads['p95_ms']:>8.2f} "
+                f"{reads['p99_ms']:>8.2f} {result['max_read_ms']:>8.2f} {reads['errors']:>6} "
+                f"{result['saves']:>6} {result['save_errors']:>11}"
+            )
@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.prerender import PRERENDERED_PAGES, page_path, write_page
+
+
+class Command(BaseCommand):
+    help = (
+        "Pre-renders the pages that only show their template and the services "
+        "menu (about, FAQ, contact, booking, terms, privacy, robots.txt) into "
+        "PRERENDER_ROOT, from where the views serve them without rendering. "
+        "Run it after collectstatic on every deploy; saving or deleting a "
+        "service rebuilds the pages by itself."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('pages', nargs='*', metavar='view',
+                            help="Only build these views' pages (default: all of them).")
+        parser.add_argument('--clear', action='store_true',
+                            help="Delete the built pages instead, so the views render again.")
+
+    def handle(self, *args, **options):
+        names = options['pages'] or list(PRERENDERED_PAGES)
+        unknown = set(names) - PRERENDERED_PAGES.keys()
+        if unknown:
+            raise CommandError(f"Not a pre-rendered view: {', '.join(sorted(unknown))}")
+
+        if options['clear']:
+            for name in names:
+                page_path(name).unlink(missing_ok=True)
+            self.stdout.write(self.style.SUCCESS(f"Deleted {len(names)} page(s) from {settings.PRERENDER_ROOT}"))
+            return
+
+        total = 0
+        for name in names:
+            size = write_page(name)
+            total += size
+            if options['verbosity'] > 1:
+                self.stdout.write(f"{page_path(name).name}: {size:,} bytes")
+        self.stdout.write(self.style.SUCCESS(
+            f"Built {len(names)} page(s) in {settings.PRERENDER_ROOT}, {total / 1024:,.0f} KB"
+        ))
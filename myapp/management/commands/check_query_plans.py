@@ -0,0 +1,123 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from myapp.cache import content_state_sql
+from myapp.models import Blog, CatalogTerm, News, Product, ProductImage, ProductQuerySet, Service, Testimonial
+from myapp.pagination import seek_after
+from myapp.sitemaps import SITEMAPS, ModelSitemap
+from myapp.views import (
+    _blog_single_rows, _news_detail_rows, _popular_posts, _product_detail_rows, _recent_news, _related_products,
+)
+
+# "SCAN <table>" with no index is a full table scan; "SCAN <table> USING
+# [COVERING] INDEX" walks an index in order and is fine.
+FULL_SCAN_RE = re.compile(r'\bSCAN (\w+)(?! USING)')
+TEMP_SORT_RE = re.compile(r'USE TEMP B-TREE FOR (ORDER BY|GROUP BY|DISTINCT)')
+
+# Tables small enough by nature that reading them whole is the right plan.
+SMALL_TABLES = {Service._meta.db_table}
+
+
+def hot_queries():
+    """
+    [(label, queryset or (sql, params), expects_scan)] mirroring the querysets built in
+    views.py, sitemaps.py, cache.py and the context processor. Keep in step
+    with those modules when their queries change. Sitemap shards list every
+    row of their section, so reading the table in id order is their plan.
+    """
+    published_blogs = Blog.objects.filter(is_published=True)
+    active_products = Product.objects.filter(is_active=True)
+    # Any key will do for EXPLAIN; deep pages seek past one of these.
+    sample_keys = {'listing_date': timezone.now(), 'is_featured': True, 'created_at': timezone.now(), 'name': 'm', 'effective_price': 1000.0, 'id': 1}
+    listing_key = ([('listing_date', True), ('id', True)], [sample_keys['listing_date'], 1])
+
+    queries = [
+        ('services menu', Service.objects.order_by('id').values('id', 'name'), False),
+        ('home: testimonials', Testimonial.objects.filter(is_published=True).order_by('-date', '-created_at')[:10], False),
+        ('home: latest products', active_products.order_by('-created_at')[:10], False),
+        ('blog list: page', Blog.objects.listing()[:6], False),
+        ('blog list: deep page', Blog.objects.listing().filter(seek_after(*listing_key))[:6], False),
+        ('blog single: post', published_blogs.filter(slug='sample'), False),
+        ('blog single: popular posts', _popular_posts('sample'), False),
+        ('news list: page', News.objects.listing()[:6], False),
+        ('news list: deep page', News.objects.listing().filter(seek_after(*listing_key))[:6], False),
+        ('news detail: recent news', _recent_news('sample'), False),
+        ('products: brands', CatalogTerm.objects.filter(kind=CatalogTerm.Kind.BRAND).order_by('value').values_list('value', 'product_count', 'active_count'), False),
+        ('catalog terms: recount', Product.objects.filter(brand__in=['Oakley']).order_by().values_list('brand').annotate(total=Count('id'), active=Count('id', filter=Q(is_active=True))), False),
+        ('products: category facet', active_products.order_by().values('category').annotate(count=Count('id')), False),
+        ('products: filtered page', active_products.filter_catalog(category=['sunglasses'], brand=['Oakley']).sort_catalog('featured')[:9], False),
+        ('product detail: gallery', ProductImage.objects.filter(product_id__in=[1]), False),
+        ('product detail: related', _related_products('sample'), False),
+        ('testimonials', Testimonial.objects.filter(is_published=True).order_by('sort_order', '-date', '-created_at'), False),
+        ('validators: blog single', content_state_sql(*_blog_single_rows(None, 'sample')), False),
+        ('validators: news detail', content_state_sql(*_news_detail_rows(None, 'sample')), False),
+        ('validators: product detail', content_state_sql(*_product_detail_rows(None, 'sample')), False),
+    ]
+    for sort, ordering in ProductQuerySet.CATALOG_ORDERINGS.items():
+        queries.append((f'products: page sorted by {sort}', active_products.sort_catalog(sort)[:9], False))
+        fields = [(name.lstrip('-'), name.startswith('-')) for name in ordering]
+        seek = seek_after(fields, [sample_keys[field] for field, _ in fields])
+        queries.append((f'products: deep page sorted by {sort}', active_products.sort_catalog(sort).filter(seek)[:9], False))
+
+    sitemap_querysets = []
+    for section, sitemap_class in SITEMAPS.items():
+        if issubclass(sitemap_class, ModelSitemap):
+            sitemap = sitemap_class()
+            sitemap_querysets.append(sitemap.get_queryset())
+            queries.append((f'sitemap: {section} shard', sitemap.items()[:sitemap.limit], True))
+    queries.append(('validators: sitemap index', content_state_sql(*sitemap_querysets), False))
+    return queries
+
+
+def _sql(query):
+    if isinstance(query, tuple):
+        return query
+    return query.query.get_compiler(using=query.db).as_sql()
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs EXPLAIN QUERY PLAN on the hot listing, detail, sitemap and "
+        "conditional-GET queries and fails if any of them scans a whole table."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plans', action='store_true',
+                            help="Print the plan of every query, not only the flagged ones.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("check_query_plans reads SQLite's EXPLAIN QUERY PLAN output.")
+
+        tables = set(connection.introspection.table_names())
+        full_scans = 0
+        for label, query, expects_scan in hot_queries():
+            sql, params = _sql(query)
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+                plan = [row[-1] for row in cursor.fetchall()]
+
+            scanned = {
+                table for line in plan for table in FULL_SCAN_RE.findall(line)
+                if table in tables and table not in SMALL_TABLES and not expects_scan
+            }
+            sorts = [line for line in plan if TEMP_SORT_RE.search(line)]
+
+            if scanned:
+                full_scans += 1
+                self.stdout.write(self.style.ERROR(f"FULL SCAN  {label}: {', '.join(sorted(scanned))}"))
+            elif sorts:
+                self.stdout.write(self.style.WARNING(f"TEMP SORT  {label}"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"ok         {label}"))
+
+            if scanned or sorts or options['verbose_plans']:
+                for line in plan:
+                    self.stdout.write(f"               {line}")
+
+        if full_scans:
+            raise CommandError(f"{full_scans} hot quer{'y' if full_scans == 1 else 'ies'} scan a whole table.")
@@ -0,0 +1,68 @@
+import os
+import time
+from pathlib import Path
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.storage import RENDITION_RE, image_fields
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes files in the image upload directories (and their renditions) "
+        "that no image field references any more: images of deleted rows and "
+        "replaced uploads. Rows deleted through the ORM release their files "
+        "right away; this sweeps up everything else."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-age', type=int, default=60,
+                            help="Only delete files older than this many minutes, so uploads whose "
+                                 "row is not saved yet are kept (default: 60).")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="List what would be deleted without deleting it.")
+
+    def handle(self, *args, **options):
+        if not hasattr(default_storage, 'path'):
+            raise CommandError("collect_media_garbage works on a filesystem MEDIA_ROOT.")
+
+        referenced = set()
+        upload_dirs = set()
+        for model, field_name in image_fields():
+            upload_dirs.add(model._meta.get_field(field_name).upload_to.strip('/'))
+            referenced.update(model._default_manager.values_list(field_name, flat=True).distinct())
+        referenced.discard('')
+        referenced.discard(None)
+        referenced_stems = {os.path.splitext(name)[0] for name in referenced}
+
+        cutoff = time.time() - options['min_age'] * 60
+        paths = set()
+        for upload_dir in upload_dirs:
+            root = Path(default_storage.path(upload_dir))
+            if root.is_dir():
+                paths.update(path for path in root.rglob('*') if path.is_file())
+
+        media_root = Path(default_storage.path(''))
+        count = freed = 0
+        for path in sorted(paths):
+            name = path.relative_to(media_root).as_posix()
+            rendition = RENDITION_RE.search(name)
+            if rendition:
+                in_use = name[:rendition.start()] in referenced_stems
+            else:
+                in_use = name in referenced
+            if in_use or path.stat().st_mtime > cutoff:
+                continue
+
+            count += 1
+            freed += path.stat().st_size
+            if options['verbosity'] > 1 or options['dry_run']:
+                self.stdout.write(name)
+            if not options['dry_run']:
+                default_storage.delete(name)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{'Would delete' if options['dry_run'] else 'Deleted'} {count} unreferenced file(s), "
+            f"{freed / 1024:,.0f} KB"
+        ))
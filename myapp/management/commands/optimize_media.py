@@ -0,0 +1,229 @@
+import json
+import os
+import posixpath
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from myapp.cache import bump_model_version
+from myapp.models import Product
+from myapp.storage import RENDITION_RE, image_fields, release_media
+from myapp.utils import (
+    OPTIMIZABLE_EXTENSIONS, RENDITION_EXTENSIONS, RENDITION_WIDTHS, forget_renditions, optimize_image_file,
+    rendition_name,
+)
+
+# Progress is written to the state file after this many finished images, so an
+# interrupted run loses at most this much work.
+STATE_SAVE_EVERY = 25
+
+
+def _walk_images(root):
+    for directory, _, files in os.walk(root):
+        for file_name in files:
+            path = Path(directory) / file_name
+            if path.suffix.lower() in OPTIMIZABLE_EXTENSIONS and not RENDITION_RE.search(file_name):
+                yield path
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-encodes the images in MEDIA_ROOT (and with --static the stock images "
+        "in myapp/static/images) across a process pool. Images referenced by model "
+        "fields are converted to WebP with fresh renditions and the rows are "
+        "repointed; other files keep their format and are only replaced when "
+        "smaller. Finished files are recorded by content hash, so reruns and "
+        "interrupted runs skip them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--quality', type=int, default=80,
+                            help="WebP/JPEG quality (default: 80). Changing it re-encodes everything.")
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help="Worker processes (default: one per CPU).")
+        parser.add_argument('--static', action='store_true',
+                            help="Also re-encode myapp/static/images in place.")
+        parser.add_argument('--state', type=Path,
+                            help="Progress file (default: MEDIA_ROOT/.optimize_media.json).")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Report what would be saved without writing files or rows.")
+
+    def handle(self, *args, **options):
+        if not hasattr(default_storage, 'path'):
+            raise CommandError("optimize_media works on a filesystem MEDIA_ROOT.")
+        media_root = Path(settings.MEDIA_ROOT)
+        state_path = options['state'] or media_root / '.optimize_media.json'
+        state = json.loads(state_path.read_text()) if state_path.exists() else {}
+        quality = options['quality']
+
+        tasks = self._collect(media_root, options['static'])
+        self.stdout.write(f"{len(tasks)} image(s) to check with {options['workers']} worker(s)")
+
+        totals = {'optimized': 0, 'skipped': 0, 'failed': 0, 'before': 0, 'after': 0}
+        finished = 0
+        try:
+            with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+                futures = {}
+                for key, path, referenced, avif in tasks:
+                    known = state.get(key)
+                    skip_digest = known['digest'] if known and known.get('quality') == quality else None
+                    future = pool.submit(
+                        optimize_image_file, str(path), quality=quality, to_webp=referenced,
+                        renditions=referenced, avif=avif, skip_digest=skip_digest, dry_run=options['dry_run'],
+                    )
+                    futures[future] = (key, referenced)
+
+                for future in as_completed(futures):
+                    key, referenced = futures[future]
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        totals['failed'] += 1
+                        self.stderr.write(self.style.ERROR(f"failed: {key}: {e}"))
+                        continue
+
+                    if result['skipped']:
+                        totals['skipped'] += 1
+                        continue
+                    totals['optimized'] += 1
+                    totals['before'] += result['before']
+                    totals['after'] += result['after']
+                    if options['dry_run']:
+                        continue
+
+                    if referenced:
+                        # The worker wrote the renditions straight to disk.
+                        forget_renditions(default_storage, Path(result['output']).relative_to(media_root).as_posix())
+                    if referenced and result['output'] != result['path']:
+                        state.pop(key, None)
+                        key = self._repoint(media_root, result)
+                    state[key] = {'digest': result['digest'], 'quality': quality}
+                    finished += 1
+                    if finished % STATE_SAVE_EVERY == 0:
+                        self._save_state(state_path, state)
+                    if options['verbosity'] > 1:
+                        self.stdout.write(f"{key}: {result['before']:,} -> {result['after']:,} bytes")
+        finally:
+            if not options['dry_run']:
+                self._save_state(state_path, state)
+
+        saved = totals['before'] - totals['after']
+        self.stdout.write(self.style.SUCCESS(
+            f"{'Would optimize' if options['dry_run'] else 'Optimized'} {totals['optimized']} image(s), "
+            f"skipped {totals['skipped']}, failed {totals['failed']}: "
+            f"{totals['before'] / 1024:,.0f} KB -> {totals['after'] / 1024:,.0f} KB "
+            f"({saved / 1024:,.0f} KB saved)"
+        ))
+
+    def _collect(self, media_root, include_static):
+        """[(state key, path, referenced by a model field, wants AVIF renditions)]."""
+        referenced = set()
+        avif_names = set()
+        for model, field_name in image_fields():
+            names = set(
+                model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+                .values_list(field_name, flat=True).distinct()
+            )
+            referenced |= names
+            if field_name in getattr(model, 'AVIF_FIELDS', ()):
+                avif_names |= names
+
+        tasks = [
+            (f'media:{name}', media_root / name, True, name in avif_names)
+            for name in sorted(referenced)
+            if Path(name).suffix.lower() in OPTIMIZABLE_EXTENSIONS and (media_root / name).is_file()
+        ]
+        if media_root.is_dir():
+            for path in sorted(_walk_images(media_root)):
+                name = path.relative_to(media_root).as_posix()
+                if name not in referenced:
+                    # CKEditor uploads and other files linked by URL: keep their names.
+                    tasks.append((f'media:{name}', path, False, False))
+        if include_static:
+            static_root = Path(apps.get_app_config('myapp').path) / 'static'
+            for path in sorted(_walk_images(static_root / 'images')):
+                tasks.append((f"static:{path.relative_to(static_root).as_posix()}", path, False, False))
+        return tasks
+
+    def _store_converted(self, media_root, result):
+        """
+        Saves the WebP the worker wrote through default_storage, so it is
+        named after its own content like any upload, and copies its
+        renditions to the matching names. Returns the new name and the
+        renditions copied, which are deleted with the worker's file once the
+        rows point at the copy.
+        """
+        output_name = Path(result['output']).relative_to(media_root).as_posix()
+        directory = default_storage.upload_directory(Path(result['path']).relative_to(media_root).as_posix())
+        with default_storage.open(output_name, 'rb') as output:
+            new_name = default_storage.save(posixpath.join(directory, Path(output_name).name), output)
+
+        copied = []
+        for extension in RENDITION_EXTENSIONS:
+            for width in RENDITION_WIDTHS.values():
+                rendition = rendition_name(output_name, width, extension)
+                if not default_storage.exists(rendition):
+                    continue
+                target = rendition_name(new_name, width, extension)
+                if target != rendition:
+                    if default_storage.exists(target):
+                        default_storage.delete(target)
+                    with default_storage.open(rendition, 'rb') as content:
+                        default_storage.save(target, content)
+                    copied.append(rendition)
+        return new_name, copied
+
+    def _repoint(self, media_root, result):
+        """
+        Points every row that used the original file at its WebP copy in one
+        transaction, then deletes the original, the worker's output and the
+        old renditions. Returns the state key of the new file.
+        """
+        old_name = Path(result['path']).relative_to(media_root).as_posix()
+        output_name = Path(result['output']).relative_to(media_root).as_posix()
+        new_name, copied = self._store_converted(media_root, result)
+        changed_models = set()
+        with transaction.atomic():
+            for model, field_name in image_fields():
+                values = {field_name: new_name}
+                if any(field.name == 'updated_at' for field in model._meta.fields):
+                    values['updated_at'] = timezone.now()
+                if model.objects.filter(**{field_name: old_name}).update(**values):
+                    changed_models.add(model)
+
+            # update() skips Product.save() and the gallery signal, so the
+            # denormalized card columns still name the old file.
+            products = list(Product.objects.filter(Q(card_image=old_name) | Q(card_hover_image=old_name))
+                            .only(*Product.CARD_SOURCES))
+            for product in products:
+                product.resolve_card_fields()
+            if products:
+                Product.objects.bulk_update(products, Product.CARD_COLUMNS)
+                changed_models.add(Product)
+
+            def cleanup():
+                # update() sends no signals, so expire the cached pages here.
+                for model in changed_models:
+                    bump_model_version(model)
+                # The worker named its renditions after the original, so
+                # they go only when the original does.
+                leftovers = [output_name, *copied] if release_media(old_name) else [output_name]
+                for name in leftovers:
+                    if default_storage.exists(name):
+                        default_storage.delete(name)
+
+            transaction.on_commit(cleanup)
+        return f'media:{new_name}'
+
+    def _save_state(self, state_path, state):
+        state_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = state_path.with_suffix('.tmp')
+        temp_path.write_text(json.dumps(state, indent=1, sort_keys=True))
+        os.replace(temp_path, state_path)
@@ -0,0 +1,51 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from myapp.models import ImageJob
+from myapp.storage import image_fields
+
+
+class Command(BaseCommand):
+    help = "Drains the image job queue: WebP conversion and responsive renditions."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help="Process the jobs currently queued, then exit.")
+        parser.add_argument('--interval', type=float, default=2.0,
+                            help="Seconds to sleep when the queue is empty.")
+        parser.add_argument('--stale-after', type=int, default=600,
+                            help="Requeue RUNNING jobs untouched for this many seconds (crashed workers).")
+        parser.add_argument('--enqueue-missing', action='store_true',
+                            help="First queue every stored image that lacks a rendition, "
+                                 "e.g. after a new rendition format was added.")
+
+    def handle(self, *args, **options):
+        if options['enqueue_missing']:
+            queued = 0
+            for model, field_name in image_fields():
+                rows = model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+                for instance in rows.only('pk', field_name).iterator(chunk_size=500):
+                    queued += ImageJob.enqueue(instance, field_name) is not None
+            self.stdout.write(f"Queued {queued} image(s) with missing renditions")
+
+        cutoff = timezone.now() - timedelta(seconds=options['stale_after'])
+        requeued = (ImageJob.objects
+                    .filter(status=ImageJob.Status.RUNNING, updated_at__lt=cutoff)
+                    .update(status=ImageJob.Status.PENDING))
+        if requeued:
+            self.stdout.write(f"Requeued {requeued} stale job(s)")
+
+        while True:
+            job = ImageJob.claim_next()
+            if job is None:
+                if options['once']:
+                    return
+                time.sleep(options['interval'])
+                continue
+
+            job.run()
+            style = self.style.SUCCESS if job.status == ImageJob.Status.DONE else self.style.ERROR
+            self.stdout.write(style(f"{job.status}: {job.source_name}"))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from myapp.cache import bump_model_version
+from myapp.models import CatalogTerm
+
+
+class Command(BaseCommand):
+    help = (
+        "Recounts the brand and size registry (CatalogTerm) from every product. "
+        "Product saves keep it current; run this after bulk edits, imports or "
+        "raw SQL that bypassed the model signals."
+    )
+
+    def handle(self, *args, **options):
+        CatalogTerm.objects.recount()
+        bump_model_version(CatalogTerm)
+        for kind, label in CatalogTerm.Kind.choices:
+            count = CatalogTerm.objects.filter(kind=kind).count()
+            self.stdout.write(f"{count} {label.lower()} value(s)")
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from myapp.models import Blog, News, Product
+from myapp.search import get_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the site search index from all products, blog posts and news."
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        backend.clear()
+        for model in (Product, Blog, News):
+            count = 0
+            for instance in model.objects.iterator(chunk_size=500):
+                backend.index(instance)
+                count += 1
+            self.stdout.write(f"Indexed {count} {model._meta.verbose_name_plural}")
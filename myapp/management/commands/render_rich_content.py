@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from myapp.cache import bump_model_version
+from myapp.models import Blog, ImageJob, News, Product
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-renders the stored HTML, summary and reading time of every blog "
+        "post, news item and product description, e.g. after the sanitizer "
+        "allowlist or the inline image renditions change. Inline images "
+        "without renditions are queued for process_image_jobs."
+    )
+
+    def handle(self, *args, **options):
+        for model, source in ((Blog, 'content'), (News, 'content'), (Product, 'description')):
+            count, batch, fields = 0, [], None
+            for instance in model.objects.only('pk', source).iterator(chunk_size=BATCH_SIZE):
+                fields = instance.render_content()
+                batch.append(instance)
+                if len(batch) == BATCH_SIZE:
+                    self._save(model, batch, fields, source)
+                    count += len(batch)
+                    batch = []
+            if batch:
+                self._save(model, batch, fields, source)
+                count += len(batch)
+            # bulk_update() sends no signals, so expire the cached pages here.
+            bump_model_version(model)
+            self.stdout.write(f"Rendered {count} {model._meta.verbose_name_plural}")
+
+    def _save(self, model, batch, fields, source):
+        model.objects.bulk_update(batch, fields)
+        for instance in batch:
+            ImageJob.enqueue_inline(instance, source)
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.cache import bump_model_version
+from myapp.models import Product, product_cards
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = (
+        "Recomputes the denormalized product card columns (card images, effective "
+        "price, discount) from each product's prices, main image and gallery, and "
+        "saves the rows that drifted, e.g. after bulk edits or raw SQL that "
+        "bypassed the model signals. With --verify only reports them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true',
+                            help="Report out-of-date products without fixing them; fails if there are any.")
+
+    def handle(self, *args, **options):
+        checked, stale, batch = 0, [], []
+        for product, fields in product_cards():
+            checked += 1
+            changed = {name: value for name, value in fields.items() if getattr(product, name) != value}
+            if not changed:
+                continue
+            stale.append(product.pk)
+            if options['verify'] or options['verbosity'] > 1:
+                details = ', '.join(f"{name}: {getattr(product, name)!r} -> {value!r}" for name, value in changed.items())
+                self.stdout.write(f"product {product.pk}: {details}")
+            if not options['verify']:
+                for name, value in fields.items():
+                    setattr(product, name, value)
+                batch.append(product)
+                if len(batch) == BATCH_SIZE:
+                    Product.objects.bulk_update(batch, Product.CARD_COLUMNS)
+                    batch = []
+
+        if options['verify']:
+            if stale:
+                raise CommandError(f"{len(stale)} of {checked} product(s) have out-of-date card columns.")
+            self.stdout.write(self.style.SUCCESS(f"All {checked} product(s) are up to date."))
+            return
+
+        if batch:
+            Product.objects.bulk_update(batch, Product.CARD_COLUMNS)
+        if stale:
+            # bulk_update() sends no signals, so expire the cached pages here.
+            bump_model_version(Product)
+        self.stdout.write(self.style.SUCCESS(f"Updated {len(stale)} of {checked} product(s)."))
@@ -0,0 +1,208 @@
+import statistics
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.base import Template
+
+from .routers import read_only_database
+
+# Samples kept per endpoint in the shared stats store.
+PERF_STATS_WINDOW = 200
+# Samples are buffered per process and merged into the shared store at most
+# this often, so instrumented requests do not each pay a cache round trip.
+PERF_STATS_FLUSH_INTERVAL = 5.0
+PERF_STATS_KEY = 'perf_stats'
+
+# Requests under these paths read and write in the same transactions (the
+# admin's change views), so their reads stay on the default connection.
+READ_WRITE_PATH_PREFIXES = ('/admin/', '/ckeditor5/')
+
+# Collector of the request being handled on this thread/task, if any.
+_current_collector = ContextVar('perf_collector', default=None)
+
+_original_template_render = Template.render
+
+
+def _instrumented_template_render(self, context):
+    collector = _current_collector.get()
+    if collector is None or collector.template_depth:
+        # Includes and extends render inside the outermost template; only
+        # the outermost call is timed so nothing is counted twice.
+        return _original_template_render(self, context)
+
+    collector.template_depth += 1
+    start = time.perf_counter()
+    try:
+        return _original_template_render(self, context)
+    finally:
+        collector.template_time += time.perf_counter() - start
+        collector.template_depth -= 1
+
+
+class RequestCollector:
+    """Query and template timings of one request."""
+
+    def __init__(self):
+        self.query_count = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        # Installed with connection.execute_wrapper(); the SQL still holds
+        # its placeholders, so identical statements with different
+        # parameters share a fingerprint (the signature of an N+1 loop).
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.query_count += 1
+            self.fingerprints[sql] += 1
+
+    @property
+    def duplicate_queries(self):
+        return sum(count - 1 for count in self.fingerprints.values() if count > 1)
+
+
+class PerfStatsStore:
+    """
+    Rolling per-endpoint samples, buffered in process memory and merged into
+    the shared cache so the admin dashboard sees every worker. Concurrent
+    flushes from different processes may drop a batch of samples; that is
+    acceptable for a sampling dashboard.
+    """
+
+    def __init__(self):
+        self.pending = defaultdict(list)
+        self.last_flush = time.monotonic()
+
+    def record(self, endpoint, sample):
+        self.pending[endpoint].append(sample)
+        if time.monotonic() - self.last_flush >= PERF_STATS_FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        pending, self.pending = self.pending, defaultdict(list)
+        self.last_flush = time.monotonic()
+        if not pending:
+            return
+        stats = cache.get(PERF_STATS_KEY) or {}
+        for endpoint, samples in pending.items():
+            stats[endpoint] = (stats.get(endpoint, []) + samples)[-PERF_STATS_WINDOW:]
+        cache.set(PERF_STATS_KEY, stats, None)
+
+
+perf_stats = PerfStatsStore()
+
+
+def get_endpoint_stats(limit=15):
+    """
+    Summaries of the recorded endpoints, slowest p95 first, for the admin
+    dashboard. Includes samples this process has not flushed yet.
+    """
+    perf_stats.flush()
+    summaries = []
+    for endpoint, samples in (cache.get(PERF_STATS_KEY) or {}).items():
+        durations = [sample['total_ms'] for sample in samples]
+        summaries.append({
+            'endpoint': endpoint,
+            'requests': len(samples),
+            'p50_ms': statistics.median(durations),
+            'p95_ms': statistics.quantiles(durations, n=20, method='inclusive')[18] if len(durations) > 1 else durations[0],
+            'max_ms': max(durations),
+            'queries': statistics.mean(sample['queries'] for sample in samples),
+            'db_ms': statistics.mean(sample['db_ms'] for sample in samples),
+            'template_ms': statistics.mean(sample['template_ms'] for sample in samples),
+            'duplicate_queries': max(sample['duplicate_queries'] for sample in samples),
+        })
+    summaries.sort(key=lambda summary: summary['p95_ms'], reverse=True)
+    return summaries[:limit]
+
+
+class PerformanceMiddleware:
+    """
+    Opt-in (settings.PERF_INSTRUMENTATION) per-request instrumentation:
+    counts SQL queries and duplicated statements, and times the database,
+    template rendering and the whole request. Results go out as a
+    Server-Timing header and into the rolling stats shown on the admin
+    dashboard. Place it first in MIDDLEWARE so the total covers every other
+    middleware.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PERF_INSTRUMENTATION', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        Template.render = _instrumented_template_render
+
+    def __call__(self, request):
+        collector = RequestCollector()
+        token = _current_collector.set(collector)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(collector))
+                response = self.get_response(request)
+        finally:
+            _current_collector.reset(token)
+        total = time.perf_counter() - start
+
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={collector.db_time * 1000:.1f};desc="{collector.query_count} queries, '
+            f'{collector.duplicate_queries} duplicated"',
+            f'tpl;dur={collector.template_time * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ])
+
+        match = request.resolver_match
+        endpoint = f'{request.method} {match.view_name if match else "unresolved"}'
+        perf_stats.record(endpoint, {
+            'total_ms': round(total * 1000, 2),
+            'queries': collector.query_count,
+            'db_ms': round(collector.db_time * 1000, 2),
+            'template_ms': round(collector.template_time * 1000, 2),
+            'duplicate_queries': collector.duplicate_queries,
+        })
+        return response
+
+
+class ReadOnlyDatabaseMiddleware:
+    """
+    Handles GET and HEAD requests for the public pages inside
+    read_only_database(), so routers.ReadOnlyRouter serves their queries
+    from the read-only connection.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _reads_only(self, request):
+        return request.method in ('GET', 'HEAD') and not request.path.startswith(READ_WRITE_PATH_PREFIXES)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self._reads_only(request):
+            return self.get_response(request)
+        with read_only_database():
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        if not self._reads_only(request):
+            return await self.get_response(request)
+        with read_only_database():
+            return await self.get_response(request)
@@ -0,0 +1,93 @@
+from html import unescape
+
+from django.db import migrations
+from django.urls import reverse
+from django.utils.html import strip_tags
+
+# Frozen copies of myapp.search's document_for() and rowid scheme as of this
+# migration, so later changes to the live index do not change what migrating
+# an old database does. `manage.py rebuild_search_index` re-indexes with the
+# current code.
+SEARCH_KINDS = ('product', 'blog', 'news')
+BATCH_SIZE = 500
+
+
+def plain_text(html):
+    return unescape(strip_tags(html or ''))
+
+
+def product_document(row, categories):
+    body = [row.brand, categories.get(row.category, row.category), row.sku,
+            row.short_description, plain_text(row.description)]
+    return row.name, body, reverse('product_detail', args=[row.slug])
+
+
+def blog_document(row, categories):
+    body = [row.excerpt, row.author, plain_text(row.content)]
+    return row.title, body, reverse('blog_single', args=[row.slug])
+
+
+def news_document(row, categories):
+    body = [row.subtitle, row.location, plain_text(row.content)]
+    return row.title, body, reverse('news_detail', args=[row.slug])
+
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS myapp_search_index USING fts5("
+        "title, body, kind UNINDEXED, url UNINDEXED, "
+        "tokenize = 'porter unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+
+
+def _insert(cursor, rows):
+    cursor.executemany(
+        'INSERT INTO myapp_search_index (rowid, title, body, kind, url) VALUES (%s, %s, %s, %s, %s)', rows,
+    )
+
+
+def index_existing_rows(apps, schema_editor):
+    """Indexes the active products and published posts and news that predate the index."""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    Product = apps.get_model('myapp', 'Product')
+    categories = dict(Product._meta.get_field('category').flatchoices)
+    sources = [
+        ('product', Product.objects.filter(is_active=True), product_document),
+        ('blog', apps.get_model('myapp', 'Blog').objects.filter(is_published=True), blog_document),
+        ('news', apps.get_model('myapp', 'News').objects.filter(is_published=True), news_document),
+    ]
+    alias = schema_editor.connection.alias
+    with schema_editor.connection.cursor() as cursor:
+        for kind, queryset, document in sources:
+            rows = []
+            for row in queryset.using(alias).iterator(chunk_size=BATCH_SIZE):
+                title, body, url = document(row, categories)
+                rowid = row.pk * len(SEARCH_KINDS) + SEARCH_KINDS.index(kind)
+                rows.append((rowid, title, ' '.join(filter(None, body)), kind, url))
+                if len(rows) == BATCH_SIZE:
+                    _insert(cursor, rows)
+                    rows = []
+            if rows:
+                _insert(cursor, rows)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS myapp_search_index")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0004_product_catalog_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+        migrations.RunPython(index_existing_rows, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,90 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:38
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0005_search_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_active_created_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_active_category_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_active_brand_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_effective_price_idx',
+        ),
+        migrations.AddIndex(
+            model_name='blog',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['-published_at'], name='blog_published_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='blog',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['-created_at'], name='blog_published_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='blog',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['updated_at'], name='blog_published_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='news',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['-published_at', '-created_at'], name='news_published_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='news',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['updated_at'], name='news_published_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-created_at', '-id'], name='product_active_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['name', 'id'], name='product_active_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['category'], name='product_active_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['brand'], name='product_active_brand_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['updated_at'], name='product_active_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(django.db.models.functions.comparison.Coalesce('sale_price', 'price', output_field=models.FloatField()), models.F('id'), condition=models.Q(('is_active', True)), name='product_effective_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productimage',
+            index=models.Index(fields=['product', '-is_primary', 'sort_order', 'id'], name='productimage_primary_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productimage',
+            index=models.Index(fields=['product', 'sort_order', 'id'], name='productimage_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='testimonial',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['sort_order', '-date', '-created_at'], name='testimonial_published_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='testimonial',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['-date', '-created_at'], name='testimonial_recent_idx'),
+        ),
+    ]
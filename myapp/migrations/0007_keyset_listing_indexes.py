@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:40
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0006_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='blog',
+            name='blog_published_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='news',
+            name='news_published_idx',
+        ),
+        migrations.AddIndex(
+            model_name='blog',
+            index=models.Index(django.db.models.functions.comparison.Coalesce('published_at', 'created_at'), models.F('id'), condition=models.Q(('is_published', True)), name='blog_published_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='news',
+            index=models.Index(django.db.models.functions.comparison.Coalesce('published_at', 'created_at'), models.F('id'), condition=models.Q(('is_published', True)), name='news_published_idx'),
+        ),
+    ]
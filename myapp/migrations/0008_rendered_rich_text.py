@@ -0,0 +1,208 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:44
+
+from django.db import migrations, models
+
+import math
+import re
+from html import escape
+from html.parser import HTMLParser
+from urllib.parse import urlsplit
+
+from django.utils.text import Truncator
+
+# A frozen copy of myapp.rich_text as of this migration, without the inline
+# image handling that reads files: later changes to the live renderer must
+# not change what migrating an old database does. Inline images keep their
+# URL; `manage.py render_rich_content` upgrades them afterwards.
+ALLOWED_TAGS = {
+    'a', 'b', 'blockquote', 'br', 'code', 'em', 'figcaption', 'figure', 'h1', 'h2', 'h3', 'h4',
+    'h5', 'h6', 'hr', 'i', 'img', 'li', 'mark', 'ol', 'p', 'pre', 's', 'span', 'strong', 'sub',
+    'sup', 'table', 'tbody', 'td', 'tfoot', 'th', 'thead', 'tr', 'u', 'ul',
+}
+ALLOWED_ATTRIBUTES = {
+    'a': {'href', 'title', 'target', 'rel'},
+    'img': {'src', 'alt', 'width', 'height'},
+    'td': {'colspan', 'rowspan'},
+    'th': {'colspan', 'rowspan', 'scope'},
+    'ol': {'start', 'reversed'},
+    'figure': {'class'},
+    'span': {'class'},
+    'mark': {'class'},
+}
+VOID_TAGS = {'br', 'hr', 'img'}
+IMPLICITLY_CLOSED_TAGS = {'li', 'p', 'td', 'th', 'tr'}
+INLINE_TAGS = {'a', 'b', 'code', 'em', 'i', 'mark', 's', 'span', 'strong', 'sub', 'sup', 'u'}
+DROPPED_CONTENT_TAGS = {'script', 'style', 'iframe', 'object', 'embed', 'template', 'noscript', 'svg', 'math'}
+ALLOWED_URL_SCHEMES = {'', 'http', 'https', 'mailto', 'tel'}
+SAFE_CLASS_RE = re.compile(r'^[\w\- ]*$')
+WORDS_PER_MINUTE = 200
+SUMMARY_WORDS = 40
+SUMMARY_MAX_LENGTH = 300
+BATCH_SIZE = 500
+
+
+def _safe_url(url):
+    url = (url or '').strip()
+    try:
+        scheme = urlsplit(url).scheme.lower()
+    except ValueError:
+        return None
+    return url if scheme in ALLOWED_URL_SCHEMES else None
+
+
+class _Sanitizer(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.html = []
+        self.text = []
+        self.open_tags = []
+        self.dropping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag not in INLINE_TAGS:
+            self.text.append(' ')
+        if tag in DROPPED_CONTENT_TAGS:
+            self.dropping += 1
+            return
+        if self.dropping or tag not in ALLOWED_TAGS:
+            return
+
+        allowed = ALLOWED_ATTRIBUTES.get(tag, set())
+        attrs = {name: value or '' for name, value in attrs if name in allowed}
+        if tag == 'img':
+            src = _safe_url(attrs.get('src'))
+            if not src:
+                return
+            attrs.update({'src': src, 'loading': 'lazy', 'decoding': 'async'})
+        elif tag == 'a':
+            if 'href' in attrs:
+                href = _safe_url(attrs.pop('href'))
+                if href is not None:
+                    attrs['href'] = href
+            if attrs.get('target') == '_blank':
+                attrs['rel'] = 'noopener noreferrer'
+        if 'class' in attrs and not SAFE_CLASS_RE.match(attrs['class']):
+            del attrs['class']
+
+        if tag in IMPLICITLY_CLOSED_TAGS and self.open_tags and self.open_tags[-1] == tag:
+            self.html.append(f'</{self.open_tags.pop()}>')
+        rendered = ''.join(f' {name}="{escape(value)}"' for name, value in attrs.items())
+        self.html.append(f'<{tag}{rendered}>')
+        if tag not in VOID_TAGS:
+            self.open_tags.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS and self.open_tags and self.open_tags[-1] == tag:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag not in INLINE_TAGS:
+            self.text.append(' ')
+        if tag in DROPPED_CONTENT_TAGS:
+            self.dropping = max(self.dropping - 1, 0)
+            return
+        if self.dropping or tag not in self.open_tags:
+            return
+        while self.open_tags:
+            open_tag = self.open_tags.pop()
+            self.html.append(f'</{open_tag}>')
+            if open_tag == tag:
+                break
+
+    def handle_data(self, data):
+        if self.dropping:
+            return
+        self.html.append(escape(data, quote=False))
+        self.text.append(data)
+
+    def close(self):
+        super().close()
+        while self.open_tags:
+            self.html.append(f'</{self.open_tags.pop()}>')
+
+
+def render_rich_text(html):
+    sanitizer = _Sanitizer()
+    sanitizer.feed(html or '')
+    sanitizer.close()
+    words = ''.join(sanitizer.text).split()
+    summary = Truncator(Truncator(' '.join(words)).words(SUMMARY_WORDS)).chars(SUMMARY_MAX_LENGTH)
+    reading_time = max(1, math.ceil(len(words) / WORDS_PER_MINUTE)) if words else 0
+    return ''.join(sanitizer.html), summary, reading_time
+
+
+def _render_rows(model, source, render):
+    """Renders `source` of every row in pk batches, so no table is loaded whole."""
+    rows = model.objects.only('pk', source).order_by('pk')
+    last_pk = 0
+    while True:
+        batch = list(rows.filter(pk__gt=last_pk)[:BATCH_SIZE])
+        if not batch:
+            return
+        for row in batch:
+            fields = render(row, getattr(row, source))
+        model.objects.bulk_update(batch, fields)
+        last_pk = batch[-1].pk
+
+
+def _render_article(row, content):
+    row.content_html, row.summary, row.reading_time = render_rich_text(content)
+    return ['content_html', 'summary', 'reading_time']
+
+
+def _render_description(row, description):
+    row.description_html = render_rich_text(description)[0]
+    return ['description_html']
+
+
+def render_existing_content(apps, schema_editor):
+    for model_name in ('Blog', 'News'):
+        _render_rows(apps.get_model('myapp', model_name), 'content', _render_article)
+    _render_rows(apps.get_model('myapp', 'Product'), 'description', _render_description)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0007_keyset_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blog',
+            name='content_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='blog',
+            name='reading_time',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, help_text='Minutes'),
+        ),
+        migrations.AddField(
+            model_name='blog',
+            name='summary',
+            field=models.CharField(blank=True, editable=False, max_length=300),
+        ),
+        migrations.AddField(
+            model_name='news',
+            name='content_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='news',
+            name='reading_time',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, help_text='Minutes'),
+        ),
+        migrations.AddField(
+            model_name='news',
+            name='summary',
+            field=models.CharField(blank=True, editable=False, max_length=300),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='description_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(render_existing_content, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:12
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+# Product.CARD_COLUMNS as of this migration.
+CARD_COLUMNS = ['card_image', 'card_hover_image', 'effective_price', 'discount_percent']
+BATCH_SIZE = 500
+
+
+def card_fields(price, sale_price, main_image, gallery):
+    """A frozen copy of myapp.models.product_card_fields() as of this migration."""
+    primary = next((row for row in gallery if row[2]), gallery[0] if gallery else None)
+    hover = next((row for row in gallery if row is not primary), primary)
+    on_sale = sale_price is not None and price and sale_price < price
+    return {
+        'card_image': main_image or (primary[1] if primary else ''),
+        'card_hover_image': hover[1] if hover else (main_image or ''),
+        'effective_price': sale_price if sale_price is not None else price,
+        'discount_percent': max(1, int((price - sale_price) * 100 / price)) if on_sale else 0,
+    }
+
+
+def fill_card_columns(apps, schema_editor):
+    product_model = apps.get_model('myapp', 'Product')
+    image_model = apps.get_model('myapp', 'ProductImage')
+    products = product_model.objects.only('pk', 'price', 'sale_price', 'main_image').order_by('pk')
+    last_pk = 0
+    while True:
+        batch = list(products.filter(pk__gt=last_pk)[:BATCH_SIZE])
+        if not batch:
+            return
+        last_pk = batch[-1].pk
+        galleries = defaultdict(list)
+        rows = (image_model.objects
+                .filter(product_id__gte=batch[0].pk, product_id__lte=last_pk)
+                .order_by('product_id', 'sort_order', 'pk')
+                .values_list('product_id', 'pk', 'image', 'is_primary'))
+        for product_id, *row in rows:
+            galleries[product_id].append(tuple(row))
+        for product in batch:
+            fields = card_fields(product.price, product.sale_price, product.main_image.name or '', galleries[product.pk])
+            for name, value in fields.items():
+                setattr(product, name, value)
+        product_model.objects.bulk_update(batch, CARD_COLUMNS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0008_rendered_rich_text'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_effective_price_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='productimage',
+            name='productimage_primary_idx',
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='card_hover_image',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='card_image',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='discount_percent',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='effective_price',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=8),
+        ),
+        migrations.RunPython(fill_card_columns, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['effective_price', 'id'], name='product_effective_price_idx'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:17
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def fill_catalog_terms(apps, schema_editor):
+    product_model = apps.get_model('myapp', 'Product')
+    term_model = apps.get_model('myapp', 'CatalogTerm')
+    rows = []
+    for kind in ('brand', 'size'):
+        counts = (product_model.objects.exclude(**{kind: ''}).order_by().values_list(kind)
+                  .annotate(total=Count('id'), active=Count('id', filter=Q(is_active=True))))
+        rows += [
+            term_model(kind=kind, value=value, product_count=total, active_count=active)
+            for value, total, active in counts
+        ]
+    term_model.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0009_product_card_columns'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('brand', 'Brand'), ('size', 'Size')], max_length=16)),
+                ('value', models.CharField(max_length=120)),
+                ('product_count', models.PositiveIntegerField(default=0)),
+                ('active_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['kind', 'value'],
+            },
+        ),
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_active_brand_idx',
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['brand', 'is_active'], name='product_brand_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['size', 'is_active'], name='product_size_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='catalogterm',
+            constraint=models.UniqueConstraint(fields=('kind', 'value'), name='catalogterm_kind_value_uniq'),
+        ),
+        migrations.RunPython(fill_catalog_terms, migrations.RunPython.noop),
+    ]
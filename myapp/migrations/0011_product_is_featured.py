@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0010_catalog_terms'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='is_featured',
+            field=models.BooleanField(default=False, help_text="Listed first, newest first, under the catalog's Featured sort."),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-is_featured', '-created_at', '-id'], name='product_active_featured_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 22:05
+
+from django.db import migrations
+from django.db.models import F
+
+
+def ignore_higher_sale_prices(apps, schema_editor):
+    """Products whose sale price is not below the regular one cost the regular price."""
+    product_model = apps.get_model('myapp', 'Product')
+    product_model.objects.filter(sale_price__gte=F('price')).update(effective_price=F('price'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0011_product_is_featured'),
+    ]
+
+    operations = [
+        migrations.RunPython(ignore_higher_sale_prices, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,81 @@
+from collections import defaultdict
+from types import SimpleNamespace
+
 from django.db import models
+from django.db.models import Count, F, Q
+from django.db.models.functions import Coalesce
+from django.contrib.contenttypes.fields import GenericForeignKey
+from django.contrib.contenttypes.models import ContentType
+from django.core.files.storage import default_storage
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.utils import timezone
 from django_ckeditor_5.fields import CKEditor5Field
-from .utils import compress_image
+from .rich_text import render_rich_text
+from .storage import release_media
+from .utils import compress_image, generate_renditions, has_renditions
 
 # Create your models here.
 
+
+def _render_before_save(instance, source_field, save_kwargs):
+    """
+    Refreshes the instance's pre-rendered HTML from `source_field`, unless
+    the save is limited to update_fields that leave it out (e.g. ImageJob).
+    """
+    update_fields = save_kwargs.get('update_fields')
+    if update_fields is not None and source_field not in update_fields:
+        return
+    rendered_fields = instance.render_content()
+    if update_fields is not None:
+        save_kwargs['update_fields'] = [*update_fields, *rendered_fields]
+
+
+def product_card_fields(price, sale_price, main_image, gallery):
+    """
+    The denormalized card columns of a product (Product.CARD_COLUMNS) from
+    its prices, its main_image name and its gallery as [(pk, image name,
+    is_primary)] in sort_order, pk order. The main image is main_image, else
+    the first primary gallery image, else the first one; the hover image is
+    the first other gallery image, else the main one.
+    """
+    primary = next((row for row in gallery if row[2]), gallery[0] if gallery else None)
+    hover = next((row for row in gallery if row is not primary), primary)
+    on_sale = sale_price is not None and price and sale_price < price
+    return {
+        'card_image': main_image or (primary[1] if primary else ''),
+        'card_hover_image': hover[1] if hover else (main_image or ''),
+        # A sale price at or above the regular one is ignored, as the templates do.
+        'effective_price': sale_price if on_sale else price,
+        # At least 1 whenever the product is on sale, so templates can test it.
+        'discount_percent': max(1, int((price - sale_price) * 100 / price)) if on_sale else 0,
+    }
+
+
+def product_cards(batch_size=1000):
+    """
+    Yields (product, product_card_fields()) for every product, loading the
+    galleries one batch of products at a time.
+    """
+    products = Product.objects.only('pk', *Product.CARD_SOURCES, *Product.CARD_COLUMNS).order_by('pk')
+    last_pk = 0
+    while True:
+        batch = list(products.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            return
+        last_pk = batch[-1].pk
+        galleries = defaultdict(list)
+        rows = (ProductImage.objects
+                .filter(product_id__gte=batch[0].pk, product_id__lte=last_pk)
+                .order_by('product_id', 'sort_order', 'pk')
+                .values_list('product_id', 'pk', 'image', 'is_primary'))
+        for product_id, *row in rows:
+            galleries[product_id].append(tuple(row))
+        for product in batch:
+            yield product, product_card_fields(
+                product.price, product.sale_price, product.main_image.name or '', galleries[product.pk],
+            )
+
+
 class Service(models.Model):
     name = models.CharField(max_length=255)
     description = models.TextField()
@@ -20,11 +91,29 @@ class Service(models.Model):
         return self.name
 
     def save(self, *args, **kwargs):
-        if self.image:
-            compressed = compress_image(self.image)
-            if compressed:
-                self.image = compressed
         super().save(*args, **kwargs)
+        ImageJob.enqueue(self, 'image')
+
+
+class ArticleQuerySet(models.QuerySet):
+    """Shared by Blog and News."""
+
+    def listing(self):
+        """
+        Published articles newest first, by publish date (falling back to
+        creation for undated ones) with id as the tie-breaker, so the order
+        is total and KeysetPaginator can seek on it.
+        """
+        return (self.filter(is_published=True)
+                .annotate(listing_date=Coalesce('published_at', 'created_at'))
+                .order_by('-listing_date', '-id'))
+
+    def cards(self):
+        """
+        Only the columns list cards and sidebars render (model.CARD_FIELDS),
+        leaving the CKEditor HTML for the detail page.
+        """
+        return self.only(*self.model.CARD_FIELDS)
 
 
 class Blog(models.Model):
@@ -36,24 +125,48 @@ class Blog(models.Model):
     author = models.CharField(max_length=100, blank=True)
     is_published = models.BooleanField(default=False)
     published_at = models.DateTimeField(blank=True, null=True)
-    
+
+    # Filled from `content` on save by render_content(); served by the detail page.
+    content_html = models.TextField(blank=True, editable=False)
+    summary = models.CharField(max_length=300, blank=True, editable=False)
+    reading_time = models.PositiveSmallIntegerField(default=0, editable=False, help_text="Minutes")
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ArticleQuerySet.as_manager()
+
+    # Used by blog.html and the blog-single.html sidebar.
+    CARD_FIELDS = ('title', 'slug', 'excerpt', 'summary', 'featured_image', 'published_at')
+
     class Meta:
         ordering = ['-created_at']
         verbose_name = 'Blog Post'
         verbose_name_plural = 'Blog Posts'
+        # Partial indexes over published posts only: the blog list
+        # (ArticleQuerySet.listing()), the popular-posts sidebar and the
+        # ETag/sitemap MAX(updated_at).
+        indexes = [
+            models.Index(Coalesce('published_at', 'created_at'), F('id'), condition=Q(is_published=True), name='blog_published_idx'),
+            models.Index(fields=['-created_at'], condition=Q(is_published=True), name='blog_published_created_idx'),
+            models.Index(fields=['updated_at'], condition=Q(is_published=True), name='blog_published_updated_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
+    def render_content(self):
+        self.pending_inline_images = []
+        self.content_html, self.summary, self.reading_time = render_rich_text(
+            self.content, missing_renditions=self.pending_inline_images,
+        )
+        return ['content_html', 'summary', 'reading_time']
+
     def save(self, *args, **kwargs):
-        if self.featured_image:
-            compressed = compress_image(self.featured_image)
-            if compressed:
-                self.featured_image = compressed
+        _render_before_save(self, 'content', kwargs)
         super().save(*args, **kwargs)
+        ImageJob.enqueue(self, 'featured_image')
+        ImageJob.enqueue_inline(self, 'content')
 
 
 class News(models.Model):
@@ -73,23 +186,84 @@ class News(models.Model):
     is_published = models.BooleanField(default=True)
     published_at = models.DateTimeField(blank=True, null=True)
 
+    # Filled from `content` on save by render_content(); served by the detail page.
+    content_html = models.TextField(blank=True, editable=False)
+    summary = models.CharField(max_length=300, blank=True, editable=False)
+    reading_time = models.PositiveSmallIntegerField(default=0, editable=False, help_text="Minutes")
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ArticleQuerySet.as_manager()
+
+    # Used by news_list.html and the news_detail.html sidebar.
+    CARD_FIELDS = ('title', 'slug', 'news_type', 'featured_image', 'published_at')
+
     class Meta:
         ordering = ['-published_at', '-created_at']
         verbose_name = 'News & Update'
         verbose_name_plural = 'News & Updates'
+        indexes = [
+            models.Index(Coalesce('published_at', 'created_at'), F('id'), condition=Q(is_published=True), name='news_published_idx'),
+            models.Index(fields=['updated_at'], condition=Q(is_published=True), name='news_published_updated_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
+    def render_content(self):
+        self.pending_inline_images = []
+        self.content_html, self.summary, self.reading_time = render_rich_text(
+            self.content, missing_renditions=self.pending_inline_images,
+        )
+        return ['content_html', 'summary', 'reading_time']
+
     def save(self, *args, **kwargs):
-        if self.featured_image:
-            compressed = compress_image(self.featured_image)
-            if compressed:
-                self.featured_image = compressed
+        _render_before_save(self, 'content', kwargs)
         super().save(*args, **kwargs)
+        ImageJob.enqueue(self, 'featured_image')
+        ImageJob.enqueue_inline(self, 'content')
+
+
+class ProductQuerySet(models.QuerySet):
+    # Columns the product card (catalog, home, related products) renders.
+    CARD_FIELDS = (
+        'name', 'slug', 'price', 'size', 'rating',
+        'effective_price', 'discount_percent', 'card_image', 'card_hover_image',
+    )
+
+    # Sort keys accepted by the catalog; ties are broken by id so paging is stable.
+    CATALOG_ORDERINGS = {
+        'featured': ('-is_featured', '-created_at', '-id'),
+        'newest': ('-created_at', '-id'),
+        'price_asc': ('effective_price', 'id'),
+        'price_desc': ('-effective_price', '-id'),
+        'name_asc': ('name', 'id'),
+        'name_desc': ('-name', '-id'),
+    }
+
+    def filter_catalog(self, category=None, brand=None, min_price=None, max_price=None):
+        """
+        Applies the catalog sidebar filters. Price bounds apply to
+        effective_price, the price a customer pays.
+        """
+        qs = self
+        if category:
+            qs = qs.filter(category__in=category)
+        if brand:
+            qs = qs.filter(brand__in=brand)
+        if min_price is not None:
+            qs = qs.filter(effective_price__gte=min_price)
+        if max_price is not None:
+            qs = qs.filter(effective_price__lte=max_price)
+        return qs
+
+    def sort_catalog(self, sort):
+        return self.order_by(*self.CATALOG_ORDERINGS.get(sort or 'featured', self.CATALOG_ORDERINGS['featured']))
+
+    def cards(self):
+        """Only CARD_FIELDS; the description HTML stays on the detail page."""
+        return self.only(*self.CARD_FIELDS)
 
 
 class Product(models.Model):
@@ -108,6 +282,8 @@ class Product(models.Model):
     size = models.CharField(max_length=64, blank=True)
     short_description = models.CharField(max_length=400, blank=True)
     description = CKEditor5Field('Description', config_name='default')
+    # Filled from `description` on save by render_content(); served by the detail page.
+    description_html = models.TextField(blank=True, editable=False)
     price = models.DecimalField(max_digits=8, decimal_places=2)
     sale_price = models.DecimalField(max_digits=8, decimal_places=2, blank=True, null=True)
     rating = models.DecimalField(
@@ -118,48 +294,89 @@ class Product(models.Model):
     )
     stock = models.PositiveIntegerField(default=0)
     main_image = models.ImageField(upload_to='products/', blank=True, null=True)
+    # Kept by save() and the gallery signals (product_card_fields()), so a
+    # product card renders from this row alone.
+    card_image = models.CharField(max_length=255, blank=True, editable=False)
+    card_hover_image = models.CharField(max_length=255, blank=True, editable=False)
+    effective_price = models.DecimalField(max_digits=8, decimal_places=2, default=0, editable=False)
+    discount_percent = models.PositiveSmallIntegerField(default=0, editable=False)
     is_active = models.BooleanField(default=True)
+    is_featured = models.BooleanField(default=False, help_text="Listed first, newest first, under the catalog's Featured sort.")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ProductQuerySet.as_manager()
+
+    # Image fields that also get AVIF renditions, served through {% picture %}.
+    AVIF_FIELDS = ('main_image',)
+    # Denormalized from the fields in CARD_SOURCES and the gallery.
+    CARD_COLUMNS = ('card_image', 'card_hover_image', 'effective_price', 'discount_percent')
+    CARD_SOURCES = ('price', 'sale_price', 'main_image')
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Partial on is_active: Django compiles is_active=True to a bare
+            # `WHERE is_active`, which SQLite can match against an index
+            # condition but not seek on as a leading column. Sorted pages
+            # also need the id tie-breaker in the index, or SQLite sorts the
+            # whole result.
+            models.Index(fields=['-created_at', '-id'], condition=Q(is_active=True), name='product_active_created_idx'),
+            models.Index(fields=['-is_featured', '-created_at', '-id'], condition=Q(is_active=True), name='product_active_featured_idx'),
+            models.Index(fields=['name', 'id'], condition=Q(is_active=True), name='product_active_name_idx'),
+            models.Index(fields=['category'], condition=Q(is_active=True), name='product_active_category_idx'),
+            # Not partial: they also cover the per-value counts
+            # CatalogTerm.objects.recount() reads over inactive products.
+            models.Index(fields=['brand', 'is_active'], name='product_brand_idx'),
+            models.Index(fields=['size', 'is_active'], name='product_size_idx'),
+            models.Index(fields=['updated_at'], condition=Q(is_active=True), name='product_active_updated_idx'),
+            models.Index(fields=['effective_price', 'id'], condition=Q(is_active=True), name='product_effective_price_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+    def render_content(self):
+        self.pending_inline_images = []
+        self.description_html = render_rich_text(self.description, missing_renditions=self.pending_inline_images)[0]
+        return ['description_html']
+
+    def gallery_rows(self):
+        """The gallery as product_card_fields() takes it."""
+        if self.pk is None:
+            return []
+        return list(self.gallery.order_by('sort_order', 'pk').values_list('pk', 'image', 'is_primary'))
+
+    def resolve_card_fields(self):
+        """Recomputes CARD_COLUMNS on the instance and returns their names."""
+        fields = product_card_fields(self.price, self.sale_price, self.main_image.name or '', self.gallery_rows())
+        for name, value in fields.items():
+            setattr(self, name, value)
+        return list(fields)
+
     def save(self, *args, **kwargs):
-        if self.main_image:
-            compressed = compress_image(self.main_image)
-            if compressed:
-                self.main_image = compressed
+        _render_before_save(self, 'description', kwargs)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or set(update_fields) & set(self.CARD_SOURCES):
+            if self.main_image and not self.main_image._committed:
+                # Store the upload now, as pre_save() would, so card_image
+                # gets its final content-addressed name.
+                self.main_image.save(self.main_image.name, self.main_image.file, save=False)
+            card_fields = self.resolve_card_fields()
+            if update_fields is not None:
+                kwargs['update_fields'] = [*update_fields, *card_fields]
         super().save(*args, **kwargs)
+        ImageJob.enqueue(self, 'main_image')
+        ImageJob.enqueue_inline(self, 'description')
 
-    def get_primary_gallery_image(self):
-        return (
-            self.gallery.filter(is_primary=True).order_by('sort_order').first()
-            or self.gallery.order_by('sort_order').first()
-        )
+    def _media_url(self, name):
+        return ProductImage._meta.get_field('image').storage.url(name) if name else ''
 
     def get_main_image_url(self):
-        if self.main_image:
-            return self.main_image.url
-        primary_image = self.get_primary_gallery_image()
-        return primary_image.image.url if primary_image else ''
+        return self._media_url(self.card_image)
 
     def get_hover_image_url(self):
-        primary_image = self.get_primary_gallery_image()
-        gallery_qs = self.gallery.order_by('sort_order')
-        if primary_image:
-            gallery_qs = gallery_qs.exclude(pk=primary_image.pk)
-        hover_image = gallery_qs.first()
-        if hover_image:
-            return hover_image.image.url
-        if primary_image:
-            return primary_image.image.url
-        if self.main_image:
-            return self.main_image.url
-        return ''
+        return self._media_url(self.card_hover_image)
 
 
 class ProductImage(models.Model):
@@ -169,18 +386,83 @@ class ProductImage(models.Model):
     is_primary = models.BooleanField(default=False)
     sort_order = models.PositiveIntegerField(default=0)
 
+    AVIF_FIELDS = ('image',)
+
     class Meta:
         ordering = ['sort_order']
+        # Matches the gallery prefetch and Product.gallery_rows(), so neither
+        # sorts per product.
+        indexes = [
+            models.Index(fields=['product', 'sort_order', 'id'], name='productimage_order_idx'),
+        ]
 
     def __str__(self):
         return f"{self.product.name} image"
 
     def save(self, *args, **kwargs):
-        if self.image:
-            compressed = compress_image(self.image)
-            if compressed:
-                self.image = compressed
         super().save(*args, **kwargs)
+        ImageJob.enqueue(self, 'image')
+
+
+class CatalogTermQuerySet(models.QuerySet):
+    def recount(self, values_by_kind=None):
+        """
+        Re-reads from Product how many products use each of the given
+        {kind: values} (every value when None), then adds, updates and
+        deletes terms to match. Callers bump CatalogTerm's cache version.
+        """
+        for kind in CatalogTerm.Kind.values:
+            products = Product.objects.exclude(**{kind: ''})
+            terms = self.filter(kind=kind)
+            if values_by_kind is not None:
+                values = {value for value in values_by_kind.get(kind, ()) if value}
+                if not values:
+                    continue
+                products = products.filter(**{f'{kind}__in': values})
+                terms = terms.filter(value__in=values)
+
+            counts = (products.order_by().values_list(kind)
+                      .annotate(total=Count('id'), active=Count('id', filter=Q(is_active=True))))
+            rows = [
+                CatalogTerm(kind=kind, value=value, product_count=total, active_count=active)
+                for value, total, active in counts
+            ]
+            terms.exclude(value__in=[row.value for row in rows]).delete()
+            self.bulk_create(
+                rows, batch_size=500, update_conflicts=True,
+                unique_fields=['kind', 'value'], update_fields=['product_count', 'active_count'],
+            )
+
+
+class CatalogTerm(models.Model):
+    """
+    The distinct brand and size values of the products and how many
+    products use them, recounted on every product write (see signals.py),
+    so facets, admin filters and autocomplete never scan the product table.
+    """
+    class Kind(models.TextChoices):
+        # Values are the Product fields they index.
+        BRAND = 'brand', 'Brand'
+        SIZE = 'size', 'Size'
+
+    kind = models.CharField(max_length=16, choices=Kind.choices)
+    value = models.CharField(max_length=120)
+    product_count = models.PositiveIntegerField(default=0)
+    active_count = models.PositiveIntegerField(default=0)
+
+    # Product fields the counts depend on.
+    SOURCES = ('brand', 'size', 'is_active')
+
+    objects = CatalogTermQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['kind', 'value']
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'value'], name='catalogterm_kind_value_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()}: {self.value}"
 
 
 class Testimonial(models.Model):
@@ -204,10 +486,162 @@ class Testimonial(models.Model):
         ordering = ['sort_order', '-date', '-created_at']
         verbose_name = 'Testimonial'
         verbose_name_plural = 'Testimonials'
+        indexes = [
+            models.Index(fields=['sort_order', '-date', '-created_at'], condition=Q(is_published=True), name='testimonial_published_idx'),
+            models.Index(fields=['-date', '-created_at'], condition=Q(is_published=True), name='testimonial_recent_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} - {self.rating}/5.0"
     
     def get_rating_stars(self):
         """Returns the number of full stars (integer)"""
-        return int(self.rating)
\ No newline at end of file
+        return int(self.rating)
+
+
+class ImageJob(models.Model):
+    """
+    A pending WebP conversion + rendition build for one image field.
+    Model saves only enqueue these; `manage.py process_image_jobs` drains them
+    so admin requests never block on Pillow. Until a job is done the field
+    keeps pointing at the original upload, which is served as-is.
+    """
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'Pending'
+        RUNNING = 'running', 'Running'
+        DONE = 'done', 'Done'
+        FAILED = 'failed', 'Failed'
+
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveBigIntegerField()
+    content_object = GenericForeignKey('content_type', 'object_id')
+    field_name = models.CharField(max_length=64)
+    source_name = models.CharField(max_length=255, help_text="File the job was queued for")
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [models.Index(fields=['status', 'created_at'])]
+        verbose_name = 'Image Job'
+        verbose_name_plural = 'Image Jobs'
+
+    def __str__(self):
+        return f"{self.source_name} ({self.get_status_display()})"
+
+    @classmethod
+    def enqueue(cls, instance, field_name):
+        """Queues `field_name` of `instance` unless it is already optimized or queued."""
+        image_field = getattr(instance, field_name)
+        if not image_field:
+            return None
+        avif = cls.wants_avif(instance, field_name)
+        if image_field.name.lower().endswith('.webp') and has_renditions(image_field, avif=avif):
+            return None
+        job, _ = cls.objects.get_or_create(
+            content_type=ContentType.objects.get_for_model(instance),
+            object_id=instance.pk,
+            field_name=field_name,
+            source_name=image_field.name,
+            status=cls.Status.PENDING,
+        )
+        return job
+
+    @classmethod
+    def enqueue_inline(cls, instance, field_name):
+        """
+        Queues renditions for the uploaded images embedded in the rich text
+        `field_name` that render_content() found without them
+        (instance.pending_inline_images). The job re-renders the field once
+        they exist.
+        """
+        names, instance.pending_inline_images = getattr(instance, 'pending_inline_images', []), []
+        content_type = ContentType.objects.get_for_model(instance)
+        for name in names:
+            cls.objects.get_or_create(
+                content_type=content_type,
+                object_id=instance.pk,
+                field_name=field_name,
+                source_name=name,
+                status=cls.Status.PENDING,
+            )
+
+    @staticmethod
+    def wants_avif(instance, field_name):
+        return field_name in getattr(instance, 'AVIF_FIELDS', ())
+
+    @classmethod
+    def claim_next(cls):
+        """Atomically moves the oldest pending job to RUNNING and returns it."""
+        while True:
+            job = cls.objects.filter(status=cls.Status.PENDING).order_by('created_at').first()
+            if job is None:
+                return None
+            claimed = cls.objects.filter(pk=job.pk, status=cls.Status.PENDING).update(
+                status=cls.Status.RUNNING,
+                attempts=F('attempts') + 1,
+                updated_at=timezone.now(),
+            )
+            if claimed:
+                job.refresh_from_db()
+                return job
+
+    def run(self):
+        """Converts the image to WebP, writes its renditions and swaps the field over."""
+        try:
+            instance = self.content_object
+            if instance is not None and not isinstance(instance._meta.get_field(self.field_name), models.ImageField):
+                self._run_inline(instance)
+                return
+            image_field = getattr(instance, self.field_name, None) if instance else None
+            # The object was deleted or the image replaced since the job was queued.
+            if not image_field or image_field.name != self.source_name:
+                self._finish(self.Status.DONE)
+                return
+
+            compressed = compress_image(image_field)
+            if compressed:
+                with compressed:
+                    image_field.save(compressed.name, compressed, save=False)
+            avif = self.wants_avif(instance, self.field_name)
+            generate_renditions(image_field, avif=avif)
+            if not has_renditions(image_field, avif=avif):
+                self._finish(self.Status.FAILED, error="Renditions could not be written.")
+                return
+
+            if compressed:
+                update_fields = [self.field_name]
+                if any(f.name == 'updated_at' for f in instance._meta.fields):
+                    update_fields.append('updated_at')
+                instance.save(update_fields=update_fields)
+                # Uploads are deduplicated, so another row may still use the original.
+                release_media(self.source_name, image_field.storage)
+            self._finish(self.Status.DONE)
+        except Exception as e:
+            self._finish(self.Status.FAILED, error=str(e))
+
+    def _run_inline(self, instance):
+        """Writes the renditions of an image embedded in rich text, then re-renders the text to use them."""
+        image = SimpleNamespace(name=self.source_name, storage=default_storage)
+        if not default_storage.exists(self.source_name):
+            # Removed from storage since; the text already links the bare URL.
+            self._finish(self.Status.DONE)
+            return
+        generate_renditions(image)
+        if not has_renditions(image):
+            self._finish(self.Status.FAILED, error="Renditions could not be written.")
+            return
+        update_fields = [self.field_name]
+        if any(f.name == 'updated_at' for f in instance._meta.fields):
+            update_fields.append('updated_at')
+        instance.save(update_fields=update_fields)
+        self._finish(self.Status.DONE)
+
+    def _finish(self, status, error=''):
+        self.status = status
+        self.error = error
+        self.save(update_fields=['status', 'error', 'updated_at'])
@@ -0,0 +1,255 @@
+import base64
+import binascii
+import datetime
+import hashlib
+import json
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import Page
+from django.db.models import F, Q
+
+from .cache import VIEW_CACHE_TIMEOUT, aget_model_versions, get_model_versions
+
+
+def seek_after(ordering, key):
+    """
+    Q for the rows that sort strictly after `key` under `ordering`, written
+    as `f0 <= k0 AND (f0 < k0 OR (f0 = k0 AND ...))` so the database can
+    seek on the leading column instead of scanning.
+    """
+    (field, descending), *rest = ordering
+    value, *rest_key = key
+    past = f'{field}__lt' if descending else f'{field}__gt'
+    if not rest:
+        return Q(**{past: value})
+    up_to = f'{field}__lte' if descending else f'{field}__gte'
+    return Q(**{up_to: value}) & (Q(**{past: value}) | (Q(**{field: value}) & seek_after(rest, rest_key)))
+
+
+def _key_value(value):
+    # Unlike DjangoJSONEncoder, keeps microseconds: a truncated timestamp
+    # would make the seek skip or repeat rows.
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f'Cannot put {type(value).__name__} in a cursor')
+
+
+class KeysetPage(Page):
+    """
+    A page of KeysetPaginator. Whether there are neighbouring pages comes
+    from the fetch itself; next_cursor and previous_cursor are the `cursor`
+    values linking to them (previous_cursor is None for the first page,
+    which has no cursor).
+    """
+
+    def __init__(self, object_list, number, paginator, has_previous, has_next):
+        super().__init__(object_list, number, paginator)
+        self._has_previous = has_previous
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def previous_page_number(self):
+        return self.number - 1
+
+    @property
+    def next_cursor(self):
+        if not self._has_next:
+            return None
+        return self.paginator.encode_cursor('after', self.number + 1, self.object_list[-1])
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous or self.number <= 2:
+            return None
+        return self.paginator.encode_cursor('before', self.number - 1, self.object_list[0])
+
+
+class KeysetPaginator:
+    """
+    Pages an ordered queryset without OFFSET and without reading the rows
+    of earlier pages. The queryset must end its ordering on a unique column
+    (id), so every row has a distinct sort key.
+
+    The URL carries a cursor: the sort key of the last row of the previous
+    page (or the first row of the next one, going back), so every page is
+    one `WHERE key > ... LIMIT per_page + 1` query on the ordering index,
+    however deep it is. The row count shown next to the pages is counted
+    up to COUNT_LIMIT rows and cached until a row of one of `models`
+    changes; past that the page count is left open.
+    """
+    COUNT_LIMIT = 1000
+
+    def __init__(self, queryset, per_page, models=(), timeout=VIEW_CACHE_TIMEOUT):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.models = models
+        self.timeout = timeout
+        self.ordering = [
+            (name.lstrip('-'), name.startswith('-'))
+            for name in queryset.query.order_by
+        ]
+        if not self.ordering or self.ordering[-1][0] not in ('id', 'pk'):
+            raise ValueError("KeysetPaginator needs a queryset ordered with a final 'id' tie-breaker.")
+        # The sort key is read from these annotations rather than the model
+        # fields, which cards() may have deferred.
+        self._key_names = [f'keyset_{i}' for i in range(len(self.ordering))]
+        self._count = None
+
+    # Cursors
+
+    def encode_cursor(self, direction, number, obj):
+        key = [getattr(obj, name) for name in self._key_names]
+        payload = json.dumps([direction, number, key], default=_key_value, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def _key_field(self, name):
+        query = self.queryset.query
+        if name in query.annotations:
+            return query.annotations[name].output_field
+        opts = self.queryset.model._meta
+        return opts.pk if name == 'pk' else opts.get_field(name)
+
+    def decode_cursor(self, cursor):
+        """(direction, page number, sort key) of `cursor`, or None when it is missing or malformed."""
+        if not cursor:
+            return None
+        try:
+            payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            direction, number, key = json.loads(payload)
+            if direction not in ('after', 'before') or len(key) != len(self.ordering):
+                return None
+            key = [self._key_field(field).to_python(value) for (field, _), value in zip(self.ordering, key)]
+            return direction, max(int(number), 2 if direction == 'after' else 1), key
+        except (binascii.Error, ValueError, TypeError, FieldDoesNotExist, ValidationError):
+            return None
+
+    # Fetching
+
+    def _page_start_query(self, number):
+        """
+        The row that ends the page before page `number` (counted from 1), as a
+        one-row queryset, or None when `number` is not a page number or lies
+        beyond COUNT_LIMIT rows, past which OFFSET is not worth paying.
+        """
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            return None
+        offset = (number - 1) * self.per_page - 1
+        if number < 2 or offset >= self.COUNT_LIMIT:
+            return None
+        return self.with_keys(self.queryset)[offset:offset + 1]
+
+    def cursor_for_page(self, number):
+        """
+        The cursor of page `number` as OFFSET pagination numbered it (old
+        ?page=N links), or None for the first page, a page past the last one
+        or a malformed number.
+        """
+        rows = self._page_start_query(number)
+        last = rows.first() if rows is not None else None
+        return self.encode_cursor('after', int(number), last) if last is not None else None
+
+    async def acursor_for_page(self, number):
+        """cursor_for_page() for async views."""
+        rows = self._page_start_query(number)
+        last = await rows.afirst() if rows is not None else None
+        return self.encode_cursor('after', int(number), last) if last is not None else None
+
+    def with_keys(self, queryset):
+        """`queryset` with the sort key annotated on each row, as encode_cursor() reads it."""
+        return queryset.annotate(**{name: F(field) for name, (field, _) in zip(self._key_names, self.ordering)})
+
+    def _page_queryset(self, cursor):
+        """The queryset for the page at `cursor`, fetching one row extra to tell whether another page follows."""
+        if cursor is None:
+            return self.with_keys(self.queryset)[:self.per_page + 1]
+        direction, _, key = cursor
+        if direction == 'after':
+            return self.with_keys(self.queryset.filter(seek_after(self.ordering, key)))[:self.per_page + 1]
+        backwards = [(field, not descending) for field, descending in self.ordering]
+        return self.with_keys(self.queryset.reverse().filter(seek_after(backwards, key)))[:self.per_page + 1]
+
+    def _make_page(self, cursor, rows):
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if cursor is None:
+            return KeysetPage(rows, 1, self, has_previous=False, has_next=more)
+        direction, number, _ = cursor
+        if direction == 'after':
+            return KeysetPage(rows, number, self, has_previous=True, has_next=more)
+        rows.reverse()
+        # Rows removed or added since the link was made can leave fewer or
+        # more rows before this page than its number says.
+        number = max(number, 2) if more else 1
+        return KeysetPage(rows, number, self, has_previous=more, has_next=True)
+
+    def get_page(self, cursor):
+        """The page at `cursor`; a missing or malformed cursor gives the first page."""
+        cursor = self.decode_cursor(cursor)
+        rows = list(self._page_queryset(cursor))
+        if cursor is not None and cursor[0] == 'before' and len(rows) < self.per_page:
+            cursor, rows = None, list(self._page_queryset(None))
+        return self._make_page(cursor, rows)
+
+    async def aget_page(self, cursor):
+        """get_page() for async views; also loads the count, which templates read synchronously."""
+        cursor = self.decode_cursor(cursor)
+        rows = [obj async for obj in self._page_queryset(cursor)]
+        if cursor is not None and cursor[0] == 'before' and len(rows) < self.per_page:
+            cursor, rows = None, [obj async for obj in self._page_queryset(None)]
+        await self.acount()
+        return self._make_page(cursor, rows)
+
+    # Counting
+
+    def _cache_key(self, versions):
+        fingerprint = f'{self.queryset.query}|{self.COUNT_LIMIT}|' + ','.join(versions[model] for model in self.models)
+        return f'keyset:count:{self.queryset.model._meta.label_lower}:{hashlib.md5(fingerprint.encode()).hexdigest()}'
+
+    def _count_query(self):
+        return self.queryset.order_by()[:self.COUNT_LIMIT + 1]
+
+    @property
+    def count(self):
+        """Rows in the queryset, up to COUNT_LIMIT + 1 (see count_capped)."""
+        if self._count is None:
+            key = self._cache_key(get_model_versions(self.models))
+            self._count = cache.get(key)
+            if self._count is None:
+                self._count = self._count_query().count()
+                cache.set(key, self._count, self.timeout)
+        return self._count
+
+    async def acount(self):
+        if self._count is None:
+            key = self._cache_key(await aget_model_versions(self.models))
+            self._count = await cache.aget(key)
+            if self._count is None:
+                self._count = await self._count_query().acount()
+                await cache.aset(key, self._count, self.timeout)
+        return self._count
+
+    @property
+    def count_capped(self):
+        """True when there are more than COUNT_LIMIT rows and count stops there."""
+        return self.count > self.COUNT_LIMIT
+
+    @property
+    def num_pages(self):
+        """The number of pages, or None when count_capped."""
+        if self.count_capped:
+            return None
+        return max(1, -(-self.count // self.per_page))
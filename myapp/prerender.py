@@ -0,0 +1,109 @@
+import os
+from functools import wraps
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+from django.urls import reverse
+
+from .cache import CSRF_PLACEHOLDER, get_services_menu, thaw
+
+# Views whose pages are their template plus the services menu, and nothing
+# from the request: {view name: (template, content type)}.
+PRERENDERED_PAGES = {
+    'about': ('about.html', 'text/html; charset=utf-8'),
+    'faq': ('faqs.html', 'text/html; charset=utf-8'),
+    'contact': ('contact.html', 'text/html; charset=utf-8'),
+    'book_your_visit': ('book-your-visit.html', 'text/html; charset=utf-8'),
+    'terms': ('terms.html', 'text/html; charset=utf-8'),
+    'privacy': ('privacy.html', 'text/html; charset=utf-8'),
+    'robots_txt': ('robots.txt', 'text/plain'),
+}
+
+# {view name: (file mtime, content)} of the pages this process has read.
+_loaded_pages = {}
+
+
+def page_path(name):
+    return Path(settings.PRERENDER_ROOT) / PRERENDERED_PAGES[name][0]
+
+
+def render_page(name):
+    """
+    Renders the page of view `name` as served to any visitor, with the
+    CSRF input left as CSRF_PLACEHOLDER for the serving request to fill in.
+    """
+    request = RequestFactory().get(reverse(name))
+    request.services_menu = get_services_menu()
+    return render_to_string(PRERENDERED_PAGES[name][0], {'csrf_token': CSRF_PLACEHOLDER}, request=request)
+
+
+def write_page(name):
+    """Renders page `name` into PRERENDER_ROOT. Returns the file's size."""
+    path = page_path(name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    content = render_page(name).encode()
+    temp_path = path.with_name(f'.{path.name}.tmp')
+    temp_path.write_bytes(content)
+    os.replace(temp_path, path)
+    return len(content)
+
+
+def refresh_pages():
+    """Re-renders the pages that have been built, e.g. after the services menu changed."""
+    for name in PRERENDERED_PAGES:
+        if page_path(name).exists():
+            write_page(name)
+
+
+def load_page(name):
+    """
+    The built page `name` from process memory, re-read only when the file
+    has been rewritten since; None when it has not been built.
+    """
+    try:
+        mtime = page_path(name).stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+    loaded = _loaded_pages.get(name)
+    if loaded is None or loaded[0] != mtime:
+        loaded = (mtime, page_path(name).read_text(encoding='utf-8'))
+        _loaded_pages[name] = loaded
+    return loaded[1]
+
+
+def prerendered(view):
+    """
+    Answers GET requests for `view` with the copy build_static_pages wrote,
+    without running the template engine or reading the services menu. The
+    view renders the page itself until the copy exists.
+    """
+    name = view.__name__
+
+    def serve(request):
+        if request.method not in ('GET', 'HEAD'):
+            return None
+        content = load_page(name)
+        if content is None:
+            return None
+        return thaw(request, {'content': content, 'content_type': PRERENDERED_PAGES[name][1]})
+
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            # A stat() and, rarely, a small file read: no database or cache access.
+            response = serve(request)
+            if response is None:
+                response = await view(request, *args, **kwargs)
+            return response
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = serve(request)
+        if response is None:
+            response = view(request, *args, **kwargs)
+        return response
+    return wrapper
@@ -0,0 +1,201 @@
+import math
+import re
+from html import escape
+from html.parser import HTMLParser
+from urllib.parse import unquote, urlsplit
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.utils.text import Truncator
+from PIL import Image
+
+from .utils import RENDITION_WIDTHS, rendition_name, rendition_widths, srcset_candidates
+
+# What the CKEditor toolbars in settings.CKEDITOR_5_CONFIGS can produce.
+ALLOWED_TAGS = {
+    'a', 'b', 'blockquote', 'br', 'code', 'em', 'figcaption', 'figure', 'h1', 'h2', 'h3', 'h4',
+    'h5', 'h6', 'hr', 'i', 'img', 'li', 'mark', 'ol', 'p', 'pre', 's', 'span', 'strong', 'sub',
+    'sup', 'table', 'tbody', 'td', 'tfoot', 'th', 'thead', 'tr', 'u', 'ul',
+}
+ALLOWED_ATTRIBUTES = {
+    'a': {'href', 'title', 'target', 'rel'},
+    'img': {'src', 'alt', 'width', 'height'},
+    'td': {'colspan', 'rowspan'},
+    'th': {'colspan', 'rowspan', 'scope'},
+    'ol': {'start', 'reversed'},
+    'figure': {'class'},
+    'span': {'class'},
+    'mark': {'class'},
+}
+VOID_TAGS = {'br', 'hr', 'img'}
+# Opening one of these while the same tag is open closes the first (<li>a<li>b).
+IMPLICITLY_CLOSED_TAGS = {'li', 'p', 'td', 'th', 'tr'}
+# Tags that do not separate words in the extracted text.
+INLINE_TAGS = {'a', 'b', 'code', 'em', 'i', 'mark', 's', 'span', 'strong', 'sub', 'sup', 'u'}
+# Dropped together with everything inside them.
+DROPPED_CONTENT_TAGS = {'script', 'style', 'iframe', 'object', 'embed', 'template', 'noscript', 'svg', 'math'}
+ALLOWED_URL_SCHEMES = {'', 'http', 'https', 'mailto', 'tel'}
+SAFE_CLASS_RE = re.compile(r'^[\w\- ]*$')
+
+# Inline images are laid out in the article column.
+INLINE_IMAGE_SIZES = '(min-width: 992px) 66vw, 100vw'
+INLINE_IMAGE_DEFAULT = 'detail'
+
+WORDS_PER_MINUTE = 200
+SUMMARY_WORDS = 40
+SUMMARY_MAX_LENGTH = 300
+
+
+def _safe_url(url):
+    url = (url or '').strip()
+    try:
+        scheme = urlsplit(url).scheme.lower()
+    except ValueError:
+        return None
+    return url if scheme in ALLOWED_URL_SCHEMES else None
+
+
+def _inline_image_attrs(attrs, missing_renditions):
+    """
+    Attributes for an inline <img>: uploaded images get their intrinsic
+    width and height so the page does not reflow, lazy loading, and once
+    their WebP renditions exist, srcset pointing at them. Uploads without
+    renditions keep their own URL and are added to `missing_renditions`;
+    building them is left to ImageJob, never done while rendering.
+    """
+    src = _safe_url(attrs.get('src'))
+    if not src:
+        return None
+    result = {'src': src, 'alt': attrs.get('alt', ''), 'loading': 'lazy', 'decoding': 'async'}
+
+    if not src.startswith(settings.MEDIA_URL):
+        return result
+    name = unquote(src[len(settings.MEDIA_URL):])
+    try:
+        if not default_storage.exists(name):
+            return result
+    except SuspiciousFileOperation:
+        # A path climbing out of MEDIA_ROOT is left as an external image.
+        return result
+
+    try:
+        # Only reads the header; the pixels are not decoded.
+        with default_storage.open(name, 'rb') as source:
+            width, height = Image.open(source).size
+    except Exception:
+        return result
+
+    widths = rendition_widths(default_storage, name)
+    if not widths:
+        missing_renditions.append(name)
+        result.update({'width': str(width), 'height': str(height)})
+        return result
+
+    display_width = widths[RENDITION_WIDTHS[INLINE_IMAGE_DEFAULT]]
+    result.update({
+        'src': default_storage.url(rendition_name(name, RENDITION_WIDTHS[INLINE_IMAGE_DEFAULT])),
+        'srcset': srcset_candidates(default_storage, name, widths),
+        'sizes': INLINE_IMAGE_SIZES,
+        'width': str(display_width),
+        'height': str(round(height * display_width / width)),
+    })
+    return result
+
+
+class _Sanitizer(HTMLParser):
+    """
+    Rebuilds CKEditor HTML from an allowlist of tags and attributes,
+    escaping all text, and collects the plain text for reading time and
+    the summary.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.missing_renditions = []
+        self.html = []
+        self.text = []
+        self.open_tags = []
+        self.dropping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag not in INLINE_TAGS:
+            self.text.append(' ')
+        if tag in DROPPED_CONTENT_TAGS:
+            self.dropping += 1
+            return
+        if self.dropping or tag not in ALLOWED_TAGS:
+            return
+
+        allowed = ALLOWED_ATTRIBUTES.get(tag, set())
+        attrs = {name: value or '' for name, value in attrs if name in allowed}
+        if tag == 'img':
+            attrs = _inline_image_attrs(attrs, self.missing_renditions)
+            if attrs is None:
+                return
+        elif tag == 'a':
+            if 'href' in attrs:
+                href = _safe_url(attrs.pop('href'))
+                if href is not None:
+                    attrs['href'] = href
+            if attrs.get('target') == '_blank':
+                attrs['rel'] = 'noopener noreferrer'
+        if 'class' in attrs and not SAFE_CLASS_RE.match(attrs['class']):
+            del attrs['class']
+
+        if tag in IMPLICITLY_CLOSED_TAGS and self.open_tags and self.open_tags[-1] == tag:
+            self.html.append(f'</{self.open_tags.pop()}>')
+        rendered = ''.join(f' {name}="{escape(value)}"' for name, value in attrs.items())
+        self.html.append(f'<{tag}{rendered}>')
+        if tag not in VOID_TAGS:
+            self.open_tags.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS and self.open_tags and self.open_tags[-1] == tag:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag not in INLINE_TAGS:
+            self.text.append(' ')
+        if tag in DROPPED_CONTENT_TAGS:
+            self.dropping = max(self.dropping - 1, 0)
+            return
+        if self.dropping or tag not in self.open_tags:
+            return
+        # Close anything left open inside this element so the output nests.
+        while self.open_tags:
+            open_tag = self.open_tags.pop()
+            self.html.append(f'</{open_tag}>')
+            if open_tag == tag:
+                break
+
+    def handle_data(self, data):
+        if self.dropping:
+            return
+        self.html.append(escape(data, quote=False))
+        self.text.append(data)
+
+    def close(self):
+        super().close()
+        while self.open_tags:
+            self.html.append(f'</{self.open_tags.pop()}>')
+
+
+def render_rich_text(html, missing_renditions=None):
+    """
+    Turns stored CKEditor HTML into (safe HTML fragment, summary, reading
+    time in minutes). Run when the content is saved so detail pages output
+    the fragment as-is. Uploaded inline images whose renditions do not
+    exist yet are appended to the `missing_renditions` list when given.
+    """
+    sanitizer = _Sanitizer()
+    sanitizer.feed(html or '')
+    sanitizer.close()
+    if missing_renditions is not None:
+        missing_renditions.extend(dict.fromkeys(sanitizer.missing_renditions))
+
+    words = ''.join(sanitizer.text).split()
+    summary = Truncator(Truncator(' '.join(words)).words(SUMMARY_WORDS)).chars(SUMMARY_MAX_LENGTH)
+    reading_time = max(1, math.ceil(len(words) / WORDS_PER_MINUTE)) if words else 0
+    return ''.join(sanitizer.html), summary, reading_time
@@ -0,0 +1,43 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+READ_ONLY_DATABASE = 'readonly'
+
+# True while a request that only reads is being handled on this thread/task
+# (see middleware.ReadOnlyDatabaseMiddleware).
+_read_only = ContextVar('read_only_database', default=False)
+
+
+@contextmanager
+def read_only_database():
+    """Sends the ORM reads made inside the block to READ_ONLY_DATABASE."""
+    token = _read_only.set(True)
+    try:
+        yield
+    finally:
+        _read_only.reset(token)
+
+
+class ReadOnlyRouter:
+    """
+    Routes reads made under read_only_database() to the read-only
+    connection, which opens the same SQLite file with query_only. Writes,
+    and every read outside public pages, stay on 'default'.
+    """
+
+    def db_for_read(self, model, **hints):
+        if _read_only.get() and READ_ONLY_DATABASE in settings.DATABASES:
+            return READ_ONLY_DATABASE
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases are the same database.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return False if db == READ_ONLY_DATABASE else None
@@ -0,0 +1,193 @@
+import re
+from functools import lru_cache
+from html import unescape
+
+from django.conf import settings
+from django.db import connection
+from django.urls import reverse
+from django.utils.html import escape, strip_tags
+from django.utils.module_loading import import_string
+from django.utils.safestring import mark_safe
+
+# Each kind gets a fixed slot in the index rowid (object_id * len + slot), so a
+# document can be replaced or removed by primary key without scanning.
+SEARCH_KINDS = ('product', 'blog', 'news')
+
+_HIGHLIGHT_START = '\x02'
+_HIGHLIGHT_END = '\x03'
+
+
+def plain_text(html):
+    """CKEditor HTML -> the text a reader sees."""
+    return unescape(strip_tags(html or ''))
+
+
+def document_for(instance):
+    """
+    Returns the indexable fields of a Product, Blog or News instance, or None
+    when it should not be searchable (inactive or unpublished).
+    """
+    from .models import Blog, News, Product
+
+    if isinstance(instance, Product):
+        if not instance.is_active:
+            return None
+        return {
+            'kind': 'product',
+            'object_id': instance.pk,
+            'title': instance.name,
+            'body': ' '.join(filter(None, [
+                instance.brand, instance.get_category_display(), instance.sku,
+                instance.short_description, plain_text(instance.description),
+            ])),
+            'url': reverse('product_detail', args=[instance.slug]),
+        }
+    if isinstance(instance, Blog):
+        if not instance.is_published:
+            return None
+        return {
+            'kind': 'blog',
+            'object_id': instance.pk,
+            'title': instance.title,
+            'body': ' '.join(filter(None, [instance.excerpt, instance.author, plain_text(instance.content)])),
+            'url': reverse('blog_single', args=[instance.slug]),
+        }
+    if isinstance(instance, News):
+        if not instance.is_published:
+            return None
+        return {
+            'kind': 'news',
+            'object_id': instance.pk,
+            'title': instance.title,
+            'body': ' '.join(filter(None, [instance.subtitle, instance.location, plain_text(instance.content)])),
+            'url': reverse('news_detail', args=[instance.slug]),
+        }
+    return None
+
+
+def kind_for(instance):
+    return instance._meta.model_name if instance._meta.model_name in SEARCH_KINDS else None
+
+
+def build_match_query(text, prefix_last=True):
+    """
+    Turns free text into a safe FTS5 MATCH expression: every word is quoted
+    (so operators in user input are inert) and the last one matches as a prefix.
+    """
+    terms = re.findall(r'\w+', text.lower())
+    if not terms:
+        return ''
+    quoted = [f'"{term}"' for term in terms]
+    if prefix_last:
+        quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+class SearchBackend:
+    """
+    Interface for site search backends, selected with settings.SEARCH_BACKEND.
+    """
+
+    def index(self, instance):
+        """Adds, replaces or (when no longer searchable) removes `instance`."""
+        document = document_for(instance)
+        if document is None:
+            self.remove(instance)
+        else:
+            self.add(document)
+
+    def add(self, document):
+        raise NotImplementedError
+
+    def remove(self, instance):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def search(self, text, limit=20):
+        """Returns ranked hits as dicts with kind, title, url and a highlighted snippet."""
+        raise NotImplementedError
+
+    def suggest(self, text, limit=8):
+        """Returns title matches for typeahead as dicts with kind, title and url."""
+        raise NotImplementedError
+
+
+class SQLiteFTSBackend(SearchBackend):
+    """
+    Search backed by the SQLite FTS5 table created in migration 0005. Bodies
+    are indexed as plain text and results are ranked with bm25, weighting
+    title matches over body matches.
+    """
+    table = 'myapp_search_index'
+    title_weight = 10.0
+    body_weight = 1.0
+
+    def _rowid(self, kind, object_id):
+        return object_id * len(SEARCH_KINDS) + SEARCH_KINDS.index(kind)
+
+    def add(self, document):
+        rowid = self._rowid(document['kind'], document['object_id'])
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid = %s', [rowid])
+            cursor.execute(
+                f'INSERT INTO {self.table} (rowid, title, body, kind, url) VALUES (%s, %s, %s, %s, %s)',
+                [rowid, document['title'], document['body'], document['kind'], document['url']],
+            )
+
+    def remove(self, instance):
+        kind = kind_for(instance)
+        if kind is None:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid = %s', [self._rowid(kind, instance.pk)])
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+
+    def search(self, text, limit=20):
+        match = build_match_query(text)
+        if not match:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT kind, title, url, snippet({self.table}, 1, %s, %s, '…', 24) "
+                f"FROM {self.table} WHERE {self.table} MATCH %s "
+                f"ORDER BY bm25({self.table}, %s, %s) LIMIT %s",
+                [_HIGHLIGHT_START, _HIGHLIGHT_END, match, self.title_weight, self.body_weight, limit],
+            )
+            rows = cursor.fetchall()
+        return [
+            {'kind': kind, 'title': title, 'url': url, 'snippet': self._highlight(snippet)}
+            for kind, title, url, snippet in rows
+        ]
+
+    def suggest(self, text, limit=8):
+        # Title-only prefix match walked in rowid order: FTS5 stops at the
+        # LIMIT instead of ranking every hit, which keeps typeahead in the
+        # low milliseconds however common the prefix is.
+        match = build_match_query(text)
+        if not match:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT kind, title, url FROM {self.table} WHERE {self.table} MATCH %s '
+                f'ORDER BY rowid DESC LIMIT %s',
+                [f'title : ({match})', limit],
+            )
+            rows = cursor.fetchall()
+        return [{'kind': kind, 'title': title, 'url': url} for kind, title, url in rows]
+
+    def _highlight(self, snippet):
+        return mark_safe(
+            escape(snippet)
+            .replace(_HIGHLIGHT_START, '<mark>')
+            .replace(_HIGHLIGHT_END, '</mark>')
+        )
+
+
+@lru_cache(maxsize=None)
+def get_backend():
+    return import_string(getattr(settings, 'SEARCH_BACKEND', 'myapp.search.SQLiteFTSBackend'))()
@@ -0,0 +1,118 @@
+from functools import partial
+
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .cache import bump_model_version
+from .models import Blog, CatalogTerm, News, Product, ProductImage, Service, Testimonial
+from .prerender import refresh_pages
+from .search import get_backend
+from .storage import release_media
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Blog)
+@receiver(post_save, sender=News)
+def update_search_index(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    get_backend().index(instance)
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Blog)
+@receiver(post_delete, sender=News)
+def remove_from_search_index(sender, instance, **kwargs):
+    get_backend().remove(instance)
+
+
+@receiver(post_save, sender=Service)
+@receiver(post_save, sender=Blog)
+@receiver(post_save, sender=News)
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_save, sender=Testimonial)
+@receiver(post_delete, sender=Service)
+@receiver(post_delete, sender=Blog)
+@receiver(post_delete, sender=News)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_delete, sender=Testimonial)
+def invalidate_cached_views(sender, **kwargs):
+    """Expires the services menu and every cached view that reads `sender`."""
+    bump_model_version(sender)
+
+
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+def refresh_prerendered_pages(sender, raw=False, **kwargs):
+    """The pre-rendered pages list the services in their navbar and footer; rebuild them once the change commits."""
+    if raw:
+        return
+    transaction.on_commit(refresh_pages)
+
+
+def _changes_catalog_terms(update_fields):
+    return update_fields is None or bool(set(update_fields) & set(CatalogTerm.SOURCES))
+
+
+@receiver(pre_save, sender=Product)
+def remember_catalog_terms(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Notes the brand and size the row had before the save, so they are recounted too."""
+    if raw or instance.pk is None or not _changes_catalog_terms(update_fields):
+        return
+    instance._previous_catalog_terms = (
+        Product.objects.filter(pk=instance.pk).values(*CatalogTerm.Kind.values).first()
+    )
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def recount_catalog_terms(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Updates the brand and size registry for the values the write touched."""
+    if raw or not _changes_catalog_terms(update_fields):
+        return
+    previous = getattr(instance, '_previous_catalog_terms', None) or {}
+    CatalogTerm.objects.recount({
+        kind: {getattr(instance, kind), previous.get(kind)} for kind in CatalogTerm.Kind.values
+    })
+    bump_model_version(CatalogTerm)
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def touch_gallery_product(sender, instance, raw=False, **kwargs):
+    """
+    Gallery edits change the product page and may change which images its
+    card shows, so they bump Product.updated_at and re-resolve the card
+    columns. The queryset update() sends no signal, so the Product version
+    is bumped here too, expiring the cached product pages and sitemap shard.
+    Fixtures carry their own timestamps and card columns and are left as loaded.
+    """
+    if raw:
+        return
+    product = Product.objects.only(*Product.CARD_SOURCES).filter(pk=instance.product_id).first()
+    if product is None:
+        return
+    product.resolve_card_fields()
+    Product.objects.filter(pk=product.pk).update(
+        updated_at=timezone.now(),
+        **{name: getattr(product, name) for name in Product.CARD_COLUMNS},
+    )
+    bump_model_version(Product)
+
+
+@receiver(post_delete, sender=Service)
+@receiver(post_delete, sender=Blog)
+@receiver(post_delete, sender=News)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=ProductImage)
+def release_deleted_images(sender, instance, **kwargs):
+    """Deletes the row's image files, unless another row shares them, once the delete commits."""
+    for field in instance._meta.fields:
+        if isinstance(field, models.ImageField):
+            name = getattr(instance, field.attname).name
+            if name:
+                transaction.on_commit(partial(release_media, name, field.storage))
@@ -1,56 +1,135 @@
 from django.contrib import sitemaps
+from django.contrib.sitemaps import views as sitemaps_views
+from django.db.models import Max
+from django.http import Http404
 from django.urls import reverse
+from .cache import cache_view, conditional_view
 from .models import Service, Blog, News, Product
 
+# URLs per shard; sections larger than this are split into ?p=2, ?p=3, ...
+SITEMAP_SHARD_SIZE = 5000
+
+
+class ModelSitemap(sitemaps.Sitemap):
+    """
+    Sitemap over a queryset that loads only the columns needed for <loc> and
+    <lastmod>, never the CKEditor HTML.
+    """
+    limit = SITEMAP_SHARD_SIZE
+    fields = ('slug',)
+
+    def get_queryset(self):
+        raise NotImplementedError
+
+    def items(self):
+        return self.get_queryset().only(*self.fields, 'updated_at').order_by('id')
+
+    def lastmod(self, obj):
+        return obj.updated_at
+
+    def get_latest_lastmod(self):
+        # One aggregate instead of Django's default of loading every item.
+        return self.get_queryset().aggregate(latest=Max('updated_at'))['latest']
+
+
 class StaticSitemap(sitemaps.Sitemap):
     priority = 0.5
     changefreq = 'weekly'
 
     def items(self):
         return [
-            'home', 'about', 'services', 'faq', 'contact', 
+            'home', 'about', 'services', 'faq', 'contact',
             'book_your_visit', 'products', 'testimonials'
         ]
 
     def location(self, item):
         return reverse(item)
 
-class ServiceSitemap(sitemaps.Sitemap):
+class ServiceSitemap(ModelSitemap):
     changefreq = 'weekly'
     priority = 0.8
+    fields = ('id',)
 
-    def items(self):
+    def get_queryset(self):
         return Service.objects.all()
 
     def location(self, obj):
         return reverse('servicedetails', args=[obj.id])
 
-class ProductSitemap(sitemaps.Sitemap):
+class ProductSitemap(ModelSitemap):
     changefreq = 'weekly'
     priority = 0.8
 
-    def items(self):
+    def get_queryset(self):
         return Product.objects.filter(is_active=True)
-    
+
     def location(self, obj):
         return reverse('product_detail', args=[obj.slug])
 
-class BlogSitemap(sitemaps.Sitemap):
+class BlogSitemap(ModelSitemap):
     changefreq = 'weekly'
     priority = 0.7
 
-    def items(self):
+    def get_queryset(self):
         return Blog.objects.filter(is_published=True)
 
     def location(self, obj):
         return reverse('blog_single', args=[obj.slug])
 
-class NewsSitemap(sitemaps.Sitemap):
+class NewsSitemap(ModelSitemap):
     changefreq = 'weekly'
     priority = 0.7
 
-    def items(self):
+    def get_queryset(self):
         return News.objects.filter(is_published=True)
 
     def location(self, obj):
         return reverse('news_detail', args=[obj.slug])
+
+
+SITEMAPS = {
+    'static': StaticSitemap,
+    'services': ServiceSitemap,
+    'products': ProductSitemap,
+    'blog': BlogSitemap,
+    'news': NewsSitemap,
+}
+
+# Models each shard is built from: saving one only expires its own shards.
+SECTION_MODELS = {
+    'static': (),
+    'services': (Service,),
+    'products': (Product,),
+    'blog': (Blog,),
+    'news': (News,),
+}
+
+
+def sitemap_querysets(request, section=None, **kwargs):
+    """Rows listed in the index or one section, for conditional-GET validators."""
+    sections = [section] if section else SITEMAPS.keys()
+    return [
+        SITEMAPS[name]().get_queryset()
+        for name in sections
+        if name in SITEMAPS and issubclass(SITEMAPS[name], ModelSitemap)
+    ]
+
+
+@conditional_view(sitemap_querysets)
+@cache_view(Blog, News, Product)
+def sitemap_index(request):
+    """sitemap.xml: one <sitemap> per shard, each with its section's latest lastmod."""
+    return sitemaps_views.index(request, SITEMAPS, sitemap_url_name='sitemap_section')
+
+
+@conditional_view(sitemap_querysets)
+def sitemap_section(request, section):
+    """
+    One shard of a section (paged with ?p=N). Shards are cached until a row
+    of their section's model changes, so crawler hits on unchanged sections
+    never reach the database beyond the validator query.
+    """
+    if section not in SITEMAPS:
+        raise Http404(f"No sitemap available for section: {section!r}")
+    view = cache_view(*SECTION_MODELS[section], params=('p',))(sitemaps_views.sitemap)
+    return view(request, SITEMAPS, section=section)
@@ -0,0 +1,35 @@
+from django.db.backends.sqlite3 import base
+
+# Applied to every new connection. WAL lets readers keep reading while a
+# write transaction is open (an admin save compressing images, say), and
+# with it synchronous=NORMAL is still durable across application crashes.
+# Override per database with OPTIONS['pragmas'].
+PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -32 * 1024,  # In KiB: 32 MiB of page cache per connection.
+    'temp_store': 'memory',
+}
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    The sqlite3 backend with PRAGMAS applied on connect. Two extra OPTIONS:
+    'pragmas' ({name: value}, merged over PRAGMAS) and 'read_only', which
+    opens the connection with query_only so any write on it fails.
+    """
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        self.pragmas = {**PRAGMAS, **params.pop('pragmas', {})}
+        self.read_only = params.pop('read_only', False)
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        if self.read_only:
+            conn.execute('PRAGMA query_only = ON')
+        return conn
@@ -0,0 +1,48 @@
+// Fills the <datalist> of inputs rendered by DatalistTextInput with the
+// suggestions their data-autocomplete-url returns for the typed prefix.
+document.addEventListener("DOMContentLoaded", function () {
+  const inputs = document.querySelectorAll("input[data-autocomplete-url]");
+
+  inputs.forEach(function (input) {
+    const datalist = document.getElementById(input.getAttribute("list"));
+    if (!datalist) {
+      return;
+    }
+    let timer = null;
+    let lastQuery = null;
+
+    function load() {
+      const query = input.value.trim();
+      if (query === lastQuery) {
+        return;
+      }
+      lastQuery = query;
+      const url = new URL(input.dataset.autocompleteUrl, window.location.href);
+      url.searchParams.set("q", query);
+      fetch(url, { credentials: "same-origin", headers: { Accept: "application/json" } })
+        .then(function (response) {
+          return response.ok ? response.json() : { results: [] };
+        })
+        .then(function (data) {
+          // Ignore answers to prefixes the user has typed past.
+          if (query !== lastQuery) {
+            return;
+          }
+          datalist.replaceChildren(
+            ...data.results.map(function (value) {
+              const option = document.createElement("option");
+              option.value = value;
+              return option;
+            })
+          );
+        })
+        .catch(function () {});
+    }
+
+    input.addEventListener("focus", load);
+    input.addEventListener("input", function () {
+      clearTimeout(timer);
+      timer = setTimeout(load, 150);
+    });
+  });
+});
@@ -0,0 +1,145 @@
+import gzip
+import mimetypes
+import os
+import posixpath
+import re
+from functools import cache
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.files.base import ContentFile
+from django.http import FileResponse, Http404, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+from django.views.static import was_modified_since
+
+try:
+    import brotli
+except ImportError:  # Optional: without it only .gz siblings are written.
+    brotli = None
+
+# Formats that are already compressed; gzip/brotli would only add bytes.
+PRECOMPRESSED_EXTENSIONS = {
+    '.avif', '.eot', '.gif', '.gz', '.br', '.ico', '.jpeg', '.jpg', '.mp4', '.png', '.webm',
+    '.webp', '.woff', '.woff2', '.zip',
+}
+# A compressed sibling is only kept when it saves at least this fraction.
+MIN_COMPRESSION_SAVING = 0.05
+
+# Hashed names change with their content, so they can be cached for good;
+# plain names (e.g. links from third-party CSS) get a short lifetime.
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+MUTABLE_CACHE_CONTROL = 'public, max-age=3600'
+
+# (Content-Encoding, sibling suffix), in order of preference.
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+ACCEPT_ENCODING_RE = re.compile(r'\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([\d.]+))?')
+
+
+def compress(content):
+    """{suffix: compressed bytes} for the siblings worth writing for `content`."""
+    siblings = {'.gz': gzip.compress(content, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        siblings['.br'] = brotli.compress(content, quality=11)
+    limit = len(content) * (1 - MIN_COMPRESSION_SAVING)
+    return {suffix: data for suffix, data in siblings.items() if len(data) < limit}
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    ManifestStaticFilesStorage that also writes .gz (and .br, when brotli is
+    installed) next to every collected text asset, both the hashed copy and
+    the original name, for serve_static() or a front-end server to send.
+    """
+    # Only url() and @import are rewritten: the vendored bundles keep their
+    # sourceMappingURL comments but ship without the .map files.
+    patterns = (
+        ('*.css', (
+            r"""(?P<matched>url\(['"]{0,1}\s*(?P<url>.*?)["']{0,1}\))""",
+            (r"""(?P<matched>@import\s*["']\s*(?P<url>.*?)["'])""", """@import url("%(url)s")"""),
+        )),
+    )
+    keep_intermediate_files = False
+
+    def stored_name(self, name):
+        if not self.hashed_files:
+            # collectstatic has not run (development checkout, benchmark
+            # database): there is no manifest, so serve the plain names.
+            return name
+        return super().stored_name(name)
+
+    def post_process(self, paths, dry_run=False, **options):
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if not dry_run and not isinstance(processed, Exception):
+                for path in {name, hashed_name} - {None}:
+                    self._write_compressed(path)
+            yield name, hashed_name, processed
+
+    def _write_compressed(self, name):
+        if os.path.splitext(name)[1].lower() in PRECOMPRESSED_EXTENSIONS or not self.exists(name):
+            return
+        with self.open(name) as source:
+            content = source.read()
+        for suffix, data in compress(content).items():
+            if self.exists(name + suffix):
+                self.delete(name + suffix)
+            self._save(name + suffix, ContentFile(data))
+
+
+@cache
+def _immutable_names():
+    return frozenset(getattr(staticfiles_storage, 'hashed_files', {}).values())
+
+
+def _accepted_encodings(header):
+    accepted = set()
+    for token in header.split(','):
+        match = ACCEPT_ENCODING_RE.match(token)
+        if match:
+            try:
+                quality = float(match.group(2) or 1)
+            except ValueError:
+                continue
+            if quality > 0:
+                accepted.add(match.group(1).lower())
+    return accepted
+
+
+@require_safe
+def serve_static(request, path):
+    """
+    Serves collected files from STATIC_ROOT when there is no front-end server
+    (settings.SERVE_STATIC): hashed names are marked immutable, and the .br
+    or .gz sibling is sent when the client accepts it.
+    """
+    path = posixpath.normpath(path).lstrip('/')
+    try:
+        fullpath = safe_join(settings.STATIC_ROOT, path)
+    except ValueError:
+        raise Http404
+    if not os.path.isfile(fullpath):
+        raise Http404
+
+    accepted = _accepted_encodings(request.headers.get('Accept-Encoding', ''))
+    encoding = None
+    for name, suffix in ENCODINGS:
+        if (name in accepted or '*' in accepted) and os.path.isfile(fullpath + suffix):
+            encoding, fullpath = name, fullpath + suffix
+            break
+
+    stat = os.stat(fullpath)
+    if not was_modified_since(request.headers.get('If-Modified-Since'), stat.st_mtime):
+        response = HttpResponseNotModified()
+    else:
+        content_type, _ = mimetypes.guess_type(path)
+        response = FileResponse(
+            open(fullpath, 'rb'), content_type=content_type or 'application/octet-stream',
+            filename=posixpath.basename(path),
+        )
+        response['Last-Modified'] = http_date(stat.st_mtime)
+        if encoding:
+            response['Content-Encoding'] = encoding
+    response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if path in _immutable_names() else MUTABLE_CACHE_CONTROL
+    response['Vary'] = 'Accept-Encoding'
+    return response
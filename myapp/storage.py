@@ -0,0 +1,105 @@
+import hashlib
+import os
+import posixpath
+import re
+
+from django.apps import apps
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import models
+
+from .utils import RENDITION_EXTENSIONS, RENDITION_WIDTHS, forget_renditions, rendition_name
+
+# Renditions are named after their source (utils.rendition_name), which is
+# already content-addressed, so they keep the name they are saved under.
+RENDITION_RE = re.compile(r'_(%s)w\.(%s)$' % (
+    '|'.join(str(width) for width in RENDITION_WIDTHS.values()), '|'.join(RENDITION_EXTENSIONS),
+))
+# Hex digits of the SHA-256 used in file names (128 bits).
+DIGEST_LENGTH = 32
+CONTENT_NAME_RE = re.compile(r'[0-9a-f]{%d}' % DIGEST_LENGTH)
+
+
+def image_fields():
+    """[(model, field name)] for every ImageField of the site's models."""
+    return [
+        (model, field.name)
+        for model in apps.get_app_config('myapp').get_models()
+        for field in model._meta.fields
+        if isinstance(field, models.ImageField)
+    ]
+
+
+def content_digest(content):
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Stores uploads as <upload dir>/<ab>/<sha256 of the content>.<ext>, so
+    saving the same image twice (re-saves, one photo on several products)
+    keeps one file that every row points at, and derivatives named after it
+    are stable. Files are shared, so delete them through release_media(),
+    never directly. Writing or deleting a rendition expires the cached
+    utils.rendition_widths() of its source.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not RENDITION_RE.search(name):
+            name = self.content_name(name, content)
+            if self.exists(name):
+                return name
+            return super().save(name, content, max_length)
+        name = super().save(name, content, max_length)
+        forget_renditions(self, RENDITION_RE.sub('', name))
+        return name
+
+    def delete(self, name):
+        super().delete(name)
+        forget_renditions(self, RENDITION_RE.sub('', name))
+
+    @staticmethod
+    def upload_directory(name):
+        """The directory `name` was uploaded to, e.g. products/3f/3f2a….jpg -> products."""
+        directory, file_name = posixpath.split(name)
+        stem = os.path.splitext(file_name)[0]
+        if CONTENT_NAME_RE.fullmatch(stem) and posixpath.basename(directory) == stem[:2]:
+            return posixpath.dirname(directory)
+        return directory
+
+    def content_name(self, name, content):
+        digest = content_digest(content)[:DIGEST_LENGTH]
+        directory, file_name = posixpath.split(name.replace('\\', '/'))
+        extension = os.path.splitext(file_name)[1].lower()
+        return posixpath.join(directory, digest[:2], f'{digest}{extension}')
+
+
+def is_media_referenced(name):
+    return any(
+        model._default_manager.filter(**{field_name: name}).exists()
+        for model, field_name in image_fields()
+    )
+
+
+def release_media(name, storage=default_storage):
+    """
+    Deletes the file `name` and its renditions once no image field references
+    it any more. Returns True when the files were deleted.
+    """
+    if not name or is_media_referenced(name):
+        return False
+    renditions = [
+        rendition_name(name, width, extension)
+        for extension in RENDITION_EXTENSIONS
+        for width in RENDITION_WIDTHS.values()
+    ]
+    for path in [name, *renditions]:
+        if storage.exists(path):
+            storage.delete(path)
+    return True
@@ -0,0 +1,94 @@
+from urllib.parse import unquote
+
+from django import template
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.forms.utils import flatatt
+from django.utils.html import format_html, format_html_join
+
+from myapp.utils import RENDITION_WIDTHS, rendition_name, rendition_widths, srcset_candidates
+
+register = template.Library()
+
+
+def _resolve(image):
+    """
+    Returns (storage, name) for an ImageField value or a media URL,
+    or (None, None) when the image does not live in media storage.
+    """
+    if not image:
+        return None, None
+    if hasattr(image, 'storage'):
+        return image.storage, image.name
+    url = str(image)
+    if url.startswith(settings.MEDIA_URL):
+        return default_storage, unquote(url[len(settings.MEDIA_URL):])
+    return None, None
+
+
+@register.simple_tag
+def srcset(image, sizes='100vw', default='card'):
+    """
+    Renders the src, srcset and sizes attributes of an <img> for an uploaded
+    image, pointing at its width-bucketed renditions labelled with their
+    real widths. Which renditions exist and how wide they are is read once
+    per image and then cached (utils.rendition_widths). Images without
+    renditions (e.g. uploaded before they existed) fall back to a plain src.
+
+    Usage: <img {% srcset product.main_image sizes="(min-width: 768px) 33vw, 100vw" %} alt="">
+    """
+    storage, name = _resolve(image)
+    if not name:
+        url = image.url if hasattr(image, 'url') else (image or '')
+        return format_html('src="{}"', url)
+
+    widths = rendition_widths(storage, name)
+    if not widths:
+        return format_html('src="{}"', storage.url(name))
+
+    return format_html(
+        'src="{}" srcset="{}" sizes="{}"',
+        storage.url(rendition_name(name, RENDITION_WIDTHS[default])),
+        srcset_candidates(storage, name, widths),
+        sizes,
+    )
+
+
+@register.simple_tag
+def picture(image, sizes='100vw', default='card', **attrs):
+    """
+    Renders a <picture> for an uploaded image offering its AVIF renditions,
+    then its WebP ones, around an <img> pointing at its JPEG renditions, so
+    each browser fetches the smallest format it decodes and the rest still
+    get a JPEG. Without JPEG renditions the <img> falls back to the
+    original file, and images without any renditions render as the plain
+    <img> of {% srcset %}. Other keyword arguments become attributes of
+    the <img>.
+
+    Usage: {% picture product.main_image sizes="(min-width: 768px) 33vw, 100vw" class="w-100" alt=product.name %}
+    """
+    storage, name = _resolve(image)
+    webp_widths = rendition_widths(storage, name) if name else {}
+    if not webp_widths:
+        return format_html('<img {}{}>', srcset(image, sizes, default), flatatt(attrs))
+
+    sources = []
+    for extension, widths in (('avif', rendition_widths(storage, name, 'avif')), ('webp', webp_widths)):
+        if widths:
+            sources.append(format_html(
+                '<source type="image/{}" srcset="{}" sizes="{}">',
+                extension, srcset_candidates(storage, name, widths, extension), sizes,
+            ))
+
+    jpeg_widths = rendition_widths(storage, name, 'jpg')
+    if jpeg_widths:
+        img = format_html(
+            '<img src="{}" srcset="{}" sizes="{}"{}>',
+            storage.url(rendition_name(name, RENDITION_WIDTHS[default], 'jpg')),
+            srcset_candidates(storage, name, jpeg_widths, 'jpg'),
+            sizes,
+            flatatt(attrs),
+        )
+    else:
+        img = format_html('<img src="{}"{}>', storage.url(name), flatatt(attrs))
+    return format_html('<picture>{}{}</picture>', format_html_join('', '{}', ((source,) for source in sources)), img)
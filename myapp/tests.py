@@ -1,3 +1,976 @@
-from django.test import TestCase
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import BytesIO, StringIO
+from types import ModuleType, SimpleNamespace
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core import serializers
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections, router
+from django.template import Context, Template
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path, resolve, reverse
+from django.utils.text import slugify
+from PIL import ExifTags, Image
+
+from .cache import (
+    CSRF_INPUT_RE, CSRF_PLACEHOLDER, aget_services_menu, get_catalog_terms, get_model_versions, get_services_menu,
+)
+from .management.commands.build_sitemaps import default_host
+from .middleware import ReadOnlyDatabaseMiddleware, RequestCollector, get_endpoint_stats, perf_stats
+from . import async_views, views
+from .models import Blog, CatalogTerm, ImageJob, News, Product, ProductImage, Service, Testimonial
+from .pagination import KeysetPaginator
+from .prerender import page_path
+from .rich_text import render_rich_text
+from .routers import READ_ONLY_DATABASE, read_only_database
+from .search import get_backend as get_search_backend
+from .sqlite.base import DatabaseWrapper
+from .urls import view_urlpatterns
+from .utils import (
+    AVIF_SUPPORTED, MAX_SOURCE_DIMENSION, RENDITION_WIDTHS, generate_renditions, has_renditions, open_image,
+    rendition_name,
+)
+
+
+def _jpeg(size, orientation=None, marker=None):
+    """A JPEG of `size`, optionally with an EXIF orientation and a red block in the top-left corner."""
+    img = Image.new('RGB', size, (255, 255, 255))
+    if marker:
+        img.paste((255, 0, 0), (0, 0, marker, marker))
+    exif = Image.Exif()
+    if orientation:
+        exif[ExifTags.Base.Orientation] = orientation
+    output = BytesIO()
+    img.save(output, 'JPEG', quality=90, exif=exif)
+    output.seek(0)
+    return output
+
+
+# Decodes the JPEG at argv[1] in a fresh interpreter and prints the upright
+# size, the tracemalloc peak and how much the process's peak RSS grew. Pillow
+# allocates pixel buffers outside the Python allocator, where tracemalloc
+# cannot see them, so the RSS growth is what bounds the decoded pixels.
+MEASURE_DECODE = '''
+import json, resource, sys, tracemalloc
+import django
+django.setup()
+from myapp.utils import open_image
+before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+tracemalloc.start()
+img = open_image(sys.argv[1])
+peak = tracemalloc.get_traced_memory()[1]
+after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({'size': img.size, 'traced_peak': peak, 'rss_growth': (after - before) * 1024}))
+'''
+
+
+class LoadBoundedTests(SimpleTestCase):
+    # A full decode of the 24MP test photo takes 72MB; the draft decode
+    # needs a quarter of that plus the 2400px result.
+    MEMORY_BOUND = 40 * 1024 * 1024
+
+    def test_large_jpeg_decodes_within_memory_bound(self):
+        with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as source:
+            source.write(_jpeg((6000, 4000)).getvalue())
+        self.addCleanup(os.remove, source.name)
+
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'visionmark.settings')}
+        result = subprocess.run(
+            [sys.executable, '-c', MEASURE_DECODE, source.name],
+            capture_output=True, text=True, check=True, cwd=settings.BASE_DIR, env=env,
+        )
+        measured = json.loads(result.stdout.strip().splitlines()[-1])
+
+        self.assertEqual(measured['size'], [MAX_SOURCE_DIMENSION, 1600])
+        self.assertLess(measured['traced_peak'], self.MEMORY_BOUND)
+        self.assertLess(measured['rss_growth'], self.MEMORY_BOUND)
+
+    def test_exif_rotated_source_comes_out_upright(self):
+        # Stored landscape, displayed portrait (rotate 90 degrees clockwise).
+        source = _jpeg((4000, 3000), orientation=6, marker=400)
+        largest = max(RENDITION_WIDTHS.values())
+
+        img = open_image(source, size=(largest, largest * 4))
+
+        # The rendition box limits the upright width, not the stored one.
+        self.assertEqual(img.size, (largest, 2133))
+        # The stored top-left corner ends up top-right.
+        red, green, blue = img.getpixel((img.width - 20, 20))[:3]
+        self.assertGreater(red, 200)
+        self.assertLess(green, 60)
+        self.assertLess(blue, 60)
+
+
+class SanitizerTests(SimpleTestCase):
+    def render(self, html):
+        return render_rich_text(html)[0]
+
+    def test_script_tags_are_dropped_with_their_content(self):
+        self.assertEqual(self.render('<p>a<script>alert(1)</script>b</p>'), '<p>ab</p>')
+        self.assertEqual(self.render('<p>a<SCRIPT src="//evil.example/x.js"></SCRIPT>b</p>'), '<p>ab</p>')
+
+    def test_event_handler_attributes_are_dropped(self):
+        html = self.render(
+            '<p onclick="alert(1)">t</p><a href="/x" onmouseover="alert(1)">x</a>'
+            '<img src="https://example.com/x.png" onerror="alert(1)">'
+        )
+        self.assertNotIn('alert', html)
+        self.assertNotIn(' on', html)
+        self.assertIn('<a href="/x">x</a>', html)
+
+    def test_javascript_urls_are_dropped(self):
+        for url in ('javascript:alert(1)', 'JaVaScRiPt:alert(1)', ' javascript:alert(1)',
+                    '&#106;avascript:alert(1)', 'java\tscript:alert(1)', 'vbscript:msgbox(1)'):
+            with self.subTest(url=url):
+                html = self.render(f'<a href="{url}">link</a><img src="{url}" alt="x">')
+                self.assertEqual(html, '<a>link</a>')
+
+    def test_data_urls_are_not_allowed_as_image_sources(self):
+        self.assertEqual(self.render('<img src="data:text/html;base64,PHNjcmlwdD4=">'), '')
+
+    def test_media_paths_outside_media_root_are_left_alone(self):
+        for path in ('../../etc/passwd', '..%2F..%2Fetc/passwd'):
+            with self.subTest(path=path):
+                src = f'{settings.MEDIA_URL}{path}'
+                self.assertEqual(
+                    self.render(f'<img src="{src}">'), f'<img src="{src}" alt="" loading="lazy" decoding="async">',
+                )
+
+    def test_style_attributes_and_tags_are_dropped(self):
+        html = self.render(
+            '<p style="background:url(javascript:alert(1))">a</p>'
+            '<span class="text-big" style="position:fixed">b</span><style>p { color: red }</style>'
+        )
+        self.assertEqual(html, '<p>a</p><span class="text-big">b</span>')
+
+    def test_text_is_escaped(self):
+        self.assertEqual(self.render('<p>&lt;script&gt;x</p>'), '<p>&lt;script&gt;x</p>')
+        self.assertEqual(self.render('<a title="&quot;><script>">x</a>'), '<a title="&quot;&gt;&lt;script&gt;">x</a>')
+
+
+class ImageJobTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        self.product = Product.objects.create(
+            name='Frame', slug='frame', description='', price=1000,
+            main_image=SimpleUploadedFile('front.jpg', _jpeg((900, 600)).getvalue()),
+        )
+
+    def test_save_queues_the_image_once(self):
+        self.assertTrue(self.product.main_image.name.endswith('.jpg'))
+        self.assertFalse(has_renditions(self.product.main_image))
+        self.product.save()
+        job = ImageJob.objects.get()
+        self.assertEqual((job.field_name, job.source_name), ('main_image', self.product.main_image.name))
+        self.assertEqual(job.status, ImageJob.Status.PENDING)
+
+    def test_claimed_job_converts_the_image(self):
+        job = ImageJob.claim_next()
+        self.assertEqual((job.status, job.attempts), (ImageJob.Status.RUNNING, 1))
+        self.assertIsNone(ImageJob.claim_next())
+
+        job.run()
+
+        job.refresh_from_db()
+        self.product.refresh_from_db()
+        self.assertEqual(job.status, ImageJob.Status.DONE)
+        self.assertTrue(self.product.main_image.name.endswith('.webp'))
+        self.assertTrue(has_renditions(self.product.main_image, avif=True))
+        self.assertFalse(default_storage.exists(job.source_name))
+
+    def test_replaced_image_is_skipped(self):
+        job = ImageJob.claim_next()
+        Product.objects.filter(pk=self.product.pk).update(main_image='products/other.jpg')
+
+        job.run()
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImageJob.Status.DONE)
+        self.assertTrue(default_storage.exists(job.source_name))
+
+    def test_unreadable_image_fails_with_its_error(self):
+        with default_storage.open(self.product.main_image.name, 'wb') as f:
+            f.write(b'not an image')
+        job = ImageJob.claim_next()
+
+        with self.assertLogs('myapp.utils', 'ERROR'):
+            job.run()
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImageJob.Status.FAILED)
+        self.assertTrue(job.error)
+
+    def test_stale_running_jobs_are_retried(self):
+        job = ImageJob.claim_next()
+        ImageJob.objects.filter(pk=job.pk).update(updated_at=job.updated_at - timedelta(hours=1))
+
+        call_command('process_image_jobs', '--once', stdout=StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (ImageJob.Status.DONE, 2))
+
+
+class InlineImageTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        self.name = default_storage.save('uploads/photo.jpg', ContentFile(_jpeg((1200, 800)).getvalue()))
+        self.html = f'<p><img src="{default_storage.url(self.name)}" alt="Frame"></p>'
+
+    def image(self):
+        return SimpleNamespace(name=self.name, storage=default_storage)
+
+    def test_rendering_does_not_build_renditions(self):
+        missing = []
+        html = render_rich_text(self.html, missing_renditions=missing)[0]
+
+        self.assertEqual(missing, [self.name])
+        self.assertFalse(has_renditions(self.image()))
+        self.assertIn(f'src="{default_storage.url(self.name)}"', html)
+        self.assertIn('width="1200" height="800"', html)
+        self.assertNotIn('srcset', html)
+
+    def test_image_job_builds_renditions_and_rerenders(self):
+        post = Blog.objects.create(title='Frames', slug='frames', content=self.html)
+        job = ImageJob.objects.get(field_name='content', source_name=self.name)
+
+        job.run()
+
+        job.refresh_from_db()
+        post.refresh_from_db()
+        self.assertEqual(job.status, ImageJob.Status.DONE)
+        self.assertTrue(has_renditions(self.image()))
+        self.assertIn(default_storage.url(rendition_name(self.name, RENDITION_WIDTHS['detail'])), post.content_html)
+        self.assertIn('srcset=', post.content_html)
+        self.assertFalse(ImageJob.objects.filter(status=ImageJob.Status.PENDING).exists())
+
+
+class OptimizeMediaTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+
+    def test_card_columns_follow_converted_images(self):
+        product = Product.objects.create(name='Frame', slug='frame', description='', price=1000)
+        ProductImage.objects.create(
+            product=product, image=SimpleUploadedFile('front.jpg', _jpeg((900, 600)).getvalue()), is_primary=True,
+        )
+        product.refresh_from_db()
+        self.assertTrue(product.card_image.endswith('.jpg'))
+
+        call_command('optimize_media', workers=1, stdout=StringIO())
+
+        product.refresh_from_db()
+        self.assertEqual(product.card_image, product.gallery.get().image.name)
+        self.assertTrue(product.card_image.endswith('.webp'))
+        self.assertTrue(default_storage.exists(product.card_image))
+        call_command('sync_product_cards', '--verify', stdout=StringIO())
+
+    def test_converted_image_is_named_after_its_content(self):
+        image = ProductImage.objects.create(
+            product=Product.objects.create(name='Frame', slug='frame', description='', price=1000),
+            image=SimpleUploadedFile('front.jpg', _jpeg((900, 600)).getvalue()),
+        )
+        original = image.image.name
+        generate_renditions(image.image)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('optimize_media', workers=1, stdout=StringIO())
+
+        image.refresh_from_db()
+        with default_storage.open(image.image.name) as converted:
+            self.assertEqual(image.image.name, default_storage.content_name('products/gallery/x.webp', converted))
+        self.assertTrue(has_renditions(image.image))
+        self.assertFalse(default_storage.exists(original))
+        self.assertEqual(sorted(os.listdir(os.path.dirname(default_storage.path(original)))), [])
+
+
+class ProductCardTests(TestCase):
+    def test_sale_price_counts_only_below_the_price(self):
+        for sale_price, effective_price, discount in ((800, 800, 20), (1000, 1000, 0), (1200, 1000, 0), (None, 1000, 0)):
+            with self.subTest(sale_price=sale_price):
+                product = Product.objects.create(
+                    name='Frame', slug=f'frame-{sale_price}', description='', price=1000, sale_price=sale_price,
+                )
+                product.refresh_from_db()
+                self.assertEqual(product.effective_price, effective_price)
+                self.assertEqual(product.discount_percent, discount)
+
+
+class KeysetPaginatorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Equal prices, so pages split inside runs of the same leading key.
+        Product.objects.bulk_create(
+            Product(name=f'Frame {i}', slug=f'frame-{i}', description='', price=price, effective_price=price,
+                    is_featured=i % 3 == 0)
+            for i, price in enumerate(1000 + 100 * (i % 4) for i in range(23))
+        )
+
+    def paginator(self, sort='price_asc'):
+        return KeysetPaginator(Product.objects.sort_catalog(sort).cards(), 5, models=[Product])
+
+    def test_next_links_walk_every_row_once(self):
+        # newest seeks on created_at, which differs only in microseconds here.
+        for sort in ('price_asc', 'price_desc', 'newest', 'featured'):
+            with self.subTest(sort=sort):
+                expected = list(Product.objects.sort_catalog(sort).values_list('pk', flat=True))
+                seen, cursor, numbers = [], None, []
+                while True:
+                    page = self.paginator(sort).get_page(cursor)
+                    seen += [product.pk for product in page]
+                    numbers.append(page.number)
+                    if not page.has_next():
+                        break
+                    cursor = page.next_cursor
+                self.assertEqual(seen, expected)
+                self.assertEqual(numbers, [1, 2, 3, 4, 5])
+                self.assertEqual(page.paginator.num_pages, 5)
+
+    def test_featured_products_come_first(self):
+        featured = [product.is_featured for product in Product.objects.sort_catalog('featured')]
+        self.assertEqual(featured, sorted(featured, reverse=True))
+        self.assertNotEqual(
+            list(Product.objects.sort_catalog('featured')), list(Product.objects.sort_catalog('newest')),
+        )
+
+    def test_previous_links_return_the_same_pages(self):
+        pages = [self.paginator().get_page(None)]
+        while pages[-1].has_next():
+            pages.append(self.paginator().get_page(pages[-1].next_cursor))
+        for page, before in zip(pages[:0:-1], pages[-2::-1]):
+            back = self.paginator().get_page(page.previous_cursor)
+            self.assertEqual(back.number, before.number)
+            self.assertEqual(list(back), list(before))
+        self.assertIsNone(pages[1].previous_cursor)
+
+    def test_deep_page_is_one_query(self):
+        cursor = self.paginator().get_page(None).next_cursor
+        with self.assertNumQueries(1):
+            self.assertEqual(len(self.paginator().get_page(cursor)), 5)
+
+    def test_malformed_cursor_gives_first_page(self):
+        first = list(self.paginator().get_page(None))
+        for cursor in ('', 'x', 'bm90IGpzb24', 'WyJhZnRlciIsMixbXV0', 'WyJzaWRld2F5cyIsMixbMSwyXV0'):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(list(self.paginator().get_page(cursor)), first)
+
+    def test_page_numbers_map_to_cursors(self):
+        pages = [self.paginator().get_page(None)]
+        while pages[-1].has_next():
+            pages.append(self.paginator().get_page(pages[-1].next_cursor))
+        for number, page in enumerate(pages[1:], start=2):
+            with self.subTest(number=number):
+                cursor = self.paginator().cursor_for_page(str(number))
+                self.assertEqual(list(self.paginator().get_page(cursor)), list(page))
+        for number in ('1', '0', '6', 'x', '99999'):
+            with self.subTest(number=number):
+                self.assertIsNone(self.paginator().cursor_for_page(number))
+
+    def test_count_stops_at_limit(self):
+        paginator = self.paginator()
+        paginator.COUNT_LIMIT = 10
+        self.assertTrue(paginator.count_capped)
+        self.assertIsNone(paginator.num_pages)
+
+
+class SitemapTests(TestCase):
+    def test_gallery_change_expires_product_pages(self):
+        product = Product.objects.create(name='Frame', slug='frame', description='', price=1000)
+        before = get_model_versions([Product])[Product]
+        ProductImage.objects.create(product=product, image='products/front.jpg', is_primary=True)
+        self.assertNotEqual(get_model_versions([Product])[Product], before)
+
+    def test_loaded_gallery_leaves_the_product_as_loaded(self):
+        product = Product.objects.create(name='Frame', slug='frame', description='', price=1000)
+        ProductImage.objects.create(product=product, image='products/front.jpg', is_primary=True)
+        loaded_at = datetime(2020, 1, 1, tzinfo=dt_timezone.utc)
+        Product.objects.filter(pk=product.pk).update(updated_at=loaded_at)
+        fixture = os.path.join(tempfile.mkdtemp(), 'gallery.json')
+        self.addCleanup(shutil.rmtree, os.path.dirname(fixture))
+        with open(fixture, 'w') as f:
+            f.write(serializers.serialize('json', [*Product.objects.all(), *ProductImage.objects.all()]))
+        Product.objects.all().delete()
+
+        call_command('loaddata', fixture, verbosity=0)
+        self.assertEqual(Product.objects.get().updated_at, loaded_at)
+
+    @override_settings(ALLOWED_HOSTS=['localhost', '.visionmark.in', 'visionmark.in', '*'])
+    def test_default_host_is_the_public_one(self):
+        self.assertEqual(default_host(), 'visionmark.in')
+
+
+class SrcsetTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+
+    def render(self, image):
+        return Template('{% load image_extras %}<img {% srcset image %}>').render(Context({'image': image}))
+
+    def test_narrow_source_lists_real_widths(self):
+        name = default_storage.save('uploads/narrow.jpg', ContentFile(_jpeg((600, 400)).getvalue()))
+        image = SimpleNamespace(name=name, storage=default_storage)
+        self.assertNotIn('srcset', self.render(image))
+
+        generate_renditions(image)
+        html = self.render(image)
+
+        self.assertIn(f'{default_storage.url(rendition_name(name, 160))} 160w', html)
+        self.assertIn(f'{default_storage.url(rendition_name(name, 480))} 480w', html)
+        self.assertIn(f'{default_storage.url(rendition_name(name, 960))} 600w', html)
+        self.assertNotIn(' 960w', html)
+        self.assertNotIn(rendition_name(name, 1600), html)
+
+    def test_widths_are_not_read_again(self):
+        name = default_storage.save('uploads/photo.jpg', ContentFile(_jpeg((1200, 800)).getvalue()))
+        image = SimpleNamespace(name=name, storage=default_storage)
+        generate_renditions(image)
+        html = self.render(image)
+
+        with mock.patch.object(default_storage, 'open', side_effect=AssertionError), \
+                mock.patch.object(default_storage, 'exists', side_effect=AssertionError):
+            self.assertEqual(self.render(image), html)
+
+
+class CollectedStaticTests(TestCase):
+    def test_admin_renders_from_the_manifest(self):
+        static_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, static_root)
+        self.enterContext(override_settings(STATIC_ROOT=static_root, DEBUG=False))
+        call_command('collectstatic', interactive=False, verbosity=0)
+        User.objects.create_superuser('admin', 'admin@example.com', 'password')
+
+        self.assertEqual(self.client.get('/admin/login/').status_code, 200)
+        self.client.login(username='admin', password='password')
+        response = self.client.get('/admin/myapp/product/')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, staticfiles_storage.url('css/admin-ckeditor.css'))
+
+
+class PictureTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        self.name = default_storage.save('products/front.jpg', ContentFile(_jpeg((1200, 800)).getvalue()))
+        self.image = SimpleNamespace(name=self.name, storage=default_storage)
+
+    def render(self):
+        return Template('{% load image_extras %}{% picture image alt="Frame" %}').render(Context({'image': self.image}))
+
+    def url(self, width, extension):
+        return default_storage.url(rendition_name(self.name, width, extension))
+
+    @skipUnless(AVIF_SUPPORTED, "Pillow was built without AVIF support")
+    def test_offers_avif_then_webp_then_jpeg(self):
+        generate_renditions(self.image, avif=True)
+        html = self.render()
+
+        avif = html.index('<source type="image/avif"')
+        webp = html.index('<source type="image/webp"')
+        img = html.index('<img ')
+        self.assertLess(avif, webp)
+        self.assertLess(webp, img)
+        self.assertIn(f'{self.url(960, "avif")} 960w', html[avif:webp])
+        self.assertIn(f'{self.url(960, "webp")} 960w', html[webp:img])
+        self.assertIn(f'src="{self.url(480, "jpg")}"', html[img:])
+        self.assertIn(f'{self.url(1600, "jpg")} 1200w', html[img:])
+        self.assertIn('alt="Frame"', html[img:])
+        with default_storage.open(rendition_name(self.name, 480, 'jpg')) as fallback:
+            self.assertEqual(Image.open(fallback).format, 'JPEG')
+
+    def test_without_avif_renditions(self):
+        with mock.patch('myapp.utils.AVIF_SUPPORTED', False):
+            generate_renditions(self.image, avif=True)
+        html = self.render()
+
+        self.assertNotIn('image/avif', html)
+        self.assertLess(html.index('<source type="image/webp"'), html.index('<img '))
+        self.assertIn(f'src="{self.url(480, "jpg")}"', html)
+
+    def test_without_jpeg_renditions_falls_back_to_the_original(self):
+        generate_renditions(self.image)
+        html = self.render()
+
+        self.assertIn('<source type="image/webp"', html)
+        self.assertIn(f'<img src="{default_storage.url(self.name)}" alt="Frame">', html)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class PageTestCase(TestCase):
+    """
+    Requests public pages. Their reads would go through the 'readonly'
+    alias, but the test database lives in memory, where a second connection
+    cannot read past the test's open transaction, so the router keeps them
+    on 'default' here. Pages are cached in memory, fresh for each test.
+    """
+    def setUp(self):
+        cache.clear()
+        self.enterContext(mock.patch('myapp.routers.READ_ONLY_DATABASE', 'default'))
+
+
+class ConditionalViewTests(PageTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(6):
+            Product.objects.create(name=f'Frame {i}', slug=f'frame-{i}', description='', price=1000)
+            Blog.objects.create(title=f'Post {i}', slug=f'post-{i}', content='<p>Text</p>', is_published=True)
+            News.objects.create(title=f'News {i}', slug=f'news-{i}', content='<p>Text</p>')
+
+    def assertRevalidates(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Last-Modified', response)
+        revalidated = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+        return response['ETag']
+
+    def test_detail_pages_answer_304(self):
+        for url in (reverse('product_detail', args=['frame-5']), reverse('blog_single', args=['post-5']),
+                    reverse('news_detail', args=['news-5'])):
+            with self.subTest(url=url):
+                self.assertRevalidates(url)
+
+    def test_only_rendered_rows_change_the_etag(self):
+        url = reverse('product_detail', args=['frame-5'])
+        etag = self.assertRevalidates(url)
+
+        # Too old to be among the four related products.
+        Product.objects.get(slug='frame-0').save()
+        self.assertEqual(self.assertRevalidates(url), etag)
+
+        Product.objects.get(slug='frame-1').save()
+        self.assertNotEqual(self.assertRevalidates(url), etag)
+
+    def test_services_change_the_etag(self):
+        url = reverse('blog_single', args=['post-5'])
+        etag = self.assertRevalidates(url)
+        Service.objects.create(name='Eye tests', description='', image='services/eye.jpg')
+        self.assertNotEqual(self.assertRevalidates(url), etag)
+
+
+class ViewCacheTests(PageTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(8):
+            Blog.objects.create(title=f'Post {i}', slug=f'post-{i}', content='<p>Text</p>', is_published=True)
+
+    def test_cached_page_skips_the_database(self):
+        url = reverse('services')
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_untracked_parameters_share_the_entry(self):
+        url = reverse('services')
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            self.client.get(url, {'utm_source': 'newsletter', 'fbclid': 'x'})
+
+    def test_listed_parameters_get_their_own_entry(self):
+        first = self.client.get(reverse('blog_list'))
+        second = self.client.get(reverse('blog_list'), {'cursor': first.context['page_obj'].next_cursor})
+        self.assertContains(first, 'Post 7')
+        self.assertNotContains(second, 'Post 7')
+        self.assertContains(second, 'Post 0')
+
+    def test_scheme_is_part_of_the_key(self):
+        self.client.get(reverse('services'))
+        with self.assertNumQueries(1):
+            self.client.get(reverse('services'), secure=True)
+
+    def test_saving_a_dependency_expires_the_page(self):
+        self.client.get(reverse('blog_list'))
+        Blog.objects.create(title='Fresh post', slug='fresh', content='<p>Text</p>', is_published=True)
+        self.assertContains(self.client.get(reverse('blog_list')), 'Fresh post')
+
+    def test_unrelated_models_keep_the_page(self):
+        self.client.get(reverse('blog_list'))
+        News.objects.create(title='Opening hours', slug='hours', content='<p>Text</p>')
+        with self.assertNumQueries(0):
+            self.client.get(reverse('blog_list'))
+
+
+class LegacyPageTests(PageTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(8):
+            Blog.objects.create(title=f'Post {i}', slug=f'post-{i}', content='<p>Text</p>', is_published=True)
+
+    def test_page_number_redirects_to_its_cursor(self):
+        first = self.client.get(reverse('blog_list'))
+        response = self.client.get(reverse('blog_list'), {'page': 2})
+        self.assertRedirects(
+            response, f"{reverse('blog_list')}?cursor={first.context['page_obj'].next_cursor}",
+            status_code=302, fetch_redirect_response=False,
+        )
+        self.assertContains(self.client.get(response.url), 'Post 0')
+
+    def test_unreachable_pages_redirect_to_the_list(self):
+        for page in ('1', '3', 'x'):
+            with self.subTest(page=page):
+                response = self.client.get(reverse('news_list'), {'page': page})
+                self.assertRedirects(response, reverse('news_list'), status_code=301, fetch_redirect_response=False)
+
+    def test_filters_are_kept(self):
+        response = self.client.get(reverse('products'), {'page': '4', 'sort': 'price_asc'})
+        self.assertRedirects(
+            response, f"{reverse('products')}?sort=price_asc", status_code=301, fetch_redirect_response=False,
+        )
+
+
+class PrerenderTests(PageTestCase):
+    def setUp(self):
+        super().setUp()
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        self.enterContext(override_settings(PRERENDER_ROOT=root))
+        Service.objects.create(name='Eye tests', description='', image='services/eye.jpg')
+        call_command('build_static_pages', 'about', stdout=StringIO())
+
+    def test_built_page_is_served_without_rendering(self):
+        with mock.patch('myapp.views.render') as render:
+            response = self.client.get(reverse('about'))
+        render.assert_not_called()
+        self.assertEqual(response.content.decode(), page_path('about').read_text(encoding='utf-8'))
+        self.assertContains(response, 'Eye tests')
+        self.assertNotContains(response, CSRF_PLACEHOLDER)
+
+    def test_service_changes_rebuild_the_page(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Service.objects.create(name='Contact lenses', description='', image='services/lenses.jpg')
+        self.assertContains(self.client.get(reverse('about')), 'Contact lenses')
+
+
+class SearchTests(PageTestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = Product.objects.create(
+            name='Aviator Classic', slug='aviator', description='<p>Gold frame</p>', price=1000,
+        )
+        self.post = Blog.objects.create(
+            title='Choosing lenses', slug='lenses', content='<p>Aviator frames suit most faces</p>', is_published=True,
+        )
+        Blog.objects.create(title='Aviator draft', slug='draft', content='<p>Text</p>')
+
+    def titles(self, text):
+        return [hit['title'] for hit in get_search_backend().search(text)]
+
+    def test_saved_rows_are_ranked_by_title_first(self):
+        self.assertEqual(self.titles('aviator'), ['Aviator Classic', 'Choosing lenses'])
+        self.assertEqual(self.titles('gold'), ['Aviator Classic'])
+
+    def test_unpublished_and_deleted_rows_leave_the_index(self):
+        self.post.is_published = False
+        self.post.save()
+        self.product.delete()
+        self.assertEqual(self.titles('aviator'), [])
+
+    def test_operators_in_the_query_are_inert(self):
+        self.assertEqual(self.titles('aviator" OR title:*'), [])
+        self.assertEqual(self.titles('NEAR( AND'), [])
+
+    def test_search_page_highlights_matches(self):
+        response = self.client.get(reverse('search'), {'q': 'gold'})
+        self.assertContains(response, '<mark>Gold</mark>')
+        self.assertContains(response, reverse('product_detail', args=['aviator']))
+
+    def test_suggest_matches_title_prefixes(self):
+        response = self.client.get(reverse('search_suggest'), {'q': 'avi'})
+        self.assertEqual([hit['title'] for hit in response.json()['suggestions']], ['Aviator Classic'])
+        self.assertEqual(self.client.get(reverse('search_suggest'), {'q': 'a'}).json(), {'suggestions': []})
+
+
+class ServicesMenuTests(PageTestCase):
+    def setUp(self):
+        super().setUp()
+        self.service = Service.objects.create(name='Eye tests', description='', image='services/eye.jpg')
+
+    def test_menu_is_read_from_the_database_once(self):
+        with self.assertNumQueries(1):
+            get_services_menu()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_services_menu(), [{'id': self.service.pk, 'name': 'Eye tests'}])
+            self.assertEqual(async_to_sync(aget_services_menu)(), get_services_menu())
+
+    def test_saving_or_deleting_a_service_refreshes_the_menu(self):
+        get_services_menu()
+        self.service.name = 'Eye examinations'
+        self.service.save()
+        self.assertEqual(get_services_menu(), [{'id': self.service.pk, 'name': 'Eye examinations'}])
+        self.service.delete()
+        self.assertEqual(get_services_menu(), [])
+
+    def test_pages_render_the_current_menu(self):
+        self.assertContains(self.client.get(reverse('faq')), 'Eye tests')
+        Service.objects.create(name='Contact lenses', description='', image='services/lenses.jpg')
+        self.assertContains(self.client.get(reverse('faq')), 'Contact lenses')
+
+
+class PerformanceMiddlewareTests(PageTestCase):
+    def setUp(self):
+        super().setUp()
+        # The middleware wraps Template.render when it is loaded.
+        self.addCleanup(setattr, Template, 'render', Template.render)
+        perf_stats.pending.clear()
+        for i in range(3):
+            Blog.objects.create(title=f'Post {i}', slug=f'post-{i}', content='<p>Text</p>', is_published=True)
+
+    @override_settings(PERF_INSTRUMENTATION=True)
+    def test_server_timing_reports_the_request(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('blog_list'))
+        metrics = re.findall(r'(\w+);dur=([\d.]+)', response['Server-Timing'])
+        self.assertEqual([name for name, _ in metrics], ['db', 'tpl', 'total'])
+        self.assertIn(f'desc="{len(queries)} queries, 0 duplicated"', response['Server-Timing'])
+
+    def test_repeated_statements_are_counted(self):
+        collector = RequestCollector()
+        with connection.execute_wrapper(collector):
+            for i in range(3):
+                Blog.objects.get(slug=f'post-{i}')
+            Blog.objects.count()
+        self.assertEqual(collector.query_count, 4)
+        self.assertEqual(collector.duplicate_queries, 2)
+
+    @override_settings(PERF_INSTRUMENTATION=True)
+    def test_samples_reach_the_dashboard(self):
+        for _ in range(3):
+            self.client.get(reverse('blog_list'))
+        stats = {summary['endpoint']: summary for summary in get_endpoint_stats()}
+        self.assertEqual(stats['GET blog_list']['requests'], 3)
+        self.assertEqual(stats['GET blog_list']['duplicate_queries'], 0)
+
+    def test_off_by_default(self):
+        self.assertNotIn('Server-Timing', self.client.get(reverse('blog_list')))
+
+
+class ListingQueryTests(PageTestCase):
+    def add_rows(self, count):
+        start = Product.objects.count()
+        for i in range(start, start + count):
+            product = Product.objects.create(
+                name=f'Frame {i}', slug=f'frame-{i}', description='<p>Text</p>', price=1000,
+            )
+            ProductImage.objects.create(product=product, image=f'products/{i}.jpg', is_primary=True)
+            Blog.objects.create(title=f'Post {i}', slug=f'post-{i}', content='<p>Text</p>', is_published=True)
+            News.objects.create(title=f'News {i}', slug=f'news-{i}', content='<p>Text</p>')
+
+    def test_hot_queries_use_indexes(self):
+        self.add_rows(3)
+        output = StringIO()
+        call_command('check_query_plans', stdout=output)
+        self.assertNotIn('FULL SCAN', output.getvalue())
+
+    def test_list_pages_do_not_query_per_row(self):
+        urls = [reverse('home'), reverse('blog_list'), reverse('news_list'), reverse('products'),
+                reverse('blog_single', args=['post-0']), reverse('news_detail', args=['news-0']),
+                reverse('product_detail', args=['frame-0'])]
+        # Enough rows for a second page, so the pagers count them too.
+        self.add_rows(10)
+        counts = {}
+        for url in urls:
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(url)
+            counts[url] = len(queries)
+        self.add_rows(10)
+        for url in urls:
+            with self.subTest(url=url):
+                cache.clear()
+                with self.assertNumQueries(counts[url]):
+                    self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class CardFieldsTests(PageTestCase):
+    HEAVY_FIELDS = {Product: {'description', 'description_html'}, Blog: {'content', 'content_html'},
+                    News: {'content', 'content_html'}}
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(3):
+            Product.objects.create(name=f'Frame {i}', slug=f'frame-{i}', description='<p>Text</p>', price=1000)
+            Blog.objects.create(title=f'Post {i}', slug=f'post-{i}', content='<p>Text</p>', is_published=True)
+            News.objects.create(title=f'News {i}', slug=f'news-{i}', content='<p>Text</p>')
+
+    def assertCards(self, objects):
+        self.assertTrue(objects)
+        for obj in objects:
+            self.assertLessEqual(self.HEAVY_FIELDS[type(obj)], obj.get_deferred_fields())
+
+    def test_cards_leave_the_rich_text_unloaded(self):
+        for model in self.HEAVY_FIELDS:
+            with self.subTest(model=model.__name__):
+                with self.assertNumQueries(1):
+                    self.assertCards(list(model.objects.cards()))
+
+    def test_list_pages_and_sidebars_render_cards(self):
+        pages = [
+            (reverse('home'), 'latest_products'),
+            (reverse('blog_list'), 'page_obj'),
+            (reverse('news_list'), 'page_obj'),
+            (reverse('products'), 'page_obj'),
+            (reverse('blog_single', args=['post-0']), 'popular_posts'),
+            (reverse('news_detail', args=['news-0']), 'recent_news'),
+            (reverse('product_detail', args=['frame-0']), 'related_products'),
+        ]
+        for url, name in pages:
+            with self.subTest(url=url):
+                self.assertCards(list(self.client.get(url).context[name]))
+
+
+class AsyncViewTests(PageTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.service = Service.objects.create(name='Eye tests', description='', image='services/eye.jpg')
+        Testimonial.objects.create(name='Asha', comment='Great service', rating=5)
+        for i in range(8):
+            Product.objects.create(name=f'Frame {i}', slug=f'frame-{i}', description='<p>Gold frame</p>', price=1000)
+            Blog.objects.create(title=f'Post {i}', slug=f'post-{i}', content='<p>Gold text</p>', is_published=True)
+            News.objects.create(title=f'News {i}', slug=f'news-{i}', content='<p>Gold text</p>')
+
+    def get(self, url, urlconf):
+        cache.clear()
+        with override_settings(ROOT_URLCONF=urlconf):
+            response = self.client.get(url)
+        content = CSRF_INPUT_RE.sub(r'\g<1>\g<2>', response.content.decode())
+        return response.status_code, response.get('Location'), content
+
+    def test_async_views_match_the_sync_views(self):
+        urlconf = ModuleType('async_urls')
+        urlconf.urlpatterns = [path('', include(view_urlpatterns(async_views)))]
+        urlconf.handler404 = views.handler404
+        self.assertEqual(resolve(reverse('products'), urlconf).func.__module__, async_views.__name__)
+        urls = [
+            reverse('home'), reverse('services'), reverse('servicedetails', args=[self.service.pk]),
+            reverse('blog_list'), f"{reverse('blog_list')}?page=2", reverse('blog_single', args=['post-0']),
+            reverse('news_list'), reverse('news_detail', args=['news-0']), reverse('products'),
+            f"{reverse('products')}?sort=price_asc&category=eyeglasses", reverse('product_detail', args=['frame-0']),
+            reverse('testimonials'), f"{reverse('search')}?q=gold", f"{reverse('search_suggest')}?q=fra",
+            reverse('about'), reverse('blog_single', args=['missing']),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.get(url, urlconf), self.get(url, settings.ROOT_URLCONF))
+
+
+class ReadOnlyRoutingTests(SimpleTestCase):
+    def route(self, request):
+        return {'read': router.db_for_read(Product), 'write': router.db_for_write(Product)}
+
+    def test_router_sends_reads_to_readonly_only_when_asked(self):
+        self.assertEqual(router.db_for_read(Product), 'default')
+        with read_only_database():
+            self.assertEqual(router.db_for_read(Product), READ_ONLY_DATABASE)
+            self.assertEqual(router.db_for_write(Product), 'default')
+        self.assertEqual(router.db_for_read(Product), 'default')
+        self.assertFalse(router.allow_migrate(READ_ONLY_DATABASE, 'myapp'))
+
+    def test_middleware_routes_public_gets_only(self):
+        factory = RequestFactory()
+        middleware = ReadOnlyDatabaseMiddleware(self.route)
+        async_middleware = ReadOnlyDatabaseMiddleware(sync_to_async(self.route))
+        for request, read in (
+            (factory.get('/products'), READ_ONLY_DATABASE),
+            (factory.head('/blog'), READ_ONLY_DATABASE),
+            (factory.post('/contact'), 'default'),
+            (factory.get('/admin/myapp/product/'), 'default'),
+            (factory.get('/ckeditor5/image_upload/'), 'default'),
+        ):
+            with self.subTest(method=request.method, path=request.path):
+                self.assertEqual(middleware(request), {'read': read, 'write': 'default'})
+                self.assertEqual(async_to_sync(async_middleware)(request), {'read': read, 'write': 'default'})
+
+    def test_readonly_connection_refuses_writes(self):
+        path = os.path.join(tempfile.mkdtemp(), 'db.sqlite3')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        databases = {
+            alias: DatabaseWrapper({**connections.settings[alias], 'NAME': path}, f'{alias}-file')
+            for alias in ('default', READ_ONLY_DATABASE)
+        }
+        for database in databases.values():
+            self.addCleanup(database.close)
+
+        with databases['default'].cursor() as cursor:
+            cursor.execute('CREATE TABLE frame (name TEXT)')
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone(), ('wal',))
+        with databases[READ_ONLY_DATABASE].cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM frame')
+            with self.assertRaises(OperationalError):
+                cursor.execute("INSERT INTO frame VALUES ('Aviator')")
+
+
+class CatalogTermTests(PageTestCase):
+    def setUp(self):
+        super().setUp()
+        self.products = [
+            Product.objects.create(name=name, slug=slugify(name), description='', price=1000, brand=brand, size=size,
+                                   is_active=active)
+            for name, brand, size, active in (
+                ('Aviator', 'Ray-Ban', 'M', True), ('Wayfarer', 'Ray-Ban', 'L', False),
+                ('Holbrook', 'Oakley', 'L', True), ('Champion', 'Carrera', '', True),
+            )
+        ]
+
+    def terms(self, kind):
+        return {value: (total, active) for value, total, active in get_catalog_terms(kind)}
+
+    def test_counts_follow_product_writes(self):
+        self.assertEqual(self.terms(CatalogTerm.Kind.BRAND),
+                         {'Carrera': (1, 1), 'Oakley': (1, 1), 'Ray-Ban': (2, 1)})
+        self.assertEqual(self.terms(CatalogTerm.Kind.SIZE), {'L': (2, 1), 'M': (1, 1)})
+
+        aviator, wayfarer, holbrook, champion = self.products
+        aviator.brand = 'Oakley'
+        aviator.save()
+        wayfarer.is_active = True
+        wayfarer.save(update_fields=['is_active'])
+        champion.delete()
+        self.assertEqual(self.terms(CatalogTerm.Kind.BRAND), {'Oakley': (2, 2), 'Ray-Ban': (1, 1)})
+
+    def test_unrelated_saves_skip_the_recount(self):
+        product = Product.objects.get(pk=self.products[0].pk)
+        with CaptureQueriesContext(connection) as queries:
+            product.save(update_fields=['price'])
+        self.assertFalse([query for query in queries if CatalogTerm._meta.db_table in query['sql']])
+
+    def test_rebuild_catches_up_with_bulk_edits(self):
+        Product.objects.filter(brand='Ray-Ban').update(brand='Persol')
+        call_command('rebuild_catalog_terms', stdout=StringIO())
+        self.assertEqual(self.terms(CatalogTerm.Kind.BRAND), {'Carrera': (1, 1), 'Oakley': (1, 1), 'Persol': (2, 1)})
+
+    def test_admin_autocomplete_lists_prefix_matches_first(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        url = reverse('admin:myapp_product_catalog_terms', args=['brand'])
+        self.assertEqual(self.client.get(url, {'q': 'ra'}).json(), {'results': ['Ray-Ban', 'Carrera']})
+        self.assertEqual(self.client.get(url).json(), {'results': ['Carrera', 'Oakley', 'Ray-Ban']})
+        self.assertEqual(self.client.get(reverse('admin:myapp_product_catalog_terms', args=['colour'])).status_code, 404)
+
+    def test_admin_autocomplete_needs_product_permission(self):
+        url = reverse('admin:myapp_product_catalog_terms', args=['brand'])
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(User.objects.create_user('staff', is_staff=True))
+        self.assertEqual(self.client.get(url).status_code, 403)
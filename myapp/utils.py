@@ -1,57 +1,366 @@
-import sys
+import hashlib
+import logging
+import math
+import os
 from io import BytesIO
-from PIL import Image
-from django.core.files.uploadedfile import InMemoryUploadedFile
+from PIL import ExifTags, Image, ImageOps, features
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import TemporaryUploadedFile
+
+logger = logging.getLogger(__name__)
+
+# Width buckets (in px) for the responsive renditions written next to every
+# uploaded image. Templates pick between them with srcset/sizes.
+RENDITION_WIDTHS = {
+    'thumbnail': 160,
+    'card': 480,
+    'detail': 960,
+    'zoom': 1600,
+}
+
+# Product photos also get AVIF renditions (see the models' AVIF_FIELDS), which
+# Pillow can only write when built with libavif. At quality 60 they are about
+# 17% smaller than WebP at 80 on the stock photos, within 2 dB PSNR; lower
+# qualities save more but lose more detail (manage.py benchmark_encoders).
+AVIF_SUPPORTED = features.check('avif')
+AVIF_QUALITY = 60
+
+# Every format renditions are written in (see rendition_formats()).
+RENDITION_EXTENSIONS = ('webp', 'avif', 'jpg')
+
+# Formats optimize_image_file() knows how to re-encode.
+OPTIMIZABLE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp'}
+
+# Stored originals are shrunk to fit this box; the largest rendition is 1600px.
+MAX_SOURCE_DIMENSION = 2400
+# Most pixels an image may still have once JPEG draft decoding has reduced
+# it, i.e. what is actually decoded into memory (about 4 bytes each). Larger
+# PNGs and other formats that cannot be decoded at a reduced scale are refused.
+MAX_DECODE_PIXELS = 24_000_000
+# EXIF orientations that swap width and height.
+ROTATED_ORIENTATIONS = {5, 6, 7, 8}
+
+
+class ImageTooLargeError(ValueError):
+    pass
+
+
+def encode_webp(img, quality=80, output=None):
+    """
+    Encodes a Pillow image as WebP into `output` (a new BytesIO by default)
+    and returns it positioned at 0.
+    """
+    if output is None:
+        output = BytesIO()
+    img.save(output, format='WEBP', quality=quality, optimize=True)
+    output.seek(0)
+    return output
+
+
+def encode_avif(img, quality=AVIF_QUALITY, output=None):
+    """
+    Encodes a Pillow image as AVIF into `output` (a new BytesIO by default)
+    and returns it positioned at 0.
+    """
+    if output is None:
+        output = BytesIO()
+    img.save(output, format='AVIF', quality=quality)
+    output.seek(0)
+    return output
+
+
+def encode_jpeg(img, quality=80, output=None):
+    """
+    Encodes a Pillow image as a progressive JPEG into `output` (a new
+    BytesIO by default) and returns it positioned at 0. Transparent areas
+    become white.
+    """
+    if output is None:
+        output = BytesIO()
+    if img.mode in ('RGBA', 'LA', 'PA') or 'transparency' in img.info:
+        img = img.convert('RGBA')
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        background.paste(img, mask=img.getchannel('A'))
+        img = background
+    img.convert('RGB').save(output, format='JPEG', quality=quality, optimize=True, progressive=True)
+    output.seek(0)
+    return output
+
+
+def load_bounded(img, size=(MAX_SOURCE_DIMENSION, MAX_SOURCE_DIMENSION)):
+    """
+    Decodes an opened (not yet loaded) Pillow image with bounded memory and
+    returns it shrunk to fit `size` and turned upright per its EXIF
+    orientation. JPEGs are decoded directly at the smallest DCT scale that
+    still covers the target size, so a 50MP photo never exists in memory at
+    full resolution. Raises ImageTooLargeError past MAX_DECODE_PIXELS.
+    """
+    # `size` is upright; orientations 5-8 store the image on its side.
+    if img.getexif().get(ExifTags.Base.Orientation, 1) in ROTATED_ORIENTATIONS:
+        stored_size = (size[1], size[0])
+    else:
+        stored_size = size
+    factor = min(stored_size[0] / img.width, stored_size[1] / img.height, 1)
+    img.draft(None, (math.ceil(img.width * factor), math.ceil(img.height * factor)))
+    if img.width * img.height > MAX_DECODE_PIXELS:
+        raise ImageTooLargeError(f'{img.width}x{img.height} image is too large to decode')
+    img = ImageOps.exif_transpose(img)
+    img.thumbnail(size)
+    return img
+
+
+def open_image(source, size=(MAX_SOURCE_DIMENSION, MAX_SOURCE_DIMENSION)):
+    """Opens `source` (a path or file) through load_bounded()."""
+    with Image.open(source) as img:
+        return load_bounded(img, size)
+
 
 def compress_image(image_field, quality=80):
     """
-    Compresses the image and converts it to WebP format.
+    Re-encodes the uploaded image as WebP, upright and at most
+    MAX_SOURCE_DIMENSION px on each side, into a temporary file. Returns the
+    new upload, or None when the image is already WebP or cannot be read.
     """
     if not image_field:
-        return
+        return None
 
     # Check if the image has already been converted to WebP
     if image_field.name.lower().endswith('.webp'):
-        return
+        return None
 
     try:
-        # Open the image using Pillow
-        img = Image.open(image_field)
-        
-        # Convert to RGB if necessary (e.g. for PNGs with transparency, 
-        # though WebP handles transparency, sometimes it's safer to convert if saving as non-alpha)
-        # WebP supports RGBA, so we can keep it if needed, but 'RGB' is safer for general compression
-        # if the user doesn't strictly need transparency everywhere. 
-        # However, for product images, transparent backgrounds might be desirable.
-        # Let's simple check modes.
-        if img.mode in ('RGBA', 'LA') and 'jpg' in image_field.name.lower():
-             # If source looked like jpg but had alpha, weird, but okay.
-             # Generally we might want to preserve alpha for WebP.
-             pass
-        
-        # Determine the new filename
-        file_name = image_field.name.split('.')[0] + '.webp'
-        
-        # Create a BytesIO object to hold the new image data
-        output = BytesIO()
-        
-        # Save the image to the BytesIO object in WebP format
-        img.save(output, format='WEBP', quality=quality, optimize=True)
-        output.seek(0)
-        
-        # Create a new InMemoryUploadedFile
-        new_image = InMemoryUploadedFile(
-            output,
-            'ImageField',
-            file_name,
-            'image/webp',
-            sys.getsizeof(output),
-            None
-        )
-        
-        # Assign the new image to the field
-        return new_image
-
-    except Exception as e:
-        print(f"Error compressing image: {e}")
+        with image_field.open('rb'):
+            img = open_image(image_field)
+
+        # Streams to disk, and storage moves the file into place rather than copying it.
+        file_name = os.path.splitext(os.path.basename(image_field.name))[0] + '.webp'
+        output = TemporaryUploadedFile(file_name, 'image/webp', 0, None)
+        encode_webp(img, quality=quality, output=output)
+        output.size = os.path.getsize(output.temporary_file_path())
+        return output
+
+    except ImageTooLargeError as e:
+        logger.warning("Not compressing %s: %s", image_field.name, e)
+        return None
+    except Exception:
+        logger.exception("Error compressing image %s", image_field.name)
         return None
+
+
+def rendition_name(name, width, extension='webp'):
+    """
+    Returns the storage name of the `width` rendition of the file `name`,
+    e.g. products/frame.webp -> products/frame_480w.webp
+    """
+    base, _ = os.path.splitext(name)
+    return f'{base}_{width}w.{extension}'
+
+
+def rendition_formats(avif=False, quality=80):
+    """
+    [(extension, encoder, quality)] of the renditions an image gets: WebP,
+    and for `avif` images (the AVIF_FIELDS served through {% picture %})
+    AVIF when Pillow can write it plus JPEG for browsers that decode neither.
+    """
+    formats = [('webp', encode_webp, quality)]
+    if avif:
+        if AVIF_SUPPORTED:
+            formats.append(('avif', encode_avif, AVIF_QUALITY))
+        formats.append(('jpg', encode_jpeg, quality))
+    return formats
+
+
+def has_renditions(image_field, avif=False):
+    """
+    Returns True when every rendition of the image exists in storage.
+    """
+    if not image_field:
+        return False
+    storage = image_field.storage
+    return all(
+        storage.exists(rendition_name(image_field.name, width, extension))
+        for extension, _, _ in rendition_formats(avif)
+        for width in RENDITION_WIDTHS.values()
+    )
+
+
+def _renditions_cache_key(storage, name, extension):
+    base = os.path.splitext(name)[0]
+    location = getattr(storage, 'location', '')
+    return 'renditions:' + hashlib.md5(f'{location}|{base}|{extension}'.encode()).hexdigest()
+
+
+def rendition_widths(storage, name, extension='webp'):
+    """
+    Returns {bucket: width in px} for the `extension` renditions of the file
+    `name`, or {} until all of them exist. Sources narrower than a bucket
+    are not upscaled, so a rendition can be narrower than its bucket.
+
+    The widths are read from the rendition headers on the first call and
+    cached from then on. Saving or deleting renditions through
+    ContentAddressedStorage, or forget_renditions(), clears the cached value.
+    """
+    key = _renditions_cache_key(storage, name, extension)
+    widths = cache.get(key)
+    if widths is None:
+        widths = {}
+        try:
+            for bucket in sorted(RENDITION_WIDTHS.values()):
+                with storage.open(rendition_name(name, bucket, extension), 'rb') as rendition:
+                    # Only reads the header.
+                    widths[bucket] = Image.open(rendition).width
+        except (OSError, ValueError):
+            widths = {}
+        cache.set(key, widths, None)
+    return widths
+
+
+def forget_renditions(storage, name):
+    """Drops the cached rendition_widths() of `name`, after its renditions were written or deleted."""
+    cache.delete_many([_renditions_cache_key(storage, name, extension) for extension in RENDITION_EXTENSIONS])
+
+
+def srcset_candidates(storage, name, widths, extension='webp'):
+    """
+    The srcset value for the renditions of `name` measured by
+    rendition_widths(). Each rendition is labelled with its real width, and
+    a bucket that came out the same width as a smaller one is left out.
+    """
+    buckets = {}
+    for bucket, width in sorted(widths.items()):
+        buckets.setdefault(width, bucket)
+    return ', '.join(
+        f'{storage.url(rendition_name(name, bucket, extension))} {width}w'
+        for width, bucket in buckets.items()
+    )
+
+
+def generate_renditions(image_field, quality=80, avif=False):
+    """
+    Writes one WebP rendition per RENDITION_WIDTHS bucket next to the stored
+    image, and an AVIF one too with `avif`. Images narrower than a bucket are
+    not upscaled. The bucket's file is still written, at the source's width,
+    and rendition_widths() reports that width.
+    """
+    if not image_field or has_renditions(image_field, avif=avif):
+        return
+
+    storage = image_field.storage
+    try:
+        largest = max(RENDITION_WIDTHS.values())
+        with storage.open(image_field.name, 'rb') as source:
+            img = open_image(source, size=(largest, largest * 4))
+
+        for extension, encode, format_quality in rendition_formats(avif, quality):
+            for width, data in encode_renditions(img, quality=format_quality, encode=encode).items():
+                name = rendition_name(image_field.name, width, extension)
+                if storage.exists(name):
+                    storage.delete(name)
+                storage.save(name, ContentFile(data))
+
+    except Exception:
+        logger.exception("Error generating renditions for %s", image_field.name)
+
+
+def encode_renditions(img, quality=80, encode=encode_webp):
+    """
+    Returns {width: bytes} with one rendition of the Pillow image per
+    RENDITION_WIDTHS bucket, smallest first, encoded by `encode` (WebP by default).
+    """
+    renditions = {}
+    for width in sorted(RENDITION_WIDTHS.values()):
+        rendition = img.copy()
+        rendition.thumbnail((width, width * 4))
+        renditions[width] = encode(rendition, quality=quality).getvalue()
+    return renditions
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _replace_file(path, data):
+    """Writes `data` to `path` through a temporary file, so readers never see a partial image."""
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+def optimize_image_file(path, quality=80, to_webp=False, renditions=False, avif=False, skip_digest=None,
+                        dry_run=False):
+    """
+    Re-encodes the image file at `path` for `manage.py optimize_media`. Works
+    on plain paths without touching Django, so it can run in worker processes.
+
+    With `to_webp` the image is converted to a .webp next to the original
+    (which is left for the caller to delete once nothing references it);
+    otherwise it is re-encoded in its own format and only replaced when that
+    makes it smaller. `renditions` rewrites its responsive renditions too,
+    including the AVIF ones with `avif`.
+    Files whose SHA-256 equals `skip_digest` are not opened.
+
+    Returns {'path', 'output', 'before', 'after', 'digest', 'skipped'} where
+    before/after are the bytes used by the image and its renditions and
+    digest is the hash of the resulting file.
+    """
+    before = os.path.getsize(path)
+    digest = file_digest(path)
+    result = {'path': path, 'output': path, 'before': before, 'after': before, 'digest': digest, 'skipped': True}
+    if digest == skip_digest:
+        return result
+
+    with Image.open(path) as source:
+        source_format = source.format
+        if getattr(source, 'n_frames', 1) > 1:
+            # Animated images are left alone.
+            return result
+        icc_profile = source.info.get('icc_profile')
+        img = load_bounded(source)
+
+    base, extension = os.path.splitext(path)
+    output = path
+    if to_webp or source_format == 'WEBP':
+        data = encode_webp(img, quality=quality).getvalue()
+        if extension.lower() != '.webp':
+            output = base + '.webp'
+            if os.path.exists(output):
+                output = f'{base}-{digest[:8]}.webp'
+    elif source_format == 'JPEG':
+        buffer = BytesIO()
+        img.save(buffer, format='JPEG', quality=quality, optimize=True, progressive=True, icc_profile=icc_profile)
+        data = buffer.getvalue()
+    elif source_format == 'PNG':
+        buffer = BytesIO()
+        img.save(buffer, format='PNG', optimize=True)
+        data = buffer.getvalue()
+    else:
+        return result
+
+    if output == path and len(data) >= before:
+        # Re-encoding would not make the file any smaller.
+        data = None
+    result.update(skipped=False, output=output)
+    if data is not None:
+        result.update(after=len(data), digest=hashlib.sha256(data).hexdigest())
+
+    new_renditions = {}
+    if renditions:
+        for extension, encode, format_quality in rendition_formats(avif, quality):
+            for width, rendition in encode_renditions(img, quality=format_quality, encode=encode).items():
+                name = rendition_name(output, width, extension)
+                new_renditions[name] = rendition
+                result['before'] += os.path.getsize(name) if os.path.exists(name) else 0
+                result['after'] += len(rendition)
+
+    if not dry_run:
+        if data is not None:
+            _replace_file(output, data)
+        for name, rendition in new_renditions.items():
+            _replace_file(name, rendition)
+    return result
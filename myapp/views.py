@@ -1,11 +1,32 @@
+from django.http import HttpResponsePermanentRedirect, HttpResponseRedirect, JsonResponse
 from django.shortcuts import render, get_object_or_404
-from .models import Service, Blog, News, Product, Testimonial
-from django.core.paginator import Paginator
-
+from django.db.models import Count, F
+from django.db.models.functions import Floor
+from .models import Service, Blog, CatalogTerm, News, Product, ProductImage, Testimonial
+from .cache import cache_view, conditional_view, get_catalog_terms
+from .forms import ProductFilterForm
+from .pagination import KeysetPaginator
+from .prerender import prerendered
+from .search import get_backend as get_search_backend
+
+# Price histogram bands on /products; together they span the filter slider.
+PRICE_BUCKET_WIDTH = 2000
+PRICE_BUCKET_COUNT = 10
+
+KEY_BENEFITS = [
+    {"title": "Expert Guidance", "description": "Get support from trained optical professionals."},
+    {"title": "Modern Tools", "description": "Accurate results using updated diagnostic equipment."},
+    {"title": "Quick Service", "description": "Fast and comfortable experience for every customer."},
+    {"title": "Personalized Advice", "description": "Solutions tailored to your needs and lifestyle."},
+    {"title": "Affordable Options", "description": "Budget-friendly and premium solutions available."},
+    {"title": "Trusted Care", "description": "Safe, reliable, and customer-first optical care."},
+]
+
+@cache_view(Product, ProductImage, Testimonial)
 def home(request):
     testimonials = Testimonial.objects.filter(is_published=True).order_by('-date', '-created_at')[:10]
-    latest_products = Product.objects.filter(is_active=True).order_by('-created_at')[:10]
-    services = Service.objects.all()
+    latest_products = Product.objects.filter(is_active=True).cards().order_by('-created_at')[:10]
+    services = Service.objects.only('name', 'description', 'image')
     return render(request, 'home.html', {
         'testimonials': testimonials,
         'latest_products': latest_products,
@@ -13,52 +34,71 @@ def home(request):
     })
 
 
+@prerendered
 def about(request):
     return render(request, 'about.html')
 
+@cache_view()
 def services(request):
-    services = Service.objects.all()
+    services = Service.objects.only('name', 'description', 'image')
     return render(request, 'services.html', {'services': services})
 
+@cache_view()
 def servicedetails(request, service_id):
     service = Service.objects.get(id=service_id)
-    services = Service.objects.all()
-
-    key_benefits = [
-        {"title": "Expert Guidance", "description": "Get support from trained optical professionals."},
-        {"title": "Modern Tools", "description": "Accurate results using updated diagnostic equipment."},
-        {"title": "Quick Service", "description": "Fast and comfortable experience for every customer."},
-        {"title": "Personalized Advice", "description": "Solutions tailored to your needs and lifestyle."},
-        {"title": "Affordable Options", "description": "Budget-friendly and premium solutions available."},
-        {"title": "Trusted Care", "description": "Safe, reliable, and customer-first optical care."},
-    ]
 
     return render(request, 'servicedetails.html', {
         'service': service,
-        'services': services,
-        'key_benefits': key_benefits
+        'key_benefits': KEY_BENEFITS
     })
 
 
+@prerendered
 def faq(request):
     return render(request, 'faqs.html')
 
+def _legacy_page_redirect(request, cursor):
+    """
+    Lists were paged with ?page=N before they took cursors. Old links are
+    sent to the same page's cursor (temporarily, as the cursor follows the
+    content), or permanently to the list without ?page= when `cursor` is
+    None: the first page, a page past the end or a malformed number.
+    """
+    query = request.GET.copy()
+    del query['page']
+    if cursor is not None and 'cursor' not in query:
+        query['cursor'] = cursor
+        return HttpResponseRedirect(f'{request.path}?{query.urlencode()}')
+    return HttpResponsePermanentRedirect(f'{request.path}?{query.urlencode()}' if query else request.path)
+
+
+@cache_view(Blog, params=('cursor', 'page'))
 def blog_list(request):
-    posts = Blog.objects.filter(is_published=True).order_by('-published_at')
+    posts = Blog.objects.listing().cards()
 
-    paginator = Paginator(posts, 6)  # 6 posts per page
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    paginator = KeysetPaginator(posts, 6, models=[Blog])  # 6 posts per page
+    if 'page' in request.GET:
+        return _legacy_page_redirect(request, paginator.cursor_for_page(request.GET['page']))
+    page_obj = paginator.get_page(request.GET.get('cursor'))
 
     return render(request, 'blog.html', {
         'page_obj': page_obj
     })
 
+def _popular_posts(slug):
+    """The latest 6 published posts other than `slug`, beside a post."""
+    return Blog.objects.filter(is_published=True).exclude(slug=slug).cards().order_by('-created_at', '-id')[:6]
+
+
+def _blog_single_rows(request, slug):
+    """The rows blog_single renders, for its validators."""
+    return [Blog.objects.filter(slug=slug, is_published=True), _popular_posts(slug)]
+
+
+@conditional_view(_blog_single_rows)
 def blog_single(request, slug):
     post = get_object_or_404(Blog, slug=slug, is_published=True)
-
-    # Popular posts = latest 6 excluding current
-    popular_posts = Blog.objects.filter(is_published=True).exclude(id=post.id)[:6]
+    popular_posts = _popular_posts(slug)
 
     return render(request, "blog-single.html", {
         "post": post,
@@ -66,60 +106,183 @@ def blog_single(request, slug):
     })
 
 
+@cache_view(News, params=('cursor', 'page'))
 def news_list(request):
-    news_items = News.objects.filter(is_published=True).order_by('-published_at', '-created_at')
-    paginator = Paginator(news_items, 6)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    news_items = News.objects.listing().cards()
+    paginator = KeysetPaginator(news_items, 6, models=[News])
+    if 'page' in request.GET:
+        return _legacy_page_redirect(request, paginator.cursor_for_page(request.GET['page']))
+    page_obj = paginator.get_page(request.GET.get('cursor'))
 
     return render(request, 'news_list.html', {
         'page_obj': page_obj,
     })
 
 
+def _recent_news(slug):
+    """The 4 latest news items other than `slug`, beside an item."""
+    return News.objects.listing().exclude(slug=slug).cards()[:4]
+
+
+def _news_detail_rows(request, slug):
+    """The rows news_detail renders, for its validators."""
+    return [News.objects.filter(slug=slug, is_published=True), _recent_news(slug)]
+
+
+@conditional_view(_news_detail_rows)
 def news_detail(request, slug):
     news = get_object_or_404(News, slug=slug, is_published=True)
-    recent_news = News.objects.filter(is_published=True).exclude(id=news.id).order_by('-published_at')[:4]
+    recent_news = _recent_news(slug)
 
     return render(request, 'news_detail.html', {
         'news': news,
         'recent_news': recent_news
     })
 
+@prerendered
 def contact(request):
     return render(request, 'contact.html')
 
+@prerendered
 def book_your_visit(request):
     return render(request, 'book-your-visit.html')
 
-def products(request):
-    products_qs = (
-        Product.objects.filter(is_active=True)
-        .order_by('-created_at')
-        .prefetch_related('gallery')
-    )
-    paginator = Paginator(products_qs, 9)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-
-    category_choices = Product.Category.choices
-    brands = (Product.objects.filter(is_active=True)
-              .exclude(brand='')
-              .values_list('brand', flat=True)
-              .distinct()
-              .order_by('brand'))
-
-    return render(request, 'products.html', {
+def _price_bands(products_qs):
+    """(band, product count) rows of PRICE_BUCKET_WIDTH bands of effective price."""
+    return (products_qs.order_by()
+            .annotate(band=Floor(F('effective_price') / PRICE_BUCKET_WIDTH))
+            .values('band')
+            .annotate(count=Count('id'))
+            .values_list('band', 'count'))
+
+
+def _price_histogram(bands):
+    """
+    Turns _price_bands() rows into the histogram bars. The last band is
+    open-ended so it matches the sidebar slider's range.
+    """
+    counts = [0] * PRICE_BUCKET_COUNT
+    for band, count in bands:
+        counts[min(int(band), PRICE_BUCKET_COUNT - 1)] += count
+
+    tallest = max(counts) or 1
+    return [
+        {
+            'min': index * PRICE_BUCKET_WIDTH,
+            'max': (index + 1) * PRICE_BUCKET_WIDTH,
+            'count': count,
+            'height': round(count * 100 / tallest),
+        }
+        for index, count in enumerate(counts)
+    ]
+
+
+def _catalog_brands(terms):
+    """{brand: active product count} in name order, from get_catalog_terms() rows."""
+    return {value: active for value, _, active in terms if active}
+
+
+def _catalog_queries(filters):
+    """
+    The /products page queryset and its facet queries, unevaluated, so the
+    sync and async views can each run them their own way.
+    """
+    selected_categories = filters.get('category') or []
+    selected_brands = filters.get('brand') or []
+    price_range = {
+        'min_price': filters.get('min_price'),
+        'max_price': filters.get('max_price'),
+    }
+
+    catalog = Product.objects.filter(is_active=True)
+    # Each facet is counted with every filter applied except its own, so the
+    # numbers say what ticking that box would return. Without category or
+    # price filters the brand counts are the registry's (brand_counts None).
+    brand_filtered = bool(selected_categories) or any(value is not None for value in price_range.values())
+    return {
+        'products': (
+            catalog.filter_catalog(category=selected_categories, brand=selected_brands, **price_range)
+            .sort_catalog(filters.get('sort'))
+            .cards()
+        ),
+        'category_counts': (
+            catalog.filter_catalog(brand=selected_brands, **price_range)
+            .order_by().values('category').annotate(count=Count('id'))
+            .values_list('category', 'count')
+        ),
+        'brand_counts': (
+            catalog.filter_catalog(category=selected_categories, **price_range)
+            .exclude(brand='')
+            .order_by().values('brand').annotate(count=Count('id'))
+            .values_list('brand', 'count')
+        ) if brand_filtered else None,
+        'price_bands': _price_bands(
+            catalog.filter_catalog(category=selected_categories, brand=selected_brands)
+        ),
+    }
+
+
+def _catalog_context(filter_form, filters, brands, page_obj, category_counts, brand_counts, price_bands):
+    selected_categories = filters.get('category') or []
+    selected_brands = filters.get('brand') or []
+    category_facets = [
+        {'value': value, 'label': label, 'count': category_counts.get(value, 0),
+         'selected': value in selected_categories}
+        for value, label in Product.Category.choices
+    ]
+    brand_facets = [
+        {'value': brand, 'label': brand, 'count': brand_counts.get(brand, 0),
+         'selected': brand in selected_brands}
+        for brand in brands
+    ]
+    return {
         'page_obj': page_obj,
-        'category_choices': category_choices,
-        'brands': brands
-    })
+        'filter_form': filter_form,
+        'category_facets': category_facets,
+        'brand_facets': brand_facets,
+        'price_histogram': _price_histogram(price_bands),
+        'price_filter_max': PRICE_BUCKET_WIDTH * PRICE_BUCKET_COUNT,
+        'selected_sort': filters.get('sort') or 'featured',
+    }
+
+
+def products(request):
+    brands = _catalog_brands(get_catalog_terms(CatalogTerm.Kind.BRAND))
+    filter_form = ProductFilterForm(request.GET, brands=brands)
+    filters = filter_form.get_filters()
+    queries = _catalog_queries(filters)
+
+    paginator = KeysetPaginator(queries['products'], 9, models=[Product])
+    if 'page' in request.GET:
+        return _legacy_page_redirect(request, paginator.cursor_for_page(request.GET['page']))
+    page_obj = paginator.get_page(request.GET.get('cursor'))
+
+    return render(request, 'products.html', _catalog_context(
+        filter_form, filters, brands, page_obj,
+        category_counts=dict(queries['category_counts']),
+        brand_counts=brands if queries['brand_counts'] is None else dict(queries['brand_counts']),
+        price_bands=queries['price_bands'],
+    ))
+
 
+def _related_products(slug):
+    """The 4 newest active products other than `slug`, under a product."""
+    return Product.objects.filter(is_active=True).exclude(slug=slug).cards().order_by('-created_at', '-id')[:4]
 
+
+def _product_detail_rows(request, slug):
+    """
+    The rows product_detail renders, for its validators. Gallery edits bump
+    the product's updated_at, so its row covers the gallery too.
+    """
+    return [Product.objects.filter(slug=slug, is_active=True), _related_products(slug)]
+
+
+@conditional_view(_product_detail_rows)
 def product_detail(request, slug):
     product = get_object_or_404(Product.objects.prefetch_related('gallery'), slug=slug, is_active=True)
     gallery = product.gallery.all()
-    related_products = Product.objects.filter(is_active=True).exclude(id=product.id).order_by('-created_at')[:4]
+    related_products = _related_products(slug)
 
     return render(request, 'shop-product-single.html', {
         'product': product,
@@ -128,6 +291,7 @@ def product_detail(request, slug):
     })
 
 
+@cache_view(Testimonial)
 def testimonials(request):
     testimonials_list = Testimonial.objects.filter(is_published=True).order_by('sort_order', '-date', '-created_at')
     return render(request, 'testimonials.html', {
@@ -135,10 +299,27 @@ def testimonials(request):
     })
 
 
+def search(request):
+    query = request.GET.get('q', '').strip()[:200]
+    results = get_search_backend().search(query, limit=30) if query else []
+    return render(request, 'search.html', {
+        'query': query,
+        'results': results,
+    })
+
+
+def search_suggest(request):
+    query = request.GET.get('q', '').strip()[:100]
+    suggestions = get_search_backend().suggest(query) if len(query) >= 2 else []
+    return JsonResponse({'suggestions': suggestions})
+
+
+@prerendered
 def terms(request):
     return render(request, 'terms.html')
 
 
+@prerendered
 def privacy(request):
     return render(request, 'privacy.html')
 
@@ -148,5 +329,6 @@ def handler404(request, exception):
     return render(request, '404.html', status=404)
 
 
+@prerendered
 def robots_txt(request):
     return render(request, 'robots.txt', content_type='text/plain')
\ No newline at end of file
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'visionmark.settings')
+# Serve the native async views (settings.ASYNC_VIEWS).
+os.environ.setdefault('VISIONMARK_ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
@@ -1,6 +1,9 @@
 
+import os
 from pathlib import Path
 
+from django.templatetags.static import static
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 SECRET_KEY = 'django-insecure-3091of#r!*v6od4&83mt$=ugj9gzlc7x-)kp810lf%@jz$hv%b'
@@ -21,7 +24,7 @@ INSTALLED_APPS = [
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
-    'django.contrib.staticfiles',
+    'myapp.apps.StaticFilesConfig',
     'django_ckeditor_5',
     'myapp.apps.MyappConfig',
     'django.contrib.sites',
@@ -32,7 +35,9 @@ INSTALLED_APPS = [
 SITE_ID = 1
 
 MIDDLEWARE = [
+    'myapp.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'myapp.middleware.ReadOnlyDatabaseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -65,10 +70,47 @@ WSGI_APPLICATION = 'visionmark.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# myapp.sqlite is the sqlite3 backend with WAL and tuned pragmas (see
+# myapp/sqlite/base.py). Connections are kept per worker thread and checked
+# before reuse. Public GET requests read through 'readonly', the same file
+# opened with query_only (myapp.routers.ReadOnlyRouter).
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'myapp.sqlite',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Take the write lock at BEGIN, so a transaction never fails
+            # halfway through when it upgrades from reading to writing.
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+    },
+    'readonly': {
+        'ENGINE': 'myapp.sqlite',
+        'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'read_only': True,
+            'timeout': 20,
+        },
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+
+DATABASE_ROUTERS = ['myapp.routers.ReadOnlyRouter']
+
+
+# Cache
+# File-based so every worker process on the host shares it (menu and page
+# caches are invalidated across processes through it).
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
     }
 }
 
@@ -106,9 +148,28 @@ USE_TZ = True
 STATIC_URL = '/static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+STORAGES = {
+    # Uploads are named by content hash, so identical images are stored once.
+    'default': {
+        'BACKEND': 'myapp.storage.ContentAddressedStorage',
+    },
+    # collectstatic writes content-hashed copies, .gz/.br siblings and staticfiles.json.
+    'staticfiles': {
+        'BACKEND': 'myapp.staticfiles.CompressedManifestStaticFilesStorage',
+    },
+}
+
+# Serve STATIC_ROOT from Django (with immutable caching and precompressed
+# files) when DEBUG is off and no front-end server handles /static/.
+SERVE_STATIC = False
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# build_static_pages writes the pages that only depend on the services menu
+# (about, FAQ, contact, ...) here; the views serve them without rendering.
+PRERENDER_ROOT = BASE_DIR / 'prerendered'
+
 
 # CKEditor 5 settings
 customColorPalette = [
@@ -201,6 +262,25 @@ CKEDITOR_5_CONFIGS = {
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Per-request query/render instrumentation (see myapp/middleware.py). Adds
+# Server-Timing headers and the slowest-endpoints table on the admin index.
+PERF_INSTRUMENTATION = False
+
+# Route the public pages to myapp/async_views.py. visionmark/asgi.py turns
+# this on; under WSGI async views would only add a thread handoff per request.
+# PERF_INSTRUMENTATION is sync-only middleware and puts ASGI back in sync mode.
+ASYNC_VIEWS = os.environ.get('VISIONMARK_ASYNC_VIEWS') == '1'
+
+if ASYNC_VIEWS:
+    # Async views run their queries on sync_to_async threads, which do not
+    # reliably get connections closed; Django recommends disabling persistent
+    # connections under ASGI.
+    for database in DATABASES.values():
+        database['CONN_MAX_AGE'] = 0
+
+# Site search backend (see myapp/search.py)
+SEARCH_BACKEND = 'myapp.search.SQLiteFTSBackend'
+
 UNFOLD = {
     "SITE_TITLE": "Visionmark Admin",
     "SITE_HEADER": "Visionmark Opticals & Eyecare",
@@ -211,17 +291,16 @@ UNFOLD = {
     "SHOW_HISTORY": True,
     "SHOW_VIEW_ON_SITE": True,
     "ENVIRONMENT": None,  # Can be set to a callback function if needed
-    "DASHBOARD_CALLBACK": None,
+    "DASHBOARD_CALLBACK": "myapp.dashboard.dashboard_callback",
     "LOGIN": {
         "image": None,
         "redirect_after": None,
     },
     "STYLES": [
-        "/static/css/admin-ckeditor.css",
-        "/static/css/admin-image-preview.css",
+        lambda request: static("css/admin-ckeditor.css"),
     ],
     "SCRIPTS": [
-        "/static/js/admin-image-preview.js",
+        lambda request: static("js/admin-image-preview.js"),
     ],
     "COLORS": {
         "primary": {
@@ -284,6 +363,11 @@ UNFOLD = {
                         "icon": "reviews",
                         "link": "/admin/myapp/testimonial/",
                     },
+                    {
+                        "title": "Image Jobs",
+                        "icon": "image",
+                        "link": "/admin/myapp/imagejob/",
+                    },
                 ],
             },
         ],